@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark DynamoDB call latency with botocore's default client settings.
+
+The layer used to build its clients with botocore's defaults: 60 s connect
+and read timeouts, legacy retries and a pool of 10 connections. client_config
+now sets short timeouts, adaptive retries, TCP keep-alive and a pool sized
+for the layer's thread fan-out.
+
+Both configurations issue the same GetItem calls from a thread pool against
+a local stand-in for DynamoDB. The stand-in answers with a fixed item after
+a short service time. It charges each new connection a setup delay, like a
+TLS handshake, and stalls a small share of requests, as a brownout or a
+half-open connection would. The report shows call latency percentiles and how
+many connections each client opened.
+
+Usage:
+  python benchmarks/bench_client_config.py
+  python benchmarks/bench_client_config.py --threads 16 --requests 4000 \\
+      --stall-rate 0.005 --stall-seconds 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import boto3
+from botocore.config import Config
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "layers" / "common"))
+
+from stand_in import StandInServer  # noqa: E402
+from utils import client_config  # noqa: E402
+
+
+def measure(config: Config, endpoint: str, threads: int, requests: int) -> list[float]:
+    """Return the latency (ms) of every GetItem call."""
+    client = boto3.client(
+        "dynamodb",
+        endpoint_url=endpoint,
+        region_name="ap-northeast-1",
+        aws_access_key_id="stand-in",
+        aws_secret_access_key="stand-in",
+        config=config,
+    )
+
+    def get_item(_: int) -> float:
+        start = time.perf_counter()
+        client.get_item(TableName="recipes", Key={"name": {"S": "カレーライス"}})
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(get_item, range(requests)))
+
+
+def run(args: argparse.Namespace) -> None:
+    # Pool overflow ("Connection pool is full") is counted, not printed
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+    configs = [
+        ("botocore defaults", Config()),
+        ("client_config", client_config("dynamodb")),
+    ]
+
+    print(
+        f"{'config':<18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'max ms':>9} {'conns':>6}"
+    )
+    for label, config in configs:
+        with StandInServer(
+            service_ms=args.service_ms,
+            connect_ms=args.connect_ms,
+            stall_rate=args.stall_rate,
+            stall_seconds=args.stall_seconds,
+        ) as server:
+            latencies = measure(config, server.endpoint, args.threads, args.requests)
+        cuts = statistics.quantiles(latencies, n=100)
+        print(
+            f"{label:<18} {cuts[49]:>8.1f} {cuts[94]:>8.1f} {cuts[98]:>8.1f} "
+            f"{max(latencies):>9.1f} {server.connections:>6}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--service-ms", type=float, default=2)
+    parser.add_argument("--connect-ms", type=float, default=30)
+    parser.add_argument("--stall-rate", type=float, default=0.01)
+    parser.add_argument("--stall-seconds", type=float, default=5)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
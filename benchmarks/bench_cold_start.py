@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Split a cold start's latency between INIT and the first invocation.
+
+With PRIME_ON_INIT unset, the first request after a cold start imports boto3,
+creates the clients, connects to DynamoDB and loads the recipe cache. The
+agent waits for all of it. prime_on_init moves that work into INIT, which
+happens before the request arrives when Lambda pre-provisions environments
+or restores a SnapStart snapshot.
+
+Each PRIME_ON_INIT level is measured in fresh interpreters. Each one imports
+the handler (INIT), then invokes it twice: the cold first request and a warm
+one. DynamoDB is the local stand-in (stand_in.py), serving a catalog of
+--recipes items. It charges each new connection --connect-ms, standing in
+for TLS setup. moto is not used, because it imports boto3 before the
+handler does.
+
+Usage:
+  python benchmarks/bench_cold_start.py
+  python benchmarks/bench_cold_start.py --action get_recipe_usage --recipes 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+from stand_in import StandInServer
+
+ROOT = Path(__file__).parent.parent
+ACTIONS = ("get_recipes", "get_recipe_usage", "get_history")
+LEVELS = ("off", "connection", "catalog")
+
+# Runs in the child interpreter; everything app imports counts as INIT
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app
+init = time.perf_counter() - start
+event = {"messageVersion": "1.0", "actionGroup": "bench", "apiPath": "/bench",
+         "httpMethod": "GET", "parameters": []}
+invocations = []
+for _ in range(2):
+    start = time.perf_counter()
+    response = app.lambda_handler(event, None)
+    invocations.append(time.perf_counter() - start)
+    assert response["response"]["httpStatusCode"] == 200, response
+print(json.dumps([init * 1000] + [t * 1000 for t in invocations]))
+"""
+
+
+def catalog(count: int) -> dict[str, Any]:
+    """A single-page Scan response holding count recipes."""
+    items = [
+        {
+            "name": {"S": f"レシピ{i:05d}"},
+            "category": {"S": ["主菜", "副菜", "汁物"][i % 3]},
+            "ingredients": {"L": [{"S": "玉ねぎ"}, {"S": f"食材{i % 50}"}]},
+            "cooking_time": {"N": str(10 + i % 50)},
+        }
+        for i in range(count)
+    ]
+    return {"Items": items, "Count": count, "ScannedCount": count}
+
+
+def cold_start(action: str, level: str, endpoint: str) -> list[float]:
+    """Return INIT, first and second invocation times (ms) of a new process."""
+    action_dir = ROOT / "src" / "agent_actions" / action
+    env = {
+        **os.environ,
+        "PRIME_ON_INIT": level,
+        "RECIPES_TABLE": "bench-recipes",
+        "HISTORY_TABLE": "bench-history",
+        "USAGE_TABLE": "bench-usage",
+        "AWS_ENDPOINT_URL_DYNAMODB": endpoint,
+        "AWS_DEFAULT_REGION": "ap-northeast-1",
+        "AWS_ACCESS_KEY_ID": "stand-in",
+        "AWS_SECRET_ACCESS_KEY": "stand-in",
+        "METRICS_NAMESPACE": "Bench",
+        "PYTHONPATH": os.pathsep.join(
+            [str(action_dir), str(ROOT / "src" / "layers" / "common")]
+        ),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=action_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise SystemExit(
+            f"{action} with PRIME_ON_INIT={level} failed:\n{result.stderr}"
+        )
+    timings: list[float] = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings
+
+
+def run(action: str, recipes: int, connect_ms: float, repeat: int) -> None:
+    responses = {
+        "Scan": catalog(recipes),
+        "DescribeTable": {"Table": {"TableName": "bench", "TableStatus": "ACTIVE"}},
+        "GetItem": {},  # no catalog version item yet
+        "BatchGetItem": {"Responses": {}, "UnprocessedKeys": {}},
+        "Query": {"Items": [], "Count": 0, "ScannedCount": 0},
+    }
+    print(
+        f"{'PRIME_ON_INIT':<14} {'INIT ms':>8} {'1st req ms':>11} "
+        f"{'INIT+1st':>9} {'warm ms':>8}"
+    )
+    with StandInServer(responses, connect_ms=connect_ms) as server:
+        for level in LEVELS:
+            runs = [cold_start(action, level, server.endpoint) for _ in range(repeat)]
+            init, first, warm = (statistics.median(column) for column in zip(*runs))
+            print(
+                f"{level:<14} {init:>8.1f} {first:>11.1f} "
+                f"{init + first:>9.1f} {warm:>8.1f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--action", choices=ACTIONS, default="get_recipes")
+    parser.add_argument("--recipes", type=int, default=2000)
+    parser.add_argument("--connect-ms", type=float, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.action, args.recipes, args.connect_ms, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
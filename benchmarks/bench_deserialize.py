@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark turning DynamoDB wire items into JSON-ready Python values.
+
+get_recipes and get_history used to read through the boto3 resource layer,
+which deserializes every number to Decimal, and then walk every item again
+with decimal_to_float to make it JSON-encodable. The read helpers now
+deserialize wire items with NativeTypeDeserializer in a single pass.
+
+Both paths are run on the same pre-built wire payload (recipe-shaped and
+history-shaped items), so only the deserialization cost is measured. The
+results of the two paths are checked to be identical, and the peak memory
+allocated while converting the payload is reported alongside the time.
+
+Usage:
+  python benchmarks/bench_deserialize.py
+  python benchmarks/bench_deserialize.py --items 1000 10000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "layers" / "common"))
+
+from utils import decimal_to_float, deserialize_item  # noqa: E402
+
+CATEGORIES = ["主菜", "副菜", "汁物", "主食", "デザート"]
+
+
+def recipe_items(count: int) -> list[dict[str, Any]]:
+    """Wire-format recipes as returned by a Scan of the recipes table."""
+    serializer = TypeSerializer()
+    items = []
+    for i in range(count):
+        recipe = {
+            "name": f"レシピ{i:06d}",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "ingredients": ["玉ねぎ", "にんじん", "豚肉", f"食材{i % 50}"],
+            "cooking_time": 10 + i % 50,
+            "servings": 2 + i % 3,
+            "recipe_url": f"https://example.com/recipes/{i}",
+        }
+        items.append({k: serializer.serialize(v) for k, v in recipe.items()})
+    return items
+
+
+def history_items(count: int) -> list[dict[str, Any]]:
+    """Wire-format menus as returned by a history Query or BatchGetItem."""
+    serializer = TypeSerializer()
+    end = datetime(2025, 12, 31)
+    items = []
+    for i in range(count):
+        menu = {
+            "date": (end - timedelta(days=i)).strftime("%Y-%m-%d"),
+            "meals": {
+                "lunch": ["カレーライス"],
+                "dinner": ["鮭の塩焼き", "ほうれん草のおひたし", "味噌汁"],
+            },
+            "recipes": ["カレーライス", "鮭の塩焼き", "ほうれん草のおひたし", "味噌汁"],
+            "version": 1 + i % 3,
+            "created_at": "2025-11-08T10:00:00",
+            "updated_at": "2025-11-08T10:00:00",
+        }
+        items.append({k: serializer.serialize(v) for k, v in menu.items()})
+    return items
+
+
+def resource_then_walk(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """The old path: Decimal deserialization, then a decimal_to_float walk."""
+    deserializer = TypeDeserializer()
+    decoded = [
+        {k: deserializer.deserialize(v) for k, v in item.items()} for item in items
+    ]
+    return [decimal_to_float(item) for item in decoded]
+
+
+def native_single_pass(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """The new path: NativeTypeDeserializer straight to int/float."""
+    return [deserialize_item(item) for item in items]
+
+
+def measure(
+    fn: Callable[[list[dict[str, Any]]], list[dict[str, Any]]],
+    items: list[dict[str, Any]],
+    repeat: int,
+) -> tuple[float, float, list[dict[str, Any]]]:
+    """Return best wall time (ms), peak allocation (MB) and the result."""
+    best = float("inf")
+    result: list[dict[str, Any]] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(items)
+        best = min(best, (time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fn(items)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 1024 / 1024, result
+
+
+def run(sizes: list[int], repeat: int) -> None:
+    print(
+        f"{'payload':<8} {'items':>6} {'method':<26} {'best ms':>9} "
+        f"{'us/item':>8} {'peak MB':>8}"
+    )
+    for label, build in (("recipes", recipe_items), ("history", history_items)):
+        for size in sizes:
+            items = build(size)
+            baseline = ""
+            for method, fn in (
+                ("resource + decimal_to_float", resource_then_walk),
+                ("native single pass", native_single_pass),
+            ):
+                elapsed, peak, result = measure(fn, items, repeat)
+                # Compare the encoded JSON, so 1 and 1.0 count as different
+                encoded = json.dumps(result, ensure_ascii=False)
+                if not baseline:
+                    baseline = encoded
+                elif encoded != baseline:
+                    raise SystemExit(f"{method} returned different values")
+                print(
+                    f"{label:<8} {size:>6} {method:<26} {elapsed:>9.1f} "
+                    f"{elapsed * 1000 / size:>8.2f} {peak:>8.1f}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--items", type=int, nargs="+", default=[10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.items, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
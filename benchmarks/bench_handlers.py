@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Benchmark every action handler end to end at several data scales.
+
+The other benchmarks time one helper in isolation. This one invokes each
+lambda_handler the way the agent does, with the decorators, parameter
+parsing, caching and response encoding included, against moto-backed tables
+seeded at each scale:
+
+  get_recipes, get_recipe_usage  catalogs of --recipes items (usage recorded
+                                 for one recipe in four)
+  get_history                    --history-days days of menus, read through
+                                 the widest window the action accepts (365)
+  save_menu, save_menus          meals of --dishes dishes each, drawn from a
+                                 catalog of --catalog recipes (one day and
+                                 MAX_MENUS days per call)
+
+Each scenario is invoked once to warm up, --repeat times to time it, and
+once more under tracemalloc for its peak allocation. The recipe cache is
+cleared before every invocation unless --warm-cache is given, so reads are
+those of a container's first request. DynamoDB calls and consumed capacity
+come from the EMF record instrument_dynamodb prints per invocation. moto
+answers in-process, so a fixed per-call latency is injected, and the
+latency and peak allocation include moto's own work. moto copies every table
+for each transaction, which dominates save_menus at large --dishes.
+
+--output writes the results as JSON. --baseline compares against such a file
+and exits with status 1 when a scenario's median latency grows by more than
+--tolerance percent or it makes more DynamoDB calls. The median is checked
+because p95 and p99 of a few runs move with a single slow invocation.
+
+Usage:
+  python benchmarks/bench_handlers.py --output bench.json
+  python benchmarks/bench_handlers.py --baseline bench.json
+  python benchmarks/bench_handlers.py --recipes 50000 --history-days --dishes \\
+      --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+import boto3
+from moto import mock_aws
+
+ROOT = Path(__file__).parent.parent
+ACTIONS_DIR = ROOT / "src" / "agent_actions"
+sys.path.insert(0, str(ROOT / "src" / "layers" / "common"))
+
+# Handlers read their table names at import time
+TABLES = {
+    "RECIPES_TABLE": "bench-recipes",
+    "HISTORY_TABLE": "bench-history",
+    "USAGE_TABLE": "bench-usage",
+}
+os.environ.update(TABLES)
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+os.environ.setdefault("METRICS_NAMESPACE", "Bench")
+
+from utils import (  # noqa: E402
+    Handler,
+    get_dynamodb,
+    get_dynamodb_client,
+    recipe_cache,
+)
+
+END_DATE = datetime(2025, 12, 31)
+CATEGORIES = ("主菜", "副菜", "汁物")
+MEALS = ("breakfast", "lunch", "dinner")
+# (scenario, action, request factory); factories give a new request per call
+Scenario = tuple[str, str, Callable[[], dict[str, Any]]]
+REQUEST = {
+    "messageVersion": "1.0",
+    "actionGroup": "bench",
+    "apiPath": "/bench",
+    "httpMethod": "GET",
+}
+
+
+def load_handler(action: str) -> Handler:
+    """Import an action's app.py as "<action>_app" and return its handler."""
+    spec = importlib.util.spec_from_file_location(
+        f"{action}_app", ACTIONS_DIR / action / "app.py"
+    )
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Cannot load action {action}")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    handler: Handler = module.lambda_handler
+    return handler
+
+
+def recipe_name(i: int) -> str:
+    return f"レシピ{i:05d}"
+
+
+def create_tables(dynamodb: Any) -> dict[str, Any]:
+    """(Re)create empty recipes, history and usage tables."""
+    for table in dynamodb.tables.all():
+        table.delete()
+    recipes = dynamodb.create_table(
+        TableName=TABLES["RECIPES_TABLE"],
+        KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": "name", "AttributeType": "S"},
+            {"AttributeName": "category", "AttributeType": "S"},
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": "CategoryIndex",
+                "KeySchema": [{"AttributeName": "category", "KeyType": "HASH"}],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    history = dynamodb.create_table(
+        TableName=TABLES["HISTORY_TABLE"],
+        KeySchema=[{"AttributeName": "date", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "date", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    usage = dynamodb.create_table(
+        TableName=TABLES["USAGE_TABLE"],
+        KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    return {"recipes": recipes, "history": history, "usage": usage}
+
+
+def seed_recipes(tables: dict[str, Any], count: int, usage: bool) -> None:
+    """Fill the catalog; with usage, record 3 serving dates for 1 recipe in 4."""
+    with (
+        tables["recipes"].batch_writer() as recipes,
+        tables["usage"].batch_writer() as usage_batch,
+    ):
+        for i in range(count):
+            recipes.put_item(
+                Item={
+                    "name": recipe_name(i),
+                    "category": CATEGORIES[i % 3],
+                    "ingredients": ["玉ねぎ", f"食材{i % 50}"],
+                    "cooking_time": 10 + i % 50,
+                }
+            )
+            if usage and i % 4 == 0:
+                dates = {
+                    (END_DATE - timedelta(days=(i + 30 * k) % 365)).strftime("%Y-%m-%d")
+                    for k in range(3)
+                }
+                usage_batch.put_item(Item={"name": recipe_name(i), "dates": dates})
+
+
+def seed_history(tables: dict[str, Any], days: int) -> None:
+    """A menu on every one of the days up to END_DATE."""
+    with tables["history"].batch_writer() as batch:
+        for i in range(days):
+            names = [recipe_name((3 * i + k) % 1000) for k in range(3)]
+            batch.put_item(
+                Item={
+                    "date": (END_DATE - timedelta(days=i)).strftime("%Y-%m-%d"),
+                    "meals": dict(zip(MEALS, ([name] for name in names))),
+                    "recipes": names,
+                }
+            )
+
+
+def event(**parameters: Any) -> dict[str, Any]:
+    """An agent event carrying the given parameters."""
+    return {
+        **REQUEST,
+        "parameters": [
+            {"name": name, "type": "string", "value": value}
+            for name, value in parameters.items()
+        ],
+    }
+
+
+def meals(dishes: int, catalog: int, offset: int) -> dict[str, list[str]]:
+    """Three meals of dishes catalog recipes each."""
+    return {
+        meal: [recipe_name((offset + m * dishes + d) % catalog) for d in range(dishes)]
+        for m, meal in enumerate(MEALS)
+    }
+
+
+def invoke(handler: Handler, request: dict[str, Any]) -> tuple[float, dict[str, Any]]:
+    """Return the handler's wall time (ms) and its DynamoDB metrics record."""
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        start = time.perf_counter()
+        response = handler(request, None)
+        elapsed = (time.perf_counter() - start) * 1000
+    status = response["response"]["httpStatusCode"]
+    if status >= 300:
+        body = response["response"]["responseBody"]["application/json"]["body"]
+        raise SystemExit(f"handler returned {status}: {body[:500]}")
+    records = [
+        json.loads(line)
+        for line in out.getvalue().splitlines()
+        if "DynamoDBCalls" in line
+    ]
+    return elapsed, records[-1] if records else {}
+
+
+def measure(
+    handler: Handler,
+    make_request: Callable[[], dict[str, Any]],
+    repeat: int,
+    warm_cache: bool,
+) -> dict[str, float]:
+    """Latency percentiles, peak allocation and DynamoDB usage of a scenario."""
+    invoke(handler, make_request())  # imports, clients, connections
+
+    latencies = []
+    record: dict[str, Any] = {}
+    for _ in range(repeat):
+        if not warm_cache:
+            recipe_cache.clear()
+        elapsed, record = invoke(handler, make_request())
+        latencies.append(elapsed)
+
+    if not warm_cache:
+        recipe_cache.clear()
+    tracemalloc.start()
+    invoke(handler, make_request())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    cuts = (
+        statistics.quantiles(latencies, n=100, method="inclusive")
+        if repeat > 1
+        else latencies * 99
+    )
+    return {
+        "p50_ms": round(cuts[49], 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+        "max_ms": round(max(latencies), 2),
+        "peak_kib": round(peak / 1024, 1),
+        "dynamodb_calls": record.get("DynamoDBCalls", 0),
+        "read_units": record.get("ConsumedReadCapacity", 0.0),
+        "write_units": record.get("ConsumedWriteCapacity", 0.0),
+    }
+
+
+def scales(
+    args: argparse.Namespace,
+) -> list[tuple[str, Callable[[dict[str, Any]], list[Scenario]]]]:
+    """Every scale as (label, setup); setup seeds empty tables for its scenarios."""
+    as_of = END_DATE.strftime("%Y-%m-%d")
+    dates = itertools.count(1)  # saves never reuse a date
+
+    def save_date() -> str:
+        return (END_DATE + timedelta(days=next(dates))).strftime("%Y-%m-%d")
+
+    def catalog(count: int) -> Callable[[dict[str, Any]], list[Scenario]]:
+        def setup(tables: dict[str, Any]) -> list[Scenario]:
+            seed_recipes(tables, count, usage=True)
+            return [
+                ("get_recipes", "get_recipes", lambda: event()),
+                (
+                    "get_recipes category",
+                    "get_recipes",
+                    lambda: event(category="主菜", view="names"),
+                ),
+                ("get_recipe_usage", "get_recipe_usage", lambda: event(as_of=as_of)),
+            ]
+
+        return setup
+
+    def history(days: int) -> Callable[[dict[str, Any]], list[Scenario]]:
+        def setup(tables: dict[str, Any]) -> list[Scenario]:
+            seed_history(tables, days)
+            window = str(min(days, 365))
+            return [
+                ("get_history", "get_history", lambda: event(days=window, as_of=as_of))
+            ]
+
+        return setup
+
+    def payload(dishes: int) -> Callable[[dict[str, Any]], list[Scenario]]:
+        def one_day() -> dict[str, Any]:
+            day = meals(dishes, args.catalog, 0)
+            return event(date=save_date(), meals=json.dumps(day, ensure_ascii=False))
+
+        def month() -> dict[str, Any]:
+            menus = [
+                {"date": save_date(), "meals": meals(dishes, args.catalog, day)}
+                for day in range(31)
+            ]
+            return event(menus=json.dumps(menus, ensure_ascii=False))
+
+        def setup(tables: dict[str, Any]) -> list[Scenario]:
+            seed_recipes(tables, args.catalog, usage=False)
+            return [
+                ("save_menu", "save_menu", one_day),
+                ("save_menus", "save_menus", month),
+            ]
+
+        return setup
+
+    return [
+        *((f"recipes={n}", catalog(n)) for n in args.recipes),
+        *((f"history_days={n}", history(n)) for n in args.history_days),
+        *((f"dishes={n}", payload(n)) for n in args.dishes),
+    ]
+
+
+def add_latency(latency_ms: float) -> None:
+    """Sleep before every call of the layer's clients to model the network."""
+
+    def _sleep(**kwargs: Any) -> None:
+        time.sleep(latency_ms / 1000)
+
+    for client in (get_dynamodb().meta.client, get_dynamodb_client()):
+        client.meta.events.register(
+            "before-call.dynamodb", _sleep, unique_id="bench-latency"
+        )
+
+
+def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Print and return the results of every scenario at every scale."""
+    results = []
+    handlers: dict[str, Handler] = {}
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb")
+        add_latency(args.latency_ms)
+
+        print(
+            f"{'scenario':<22} {'scale':<18} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'peak KiB':>9} {'calls':>6} {'RCU':>7} {'WCU':>7}"
+        )
+        for scale, setup in scales(args):
+            for scenario, action, make_request in setup(create_tables(dynamodb)):
+                if action not in handlers:
+                    handlers[action] = load_handler(action)
+                stats = measure(
+                    handlers[action], make_request, args.repeat, args.warm_cache
+                )
+                results.append({"scenario": scenario, "scale": scale, **stats})
+                print(
+                    f"{scenario:<22} {scale:<18} {stats['p50_ms']:>8.1f} "
+                    f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} "
+                    f"{stats['peak_kib']:>9.0f} {stats['dynamodb_calls']:>6} "
+                    f"{stats['read_units']:>7.1f} {stats['write_units']:>7.1f}"
+                )
+    return results
+
+
+def compare(
+    results: list[dict[str, Any]], baseline: dict[str, Any], tolerance: float
+) -> bool:
+    """Print the change against a baseline run; return False on a regression."""
+    previous = {(r["scenario"], r["scale"]): r for r in baseline["results"]}
+    ok = True
+
+    print(
+        f"\n{'scenario':<22} {'scale':<18} {'p50 Δ%':>8} {'p95 Δ%':>8} "
+        f"{'peak Δ%':>8} {'calls':>9}"
+    )
+    for result in results:
+        before = previous.get((result["scenario"], result["scale"]))
+        if before is None:
+            continue  # a scale the baseline did not run
+
+        def change(key: str) -> float:
+            return float((result[key] / before[key] - 1) * 100) if before[key] else 0.0
+
+        slower = change("p50_ms") > tolerance
+        more_calls = result["dynamodb_calls"] > before["dynamodb_calls"]
+        print(
+            f"{result['scenario']:<22} {result['scale']:<18} "
+            f"{change('p50_ms'):>+8.1f} {change('p95_ms'):>+8.1f} "
+            f"{change('peak_kib'):>+8.1f} "
+            f"{before['dynamodb_calls']:>4}→{result['dynamodb_calls']:<4}"
+            + ("  slower" if slower else "")
+            + ("  more calls" if more_calls else "")
+        )
+        ok = ok and not (slower or more_calls)
+
+    if not ok:
+        print(f"\nRegression against the baseline (median tolerance {tolerance}%)")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--recipes", type=int, nargs="*", default=[100, 1000, 10000])
+    parser.add_argument("--history-days", type=int, nargs="*", default=[30, 365, 3650])
+    parser.add_argument(
+        "--dishes", type=int, nargs="*", default=[3, 10, 30], help="Dishes per meal"
+    )
+    parser.add_argument(
+        "--catalog", type=int, default=1000, help="Recipes the saved dishes come from"
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=20.0, help="Injected per-call latency"
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warm-cache", action="store_true")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Results JSON to compare with")
+    parser.add_argument(
+        "--tolerance", type=float, default=20.0, help="Allowed median growth in percent"
+    )
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        report = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "options": {
+                "latency_ms": args.latency_ms,
+                "repeat": args.repeat,
+                "warm_cache": args.warm_cache,
+                "catalog": args.catalog,
+            },
+            "results": results,
+        }
+        args.output.write_text(
+            json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+        )
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmark reading a menu history window: per-day keys vs. one range Query.
+
+The legacy table is keyed by date alone, so get_history asks for one key per
+day of the window through BatchGetItem (100 keys per call), including days
+with no menu. The range-keyed table (household + date) reads the same window
+with a single Query using BETWEEN on the sort key. The legacy layout is also
+measured through batch_get_all with sequential and concurrent chunks.
+
+Both tables hold the same sparse history (by default a menu on 1 day in 4).
+A fixed per-call latency is injected to model the network round trip, and
+every DynamoDB request is counted.
+
+Usage:
+  python benchmarks/bench_history_window.py
+  python benchmarks/bench_history_window.py --days 30 365 --density 0.1
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "layers" / "common"))
+
+from utils import batch_get_all, get_dynamodb_client, query_history  # noqa: E402
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+
+LEGACY_TABLE = "bench-history"
+RANGE_TABLE = "bench-history-v2"
+HOUSEHOLD = "bench"
+END_DATE = datetime(2025, 12, 31)
+
+
+def create_tables(dynamodb: Any, density: float) -> tuple[Any, Any]:
+    """Create both history layouts holding the same year of sparse menus."""
+    legacy = dynamodb.create_table(
+        TableName=LEGACY_TABLE,
+        KeySchema=[{"AttributeName": "date", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "date", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    ranged = dynamodb.create_table(
+        TableName=RANGE_TABLE,
+        KeySchema=[
+            {"AttributeName": "household", "KeyType": "HASH"},
+            {"AttributeName": "date", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "household", "AttributeType": "S"},
+            {"AttributeName": "date", "AttributeType": "S"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+    rng = random.Random(0)
+    with legacy.batch_writer() as legacy_batch, ranged.batch_writer() as range_batch:
+        for i in range(365):
+            if rng.random() >= density:
+                continue
+            item = {
+                "date": (END_DATE - timedelta(days=i)).strftime("%Y-%m-%d"),
+                "meals": {"dinner": ["カレーライス", "味噌汁"]},
+                "recipes": ["カレーライス", "味噌汁"],
+            }
+            legacy_batch.put_item(Item=item)
+            range_batch.put_item(Item={"household": HOUSEHOLD, **item})
+    return legacy, ranged
+
+
+def day_keys(days: int) -> list[dict[str, str]]:
+    """One legacy table key per day of the window."""
+    return [
+        {"date": (END_DATE - timedelta(days=i)).strftime("%Y-%m-%d")}
+        for i in range(days)
+    ]
+
+
+def read_by_day(dynamodb: Any, days: int) -> list[dict[str, Any]]:
+    """The original get_history read: 100 keys per call, one call at a time."""
+    keys = day_keys(days)
+    items: list[dict[str, Any]] = []
+    for i in range(0, len(keys), 100):
+        response = dynamodb.batch_get_item(
+            RequestItems={LEGACY_TABLE: {"Keys": keys[i : i + 100]}}
+        )
+        items.extend(response.get("Responses", {}).get(LEGACY_TABLE, []))
+    return items
+
+
+def read_by_query(table: Any, days: int) -> list[dict[str, Any]]:
+    """The range-keyed get_history read: one Query over the window."""
+    start = (END_DATE - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    items, _ = query_history(table, HOUSEHOLD, start, END_DATE.strftime("%Y-%m-%d"))
+    return items
+
+
+class RequestCounter:
+    """Count DynamoDB requests and sleep before each to model latency."""
+
+    def __init__(self, latency_ms: float) -> None:
+        self.latency_ms = latency_ms
+        self.count = 0
+
+    def __call__(self, **kwargs: Any) -> None:
+        self.count += 1
+        time.sleep(self.latency_ms / 1000)
+
+
+def measure(
+    fn: Callable[[], list[Any]], counter: RequestCounter, repeat: int
+) -> tuple[float, int, int]:
+    """Return best wall time (ms), requests per run and the item count."""
+    best = float("inf")
+    requests = count = 0
+    for _ in range(repeat):
+        counter.count = 0
+        start = time.perf_counter()
+        # batch_get_all prints one metrics record per call
+        with contextlib.redirect_stdout(io.StringIO()):
+            count = len(fn())
+        best = min(best, (time.perf_counter() - start) * 1000)
+        requests = counter.count
+    return best, requests, count
+
+
+def run(days_list: list[int], density: float, latency_ms: float, repeat: int) -> None:
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb")
+        legacy, ranged = create_tables(dynamodb, density)
+        counter = RequestCounter(latency_ms)
+        # The layer's read helpers use their own low-level client
+        for client in (dynamodb.meta.client, get_dynamodb_client()):
+            client.meta.events.register("before-call.dynamodb", counter)
+
+        print(f"{'days':>5} {'method':<24} {'items':>6} {'requests':>9} {'best ms':>9}")
+        for days in days_list:
+            for label, fn in (
+                ("BatchGetItem per day", lambda: read_by_day(dynamodb, days)),
+                (
+                    "batch_get_all workers=1",
+                    lambda: batch_get_all(legacy, day_keys(days), max_workers=1),
+                ),
+                (
+                    "batch_get_all workers=4",
+                    lambda: batch_get_all(legacy, day_keys(days), max_workers=4),
+                ),
+                ("Query BETWEEN", lambda: read_by_query(ranged, days)),
+            ):
+                elapsed, requests, count = measure(fn, counter, repeat)
+                print(f"{days:>5} {label:<24} {count:>6} {requests:>9} {elapsed:>9.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 30, 90, 365])
+    parser.add_argument(
+        "--density", type=float, default=0.25, help="Fraction of days with a menu"
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=20.0, help="Injected per-call latency"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.days, args.density, args.latency_ms, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark encoding large catalogs and histories into agent response bodies.
+
+Handlers used to run decimal_to_float over items read through the resource
+layer and then encode the result with json.dumps. encode_json encodes
+Decimal, set, date and datetime values directly, with the stdlib json module
+by default and with orjson when JSON_ENCODER=orjson opts into compact UTF-8
+bodies.
+
+Each method encodes the same Decimal-valued payload (recipe-shaped and
+history-shaped items, as the resource layer returns them). The stdlib
+encode_json output is checked to be byte-identical to the old path, and
+the orjson output to decode to the same value.
+
+Usage:
+  python benchmarks/bench_json_encode.py
+  python benchmarks/bench_json_encode.py --items 1000 10000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "layers" / "common"))
+
+import utils  # noqa: E402
+from utils import decimal_to_float, encode_json  # noqa: E402
+
+CATEGORIES = ["主菜", "副菜", "汁物", "主食", "デザート"]
+
+
+def recipe_items(count: int) -> list[dict[str, Any]]:
+    """Recipes as returned by a resource-layer Scan of the recipes table."""
+    return [
+        {
+            "name": f"レシピ{i:06d}",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "ingredients": ["玉ねぎ", "にんじん", "豚肉", f"食材{i % 50}"],
+            "cooking_time": Decimal(10 + i % 50),
+            "servings": Decimal(2 + i % 3),
+            "rating": Decimal("4.5"),
+            "recipe_url": f"https://example.com/recipes/{i}",
+        }
+        for i in range(count)
+    ]
+
+
+def history_items(count: int) -> list[dict[str, Any]]:
+    """Menus as returned by a resource-layer history Query."""
+    end = datetime(2025, 12, 31)
+    return [
+        {
+            "date": (end - timedelta(days=i)).strftime("%Y-%m-%d"),
+            "meals": {
+                "lunch": ["カレーライス"],
+                "dinner": ["鮭の塩焼き", "ほうれん草のおひたし", "味噌汁"],
+            },
+            "recipes": ["カレーライス", "鮭の塩焼き", "ほうれん草のおひたし", "味噌汁"],
+            "version": Decimal(1 + i % 3),
+            "created_at": "2025-11-08T10:00:00",
+            "updated_at": "2025-11-08T10:00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def walk_then_dumps(body: dict[str, Any]) -> str:
+    """The old path: decimal_to_float, then json.dumps with default settings."""
+    return json.dumps(decimal_to_float(body))
+
+
+def encode_with(encoder: str) -> Callable[[dict[str, Any]], str]:
+    """encode_json with the given JSON_ENCODER setting."""
+
+    def encode(body: dict[str, Any]) -> str:
+        utils.JSON_ENCODER = encoder
+        return encode_json(body)
+
+    return encode
+
+
+def measure(
+    fn: Callable[[dict[str, Any]], str], body: dict[str, Any], repeat: int
+) -> tuple[float, str]:
+    """Return best wall time (ms) and the encoded body."""
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(body)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best, result
+
+
+def run(sizes: list[int], repeat: int) -> None:
+    methods: list[tuple[str, Callable[[dict[str, Any]], str]]] = [
+        ("decimal_to_float + json.dumps", walk_then_dumps),
+        ("encode_json (stdlib)", encode_with("stdlib")),
+    ]
+    if utils.HAVE_ORJSON:
+        methods.append(("encode_json (orjson)", encode_with("orjson")))
+    else:
+        print("orjson is not installed, skipping the orjson encoder\n")
+
+    print(
+        f"{'payload':<8} {'items':>6} {'method':<30} {'best ms':>9} "
+        f"{'us/item':>8} {'KB':>8}"
+    )
+    for label, build in (("recipes", recipe_items), ("history", history_items)):
+        for size in sizes:
+            body = {label: build(size)}
+            expected: Any = None
+            old_body = ""
+            for method, fn in methods:
+                elapsed, encoded = measure(fn, body, repeat)
+                if expected is None:
+                    expected = json.loads(encoded)
+                elif json.loads(encoded) != expected:
+                    raise SystemExit(f"{method} returned a different value")
+                if method == "decimal_to_float + json.dumps":
+                    old_body = encoded
+                elif method == "encode_json (stdlib)" and encoded != old_body:
+                    raise SystemExit("stdlib encode_json changed the body bytes")
+                print(
+                    f"{label:<8} {size:>6} {method:<30} {elapsed:>9.1f} "
+                    f"{elapsed * 1000 / size:>8.2f} {len(encoded.encode()) / 1024:>8.0f}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--items", type=int, nargs="+", default=[10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.items, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark parsing Bedrock Agent parameters in the key=value format.
+
+Bedrock Agent sometimes sends parameters Java toString style
+({lunch=[焼きそば, サラダ]}) instead of JSON. parse_bedrock_parameter used to
+rewrite such strings into JSON with four regex passes and then json.loads
+them; it now quotes the scalars with str methods (no Python code per token)
+before json.loads, and scans anything that needs context in a single pass.
+
+Both parsers run on multi-day save_menus payloads. The regex chain cannot
+parse unquoted array elements, so it is measured on payloads with quoted
+strings (the only form it accepted) while the single-pass parser is
+measured on both. The JSON form is included as the json.loads baseline.
+
+Usage:
+  python benchmarks/bench_parse_parameter.py
+  python benchmarks/bench_parse_parameter.py --days 7 31 365 --repeat 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "layers" / "common"))
+
+from utils import parse_bedrock_parameter  # noqa: E402
+
+DISHES = ["カレーライス", "鮭の塩焼き", "ほうれん草のおひたし", "味噌汁", "白米"]
+
+
+def legacy_parse(value: str) -> Any:
+    """The regex chain parse_bedrock_parameter used before."""
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        pass
+    converted = value.replace("=", ":")
+    converted = re.sub(r"([{,]\s*)([a-z_]+):", r'\1"\2":', converted)
+    converted = re.sub(r":\s*([a-zA-Z][a-zA-Z0-9_]*)", r': "\1"', converted)
+    converted = re.sub(
+        r':\s*([^"\[\]{},:\s][^,}\]]*?)([,}\]])',
+        lambda m: f': "{m.group(1).strip()}"{m.group(2)}',
+        converted,
+    )
+    return json.loads(converted)
+
+
+def menus(days: int) -> list[dict[str, Any]]:
+    """A save_menus "menus" value with three meals a day."""
+    start = datetime(2025, 11, 1)
+    return [
+        {
+            "date": (start + timedelta(days=i)).strftime("%Y-%m-%d"),
+            "meals": {
+                "breakfast": [DISHES[i % 5], DISHES[4]],
+                "lunch": [DISHES[(i + 1) % 5]],
+                "dinner": [DISHES[(i + 2) % 5], DISHES[3], DISHES[4]],
+            },
+            "notes": f"{i + 1}日目",
+        }
+        for i in range(days)
+    ]
+
+
+def bedrock_format(value: Any, quote: bool) -> str:
+    """Render a value Java toString style, optionally quoting list elements."""
+    if isinstance(value, dict):
+        items = (f"{k}={bedrock_format(v, quote)}" for k, v in value.items())
+        return "{" + ", ".join(items) + "}"
+    if isinstance(value, list):
+        return "[" + ", ".join(bedrock_format(v, quote) for v in value) + "]"
+    return json.dumps(value, ensure_ascii=False) if quote else str(value)
+
+
+def measure(fn: Callable[[str], Any], text: str, repeat: int) -> float:
+    """Return the best time per call in microseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, (time.perf_counter() - start) * 1_000_000)
+    return best
+
+
+def run(sizes: list[int], repeat: int) -> None:
+    print(f"{'days':>5} {'input':<20} {'parser':<12} {'KB':>6} {'best us':>10}")
+    for days in sizes:
+        value = menus(days)
+        inputs = [
+            ("json", json.dumps(value, ensure_ascii=False)),
+            ("key=value, quoted", bedrock_format(value, quote=True)),
+            ("key=value", bedrock_format(value, quote=False)),
+        ]
+        for label, text in inputs:
+            if parse_bedrock_parameter(text) != value:
+                raise SystemExit(f"single-pass parser misread the {label} input")
+            parsers: list[tuple[str, Callable[[str], Any]]] = [
+                ("single-pass", parse_bedrock_parameter)
+            ]
+            if label != "key=value":
+                if legacy_parse(text) != value:
+                    raise SystemExit(f"regex chain misread the {label} input")
+                parsers.insert(0, ("regex chain", legacy_parse))
+            for name, fn in parsers:
+                elapsed = measure(fn, text, repeat)
+                print(
+                    f"{days:>5} {label:<20} {name:<12} "
+                    f"{len(text.encode()) / 1024:>6.1f} {elapsed:>10.1f}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 31, 365])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    run(args.days, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark full-catalog recipe scans against a moto-backed DynamoDB table.
+
+Compares the old single ``table.scan()`` call (which silently stops at the
+1 MB page boundary) with ``scan_all`` run sequentially and with parallel
+Segment/TotalSegments workers.
+
+moto answers in-process, so a fixed per-call latency is injected to model the
+network round trip a real Lambda pays for every Scan page. moto's own
+per-item CPU cost is serialized by the GIL, so the parallel speed-up measured
+here is a lower bound of what real DynamoDB segments deliver.
+
+Usage:
+  python benchmarks/bench_recipe_scan.py
+  python benchmarks/bench_recipe_scan.py --sizes 1000 10000 --segments 1 4 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "layers" / "common"))
+
+from utils import get_dynamodb_client, scan_all  # noqa: E402
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+
+TABLE_NAME = "bench-recipes"
+CATEGORIES = ["主菜", "副菜", "汁物", "主食", "デザート"]
+
+
+def create_catalog(dynamodb: Any, size: int) -> Any:
+    """Create a recipe table holding ``size`` realistic-looking recipes."""
+    table = dynamodb.create_table(
+        TableName=TABLE_NAME,
+        KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    with table.batch_writer() as batch:
+        for i in range(size):
+            batch.put_item(
+                Item={
+                    "name": f"レシピ{i:06d}",
+                    "category": CATEGORIES[i % len(CATEGORIES)],
+                    "ingredients": ["玉ねぎ", "にんじん", "豚肉", f"食材{i % 50}"],
+                    "instructions": "材料を切って炒め、調味料で味を調える。" * 4,
+                    "recipe_url": f"https://example.com/recipes/{i}",
+                }
+            )
+    return table
+
+
+def add_latency(table: Any, latency_ms: float) -> None:
+    """Sleep before every DynamoDB call to model a network round trip."""
+
+    def _sleep(**kwargs: Any) -> None:
+        time.sleep(latency_ms / 1000)
+
+    # scan_all reads through the layer's own low-level client
+    for client in (table.meta.client, get_dynamodb_client()):
+        client.meta.events.register(
+            "before-call.dynamodb.Scan", _sleep, unique_id="bench-latency"
+        )
+
+
+def timed(fn: Callable[[], list[Any]], repeat: int) -> tuple[float, int]:
+    """Return the best wall time (ms) over ``repeat`` runs and the item count."""
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(fn())
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best, count
+
+
+def run(sizes: list[int], segments: list[int], latency_ms: float, repeat: int) -> None:
+    print(f"{'recipes':>8} {'method':<22} {'items':>8} {'best ms':>10}")
+    for size in sizes:
+        with mock_aws():
+            dynamodb = boto3.resource("dynamodb")
+            table = create_catalog(dynamodb, size)
+            add_latency(table, latency_ms)
+
+            elapsed, count = timed(lambda: table.scan()["Items"], repeat)
+            print(f"{size:>8} {'table.scan() (old)':<22} {count:>8} {elapsed:>10.1f}")
+
+            for total_segments in segments:
+                elapsed, count = timed(
+                    lambda: scan_all(table, total_segments=total_segments)[0], repeat
+                )
+                label = f"scan_all segments={total_segments}"
+                print(f"{size:>8} {label:<22} {count:>8} {elapsed:>10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument(
+        "--latency-ms", type=float, default=20.0, help="Injected per-call latency"
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    run(args.sizes, args.segments, args.latency_ms, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
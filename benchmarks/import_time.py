@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Report the import time of every action handler and check it against a budget.
+
+Everything a handler imports at module level runs during the Lambda INIT
+phase of every cold start. Each handler is imported in a fresh interpreter
+with ``python -X importtime`` and the report is parsed into the cumulative
+import time of ``app`` (the layer and everything it pulls in) and the
+modules that took longest.
+
+With --check the script exits with status 1 when a handler exceeds its
+budget in import_budget.json or loads a module the budget forbids at import
+(boto3 and the type stubs, which the layer imports on first use).
+
+Usage:
+  python benchmarks/import_time.py
+  python benchmarks/import_time.py --check
+  python benchmarks/import_time.py --actions get_history save_menu --repeat 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).parent.parent
+ACTIONS_DIR = ROOT / "src" / "agent_actions"
+LAYER_DIR = ROOT / "src" / "layers" / "common"
+BUDGET_FILE = Path(__file__).parent / "import_budget.json"
+
+# Handlers read their table names at import time
+HANDLER_ENV = {
+    "RECIPES_TABLE": "import-time-recipes",
+    "HISTORY_TABLE": "import-time-history",
+    "USAGE_TABLE": "import-time-usage",
+}
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """
+    Parse ``-X importtime`` output.
+
+    Returns:
+        (module, self µs, cumulative µs, nesting depth) per imported module,
+        in the order the report lists them
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def measure_action(action: str) -> tuple[int, list[tuple[str, int, int, int]]]:
+    """
+    Import one handler in a fresh interpreter.
+
+    Returns:
+        The cumulative import time of app in µs, and the parsed report of the
+        modules imported under it
+    """
+    env = {
+        **os.environ,
+        **HANDLER_ENV,
+        "PYTHONPATH": os.pathsep.join([str(ACTIONS_DIR / action), str(LAYER_DIR)]),
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ACTIONS_DIR / action,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"importing {action} failed:\n{result.stderr}")
+
+    modules = parse_importtime(result.stderr)
+    # The report lists children before their parent; app is the last entry
+    # at depth 0 and its subtree is the run of deeper entries before it
+    app_index = max(i for i, m in enumerate(modules) if m[0] == "app" and m[3] == 0)
+    start = app_index
+    while start > 0 and modules[start - 1][3] > 0:
+        start -= 1
+    return modules[app_index][2], modules[start:app_index]
+
+
+def load_budget() -> dict[str, Any]:
+    with open(BUDGET_FILE, encoding="utf-8") as f:
+        budget: dict[str, Any] = json.load(f)
+    return budget
+
+
+def run(actions: list[str], repeat: int, top: int, check: bool) -> bool:
+    """Print the report; return False if a handler is over budget."""
+    budget = load_budget()
+    forbidden = set(budget["forbidden_modules"])
+    ok = True
+
+    print(
+        f"{'action':<18} {'best ms':>8} {'budget':>7}  slowest imports (cumulative ms)"
+    )
+    for action in actions:
+        runs = [measure_action(action) for _ in range(repeat)]
+        best_us, modules = min(runs, key=lambda r: r[0])
+        limit_ms = budget["max_ms"].get(action, budget["max_ms"]["default"])
+        slowest = sorted((m for m in modules if m[3] == 1), key=lambda m: -m[2])
+        summary = ", ".join(f"{m[0]} {m[2] / 1000:.1f}" for m in slowest[:top])
+        print(f"{action:<18} {best_us / 1000:>8.1f} {limit_ms:>7}  {summary}")
+
+        loaded = {m[0] for m in modules} & forbidden
+        if loaded:
+            ok = False
+            print(f"  loads at import: {', '.join(sorted(loaded))}")
+        if best_us / 1000 > limit_ms:
+            ok = False
+            print(f"  over budget by {best_us / 1000 - limit_ms:.1f} ms")
+
+    if check and not ok:
+        print("\nImport-time budget exceeded (see benchmarks/import_budget.json)")
+    return ok
+
+
+def main() -> None:
+    actions = sorted(p.name for p in ACTIONS_DIR.iterdir() if (p / "app.py").exists())
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--actions", nargs="+", default=actions, choices=actions)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+    ok = run(args.actions, args.repeat, args.top, args.check)
+    if args.check and not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
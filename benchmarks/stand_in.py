@@ -0,0 +1,104 @@
+"""
+Local HTTP stand-in for DynamoDB, shared by the benchmarks.
+
+moto's in-process mock imports boto3 and skips the network. Its server mode
+needs Flask, which is not a dev dependency. The stand-in is a plain
+http.server. Point a client at it with endpoint_url, or set
+AWS_ENDPOINT_URL_DYNAMODB in a child process. It answers every call of an
+operation with the same canned body: a Scan returns the same items every
+time and a write always succeeds. Reads and connection setup then cost the
+same on every run.
+
+Each new connection is charged a setup delay, like a TLS handshake, and a
+share of requests can be stalled, as in a brownout.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+GET_ITEM = {"Item": {"name": {"S": "カレーライス"}, "servings": {"N": "2"}}}
+
+
+class StandInServer(ThreadingHTTPServer):
+    """DynamoDB stand-in answering each operation with a canned response."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        responses: dict[str, Any] | None = None,
+        service_ms: float = 2,
+        connect_ms: float = 30,
+        stall_rate: float = 0,
+        stall_seconds: float = 0,
+    ) -> None:
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        # Operation name (e.g. "Scan") -> response body; GetItem by default
+        self.responses = {
+            operation: json.dumps(body, ensure_ascii=False).encode()
+            for operation, body in {"GetItem": GET_ITEM, **(responses or {})}.items()
+        }
+        self.service_ms = service_ms
+        self.connect_ms = connect_ms
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.connections = 0
+        self.requests: dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.random = random.Random(0)
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self) -> StandInServer:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def count(self, operation: str) -> bool:
+        """Record a request; return True if it should stall."""
+        with self.lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+            return self.random.random() < self.stall_rate
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open between calls
+    server: StandInServer
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.connect_ms / 1000)
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        # X-Amz-Target: DynamoDB_20120810.<Operation>
+        operation = self.headers.get("X-Amz-Target", "").rpartition(".")[2]
+        if self.server.count(operation):
+            time.sleep(self.server.stall_seconds)
+        time.sleep(self.server.service_ms / 1000)
+        body = self.server.responses.get(operation, b"{}")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-amz-json-1.0")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("x-amzn-RequestId", "stand-in")
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out and hung up
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
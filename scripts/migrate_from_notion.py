@@ -10,6 +10,7 @@ import boto3
 import logging
 import os
 import sys
+import uuid
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from pathlib import Path
@@ -287,6 +288,12 @@ def insert_recipes_to_dynamodb(recipes: List[Dict], table_name: str) -> int:
         except Exception as e:
             logger.error(f"✗ レシピ挿入エラー ({recipe['name']}): {str(e)}")
 
+    if created_count:
+        # Lambdaのレシピキャッシュを無効化するためカタログバージョンを更新
+        table.put_item(
+            Item={"name": "__catalog_version__", "version": uuid.uuid4().hex}
+        )
+
     return created_count
 
 
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+献立履歴を日付キーのテーブルから世帯+日付キーのテーブルへ移行するスクリプト
+
+旧テーブル (kondate-menu-history) は date のみをキーにしているため、
+期間の取得に1日1キーの BatchGetItem が必要になる。
+新テーブル (kondate-menu-history-v2) は household (パーティションキー) と
+date (ソートキー) を持ち、期間を1回の Query (BETWEEN) で取得できる。
+
+移行後、テンプレートの HistoryHousehold パラメータに同じ世帯IDを設定して
+デプロイすると、Lambda が新テーブルを使うようになる。
+
+使い方:
+  python scripts/migrate_history_to_range_key.py --household home
+  python scripts/migrate_history_to_range_key.py --household home --dry-run
+"""
+import argparse
+import boto3
+import logging
+from typing import Any, Dict, List
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+# DynamoDB configuration
+REGION = "ap-northeast-1"
+SOURCE_TABLE = "kondate-menu-history"
+TARGET_TABLE = "kondate-menu-history-v2"
+
+dynamodb = boto3.resource("dynamodb", region_name=REGION)
+
+
+def read_legacy_history(table_name: str) -> List[Dict[str, Any]]:
+    """
+    旧テーブルの献立履歴をすべて読み込む
+
+    Args:
+        table_name: 旧テーブル名
+
+    Returns:
+        献立履歴アイテムのリスト
+    """
+    table = dynamodb.Table(table_name)
+    response = table.scan()
+    items = response.get("Items", [])
+
+    # Handle pagination
+    while "LastEvaluatedKey" in response:
+        response = table.scan(ExclusiveStartKey=response["LastEvaluatedKey"])
+        items.extend(response.get("Items", []))
+
+    return items
+
+
+def migrate_history(
+    items: List[Dict[str, Any]], table_name: str, household: str
+) -> int:
+    """
+    献立履歴を世帯IDを付けて新テーブルへ書き込む
+
+    同じ (household, date) のアイテムは上書きされるため、何度実行しても安全。
+
+    Args:
+        items: 旧テーブルから読み込んだアイテム
+        table_name: 新テーブル名
+        household: パーティションキーに使う世帯ID
+
+    Returns:
+        書き込んだアイテム数
+    """
+    table = dynamodb.Table(table_name)
+    written = 0
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item={"household": household, **item})
+            written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="献立履歴を世帯+日付キーのテーブルへ移行します"
+    )
+    parser.add_argument(
+        "--household", required=True, help="新テーブルのパーティションキーに使う世帯ID"
+    )
+    parser.add_argument(
+        "--source", default=SOURCE_TABLE, help=f"移行元テーブル (default: {SOURCE_TABLE})"
+    )
+    parser.add_argument(
+        "--target", default=TARGET_TABLE, help=f"移行先テーブル (default: {TARGET_TABLE})"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="書き込まずに件数だけ表示"
+    )
+
+    args = parser.parse_args()
+
+    logger.info(f"'{args.source}' から献立履歴を読み込み中...")
+    items = read_legacy_history(args.source)
+    logger.info(f"  {len(items)} 件の献立履歴が見つかりました")
+
+    if args.dry_run:
+        dates = sorted(item["date"] for item in items)
+        if dates:
+            logger.info(f"  期間: {dates[0]} 〜 {dates[-1]}")
+        logger.info("\n--dry-run のため書き込みは行いません")
+        return
+
+    logger.info(f"'{args.target}' へ household={args.household} で書き込み中...")
+    written = migrate_history(items, args.target, args.household)
+
+    logger.info("\n" + "=" * 60)
+    logger.info("移行完了!")
+    logger.info(f"合計: {written} 件の献立履歴を移行しました")
+    logger.info(
+        f"HistoryHousehold パラメータに '{args.household}' を設定してデプロイしてください"
+    )
+    logger.info("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
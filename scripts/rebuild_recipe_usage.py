@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+献立履歴からレシピ利用統計テーブルを再構築するスクリプト
+
+save_menu は献立を保存するたびにレシピ利用統計 (kondate-recipe-usage) を
+差分更新する。このスクリプトは履歴テーブル全体から統計を作り直すもので、
+次のような場合に使う:
+  - 利用統計テーブルを初めて作成したとき（既存の履歴を取り込む）
+  - seed_data.py や migrate_from_notion.py で履歴を直接投入したとき
+  - 統計の更新に失敗したログが出ていたとき
+
+使い方:
+  python scripts/rebuild_recipe_usage.py
+  python scripts/rebuild_recipe_usage.py --history-table kondate-menu-history-v2 --household home
+"""
+import argparse
+import boto3
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+# DynamoDB configuration
+REGION = "ap-northeast-1"
+HISTORY_TABLE = "kondate-menu-history"
+USAGE_TABLE = "kondate-recipe-usage"
+# utils.USAGE_HORIZON_DAYS と同じ値: これより古い利用日は
+# archived_use_count / archived_last_used に集約し、境界日を archived_before に記録する
+USAGE_HORIZON_DAYS = 90
+
+dynamodb = boto3.resource("dynamodb", region_name=REGION)
+
+
+def collect_usage(table_name: str, household: Optional[str]) -> Dict[str, Set[str]]:
+    """
+    履歴テーブルを読み込み、レシピごとの利用日セットを作成
+
+    Args:
+        table_name: 献立履歴テーブル名
+        household: 世帯+日付キーのテーブルの場合の世帯ID（旧テーブルはNone）
+
+    Returns:
+        レシピ名 -> 利用日 (YYYY-MM-DD) のセット
+    """
+    table = dynamodb.Table(table_name)
+    response = table.scan()
+    items = response.get("Items", [])
+
+    # Handle pagination
+    while "LastEvaluatedKey" in response:
+        response = table.scan(ExclusiveStartKey=response["LastEvaluatedKey"])
+        items.extend(response.get("Items", []))
+
+    usage: Dict[str, Set[str]] = {}
+    for item in items:
+        if household and item.get("household") != household:
+            continue
+        for name in item.get("recipes", []):
+            usage.setdefault(name, set()).add(item["date"])
+    return usage
+
+
+def build_usage_item(name: str, dates: Set[str], today: str) -> Dict[str, Any]:
+    """
+    レシピ利用統計のアイテムを作成
+
+    利用日は今日（最後の利用日が今日より前ならその日）から
+    USAGE_HORIZON_DAYS 日以内のものだけをセットに残し、それより古いものは
+    件数と最終日にまとめ、境界日を archived_before に記録する
+    （save_menu の書き込み時の整理と同じ規則）。
+
+    Args:
+        name: レシピ名
+        dates: 利用日 (YYYY-MM-DD) のセット
+        today: 基準日 (YYYY-MM-DD)
+
+    Returns:
+        利用統計テーブルのアイテム
+    """
+    anchor = min(today, max(dates))
+    horizon = (
+        datetime.strptime(anchor, "%Y-%m-%d") - timedelta(days=USAGE_HORIZON_DAYS - 1)
+    ).strftime("%Y-%m-%d")
+    recent = {d for d in dates if d >= horizon}
+    archived = dates - recent
+
+    item: Dict[str, Any] = {"name": name}
+    if recent:
+        item["dates"] = recent
+    if archived:
+        item["archived_before"] = horizon
+        item["archived_use_count"] = len(archived)
+        item["archived_last_used"] = max(archived)
+    return item
+
+
+def write_usage(table_name: str, usage: Dict[str, Set[str]]) -> int:
+    """
+    利用統計テーブルを履歴から作った内容で置き換える
+
+    履歴に現れないレシピのアイテムは削除する。
+
+    Args:
+        table_name: レシピ利用統計テーブル名
+        usage: レシピ名 -> 利用日のセット
+
+    Returns:
+        書き込んだアイテム数
+    """
+    table = dynamodb.Table(table_name)
+
+    response = table.scan(
+        ProjectionExpression="#name", ExpressionAttributeNames={"#name": "name"}
+    )
+    existing = {item["name"] for item in response.get("Items", [])}
+    while "LastEvaluatedKey" in response:
+        response = table.scan(
+            ProjectionExpression="#name",
+            ExpressionAttributeNames={"#name": "name"},
+            ExclusiveStartKey=response["LastEvaluatedKey"],
+        )
+        existing.update(item["name"] for item in response.get("Items", []))
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    with table.batch_writer() as batch:
+        for name in existing - set(usage):
+            batch.delete_item(Key={"name": name})
+        for name, dates in usage.items():
+            batch.put_item(Item=build_usage_item(name, dates, today))
+    return len(usage)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="献立履歴からレシピ利用統計テーブルを再構築します"
+    )
+    parser.add_argument(
+        "--history-table", default=HISTORY_TABLE, help=f"履歴テーブル名 (default: {HISTORY_TABLE})"
+    )
+    parser.add_argument(
+        "--usage-table", default=USAGE_TABLE, help=f"利用統計テーブル名 (default: {USAGE_TABLE})"
+    )
+    parser.add_argument(
+        "--household", help="世帯+日付キーの履歴テーブルを使う場合の世帯ID"
+    )
+
+    args = parser.parse_args()
+
+    logger.info(f"'{args.history_table}' から献立履歴を読み込み中...")
+    usage = collect_usage(args.history_table, args.household)
+    total_days = sum(len(dates) for dates in usage.values())
+    logger.info(f"  {len(usage)} 件のレシピ、延べ {total_days} 日分の利用が見つかりました")
+
+    logger.info(f"'{args.usage_table}' を書き換え中...")
+    written = write_usage(args.usage_table, usage)
+
+    logger.info("\n" + "=" * 60)
+    logger.info("再構築完了!")
+    logger.info(f"合計: {written} 件のレシピ利用統計を書き込みました")
+    logger.info("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
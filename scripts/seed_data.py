@@ -10,6 +10,7 @@ import argparse
 import logging
 from datetime import datetime, timedelta
 import random
+import uuid
 
 # Configure logging for CLI script
 logging.basicConfig(
@@ -20,6 +21,9 @@ logger = logging.getLogger(__name__)
 # DynamoDBクライアント
 dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
 
+# カタログバージョン管理用の予約アイテム（レシピではない）
+CATALOG_VERSION_KEY = "__catalog_version__"
+
 # サンプルレシピデータ
 # カテゴリ: 主菜 (main dish), 副菜 (side dish), 汁物 (soup), 主食 (staple/carbs), デザート (dessert)
 SAMPLE_RECIPES = [
@@ -170,9 +174,19 @@ def create_recipes(table_name, count):
         except Exception as e:
             logger.error(f"✗ レシピ作成エラー ({recipe['name']}): {str(e)}")
 
+    if created_count:
+        bump_catalog_version(table_name)
+
     return created_count
 
 
+def bump_catalog_version(table_name):
+    """レシピカタログのバージョンを更新（Lambdaのレシピキャッシュを無効化）"""
+    dynamodb.Table(table_name).put_item(
+        Item={"name": CATALOG_VERSION_KEY, "version": uuid.uuid4().hex}
+    )
+
+
 def create_history(table_name, recipes_table_name, days):
     """献立履歴データを作成"""
     table = dynamodb.Table(table_name)
@@ -180,7 +194,9 @@ def create_history(table_name, recipes_table_name, days):
 
     # レシピ一覧を取得
     response = recipes_table.scan()
-    recipes = response.get("Items", [])
+    recipes = [
+        r for r in response.get("Items", []) if r["name"] != CATALOG_VERSION_KEY
+    ]
 
     if not recipes:
         logger.error("エラー: レシピが存在しません。先にレシピを作成してください。")
@@ -2,17 +2,29 @@ from __future__ import annotations
 
 import os
 import logging
-import json
 from datetime import datetime, timedelta
 from typing import Any
 
-from utils import get_dynamodb, decimal_to_float
+from utils import (
+    batch_get_all,
+    create_agent_response,
+    decode_cursor,
+    get_dynamodb,
+    instrument_dynamodb,
+    paginate_records,
+    prime_on_init,
+    profile_invocation,
+    query_history,
+)
 
 # Configure logging for this module
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 HISTORY_TABLE = os.environ["HISTORY_TABLE"]
+# When set, HISTORY_TABLE is range-keyed (household + date) and a window is
+# read with one Query; otherwise it is the legacy date-keyed table
+HISTORY_HOUSEHOLD = os.environ.get("HISTORY_HOUSEHOLD", "")
 
 
 def safe_int_conversion(
@@ -38,10 +50,38 @@ def safe_int_conversion(
     return int_value
 
 
+def fetch_history_by_day(
+    end_date: datetime, days: int, context: Any = None
+) -> list[dict[str, Any]]:
+    """Read a window from the legacy date-keyed table, one key per day."""
+    # Generate all date keys to fetch
+    date_keys = [
+        {"date": (end_date - timedelta(days=i)).strftime("%Y-%m-%d")}
+        for i in range(days)
+    ]
+
+    table = get_dynamodb().Table(HISTORY_TABLE)
+    history_list = batch_get_all(table, date_keys, context)
+
+    # Sort by date (most recent first)
+    history_list.sort(key=lambda x: x["date"], reverse=True)
+    return history_list
+
+
+# Opt-in INIT-phase priming (PRIME_ON_INIT)
+prime_on_init(HISTORY_TABLE)
+
+
+@instrument_dynamodb
+@profile_invocation
 def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
     """
     Bedrock Agent action to get menu history.
 
+    Responses are capped at RESPONSE_MAX_BYTES. When more entries remain, the
+    body carries "next_cursor"; passing it back as "cursor" returns the next
+    page of the same date window.
+
     Input (from agent):
         {
             "messageVersion": "1.0",
@@ -72,83 +112,47 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
     try:
         # Extract parameters from Bedrock Agent event format
         parameters = {p["name"]: p["value"] for p in event.get("parameters", [])}
+        offset = 0
+        if parameters.get("cursor"):
+            # A cursor replays the query (including its end date) of the
+            # call that produced it, so pages stay consistent across midnight
+            offset, parameters = decode_cursor(parameters["cursor"])
+
         days = safe_int_conversion(
             parameters.get("days"), "days", min_value=1, max_value=365, default=30
         )
-
-        logger.info(f"Getting menu history for past {days} days")
-
-        dynamodb = get_dynamodb()
-
-        # Generate all date keys to fetch
-        date_keys = [
-            {"date": (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")}
-            for i in range(days)
-        ]
-
-        history_list = []
-
-        # DynamoDB batch_get_item has a limit of 100 items per request
-        # Process in chunks of 100
-        for i in range(0, len(date_keys), 100):
-            chunk = date_keys[i : i + 100]
-            response = dynamodb.batch_get_item(
-                RequestItems={HISTORY_TABLE: {"Keys": chunk}}
-            )
-
-            # Extract items from the response
-            if HISTORY_TABLE in response.get("Responses", {}):
-                for item in response["Responses"][HISTORY_TABLE]:
-                    history_list.append(decimal_to_float(item))
-
-        # Sort by date (most recent first)
-        history_list.sort(key=lambda x: x["date"], reverse=True)
+        as_of = parameters.get("as_of") or datetime.now().strftime("%Y-%m-%d")
+        try:
+            end_date = datetime.strptime(as_of, "%Y-%m-%d")
+        except (ValueError, TypeError):
+            raise ValueError("as_of must be in YYYY-MM-DD format")
+        # Zero-padded, so it compares correctly against date sort keys
+        as_of = end_date.strftime("%Y-%m-%d")
+
+        logger.info(f"Getting menu history for {days} days up to {as_of}")
+
+        start_date = (end_date - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        if HISTORY_HOUSEHOLD:
+            table = get_dynamodb().Table(HISTORY_TABLE)
+            items, consumed = query_history(table, HISTORY_HOUSEHOLD, start_date, as_of)
+            history_list = [
+                {k: v for k, v in item.items() if k != "household"} for item in items
+            ]
+            logger.info(f"Read history window with Query ({consumed} RCU)")
+        else:
+            history_list = fetch_history_by_day(end_date, days, context)
 
         logger.info(f"Found {len(history_list)} history entries")
 
         # Return in Bedrock Agent response format
-        return {
-            "messageVersion": "1.0",
-            "response": {
-                "actionGroup": event.get("actionGroup"),
-                "apiPath": event.get("apiPath"),
-                "httpMethod": event.get("httpMethod"),
-                "httpStatusCode": 200,
-                "responseBody": {
-                    "application/json": {"body": json.dumps({"history": history_list})}
-                },
-            },
-        }
+        body = paginate_records(
+            "history", history_list, {"days": days, "as_of": as_of}, offset
+        )
+        return create_agent_response(event, 200, body)
 
     except ValueError as e:
         logger.warning(f"Validation error: {str(e)}")
-        return {
-            "messageVersion": "1.0",
-            "response": {
-                "actionGroup": event.get("actionGroup"),
-                "apiPath": event.get("apiPath"),
-                "httpMethod": event.get("httpMethod"),
-                "httpStatusCode": 400,
-                "responseBody": {
-                    "application/json": {
-                        "body": json.dumps({"error": str(e), "history": []})
-                    }
-                },
-            },
-        }
+        return create_agent_response(event, 400, {"error": str(e), "history": []})
     except Exception as e:
         logger.error(f"Error getting history: {str(e)}", exc_info=True)
-        return {
-            "messageVersion": "1.0",
-            "response": {
-                "actionGroup": event.get("actionGroup"),
-                "apiPath": event.get("apiPath"),
-                "httpMethod": event.get("httpMethod"),
-                "httpStatusCode": 500,
-                "responseBody": {
-                    "application/json": {
-                        "body": json.dumps({"error": str(e), "history": []})
-                    }
-                },
-            },
-        }
+        return create_agent_response(event, 500, {"error": str(e), "history": []})
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import os
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, Any
+
+from utils import (
+    CATALOG_VERSION_KEY,
+    build_projection,
+    create_agent_response,
+    decode_cursor,
+    get_dynamodb,
+    instrument_dynamodb,
+    paginate_records,
+    prime_on_init,
+    profile_invocation,
+    recipe_cache,
+    scan_all,
+    summarize_usage,
+)
+
+if TYPE_CHECKING:
+    from mypy_boto3_dynamodb.service_resource import Table
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+RECIPES_TABLE = os.environ["RECIPES_TABLE"]
+USAGE_TABLE = os.environ["USAGE_TABLE"]
+# Own recipe_cache key: the catalog is unsorted, so it must not be shared with
+# get_recipes' ("recipes", ...) entries, which are sorted by name (router mode)
+USAGE_CATALOG_KEY = ("usage_catalog",)
+
+
+def safe_int_conversion(
+    value: Any,
+    field_name: str,
+    min_value: int | None = None,
+    max_value: int | None = None,
+) -> int | None:
+    """Safely convert an optional value to an integer with validation."""
+    if value is None or value == "":
+        return None
+    try:
+        int_value = int(value)
+    except (ValueError, TypeError):
+        raise ValueError(f"{field_name} must be an integer")
+    if min_value is not None and int_value < min_value:
+        raise ValueError(f"{field_name} must be at least {min_value}")
+    if max_value is not None and int_value > max_value:
+        raise ValueError(f"{field_name} must be at most {max_value}")
+    return int_value
+
+
+def load_catalog(table: Table) -> list[dict[str, Any]]:
+    """Read every recipe's name and category."""
+    items, _ = scan_all(table, **build_projection(["name", "category"]))
+    return [item for item in items if item.get("name") != CATALOG_VERSION_KEY]
+
+
+def load_usage(table: Table) -> dict[str, dict[str, Any]]:
+    """
+    Read the usage of every recipe that has been served.
+
+    Items hold the dates of the last USAGE_HORIZON_DAYS (plus planned menus)
+    and scalars for older uses, so the Scan stays small however long the
+    history grows.
+    """
+    items, consumed = scan_all(
+        table,
+        **build_projection(
+            ["name", "dates", "archived_use_count", "archived_last_used"]
+        ),
+    )
+    logger.info(f"Read {len(items)} usage items (consumed capacity: {consumed} RCU)")
+    return {item["name"]: item for item in items}
+
+
+# Opt-in INIT-phase priming (PRIME_ON_INIT)
+prime_on_init(RECIPES_TABLE, {USAGE_CATALOG_KEY: load_catalog})
+
+
+@instrument_dynamodb
+@profile_invocation
+def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
+    """
+    Bedrock Agent action to get per-recipe usage statistics.
+
+    Answers "what haven't we eaten recently" with one small read: for every
+    recipe in the catalog it returns when it was last served, how often, and
+    how often within the last 7/30/90 days. Recipes never served come first,
+    then the ones served longest ago.
+
+    Input (from agent):
+        {
+            "messageVersion": "1.0",
+            "agent": {...},
+            "actionGroup": "...",
+            "function": "get_recipe_usage",
+            "parameters": [
+                {"name": "not_used_within", "type": "integer", "value": "14"}
+            ]
+        }
+
+    Output (to agent):
+        {
+            "messageVersion": "1.0",
+            "response": {
+                "actionGroup": "...",
+                "function": "get_recipe_usage",
+                "functionResponse": {
+                    "responseBody": {
+                        "TEXT": {
+                            "body": "{\"as_of\": \"...\", \"usage\": [...]}"
+                        }
+                    }
+                }
+            }
+        }
+    """
+    try:
+        # Extract parameters from Bedrock Agent event format
+        parameters = {p["name"]: p["value"] for p in event.get("parameters", [])}
+        offset = 0
+        if parameters.get("cursor"):
+            # A cursor replays the query (including its as-of date) of the
+            # call that produced it
+            offset, parameters = decode_cursor(parameters["cursor"])
+
+        category = parameters.get("category")
+        not_used_within = safe_int_conversion(
+            parameters.get("not_used_within"),
+            "not_used_within",
+            min_value=1,
+            max_value=365,
+        )
+        as_of = parameters.get("as_of") or datetime.now().strftime("%Y-%m-%d")
+        try:
+            as_of = datetime.strptime(as_of, "%Y-%m-%d").strftime("%Y-%m-%d")
+        except (ValueError, TypeError):
+            raise ValueError("as_of must be in YYYY-MM-DD format")
+
+        logger.info(
+            f"Getting recipe usage as of {as_of}, category: {category}, "
+            f"not used within: {not_used_within} days"
+        )
+
+        dynamodb = get_dynamodb()
+        recipes_table = dynamodb.Table(RECIPES_TABLE)
+        catalog = recipe_cache.get(
+            USAGE_CATALOG_KEY,
+            recipes_table,
+            lambda: load_catalog(recipes_table),
+        )
+        usage = load_usage(dynamodb.Table(USAGE_TABLE))
+
+        records = []
+        for recipe in catalog:
+            if category and recipe.get("category") != category:
+                continue
+            item = usage.get(recipe["name"], {})
+            summary = summarize_usage(
+                item.get("dates", set()),
+                as_of,
+                int(item.get("archived_use_count", 0)),
+                item.get("archived_last_used"),
+            )
+            days_since = summary["days_since_last_used"]
+            if (
+                not_used_within is not None
+                and days_since is not None
+                and days_since < not_used_within
+            ):
+                continue
+            records.append(
+                {"name": recipe["name"], "category": recipe.get("category"), **summary}
+            )
+
+        # Never served first, then longest ago; name keeps the order stable
+        records.sort(
+            key=lambda r: (r["last_used"] is not None, r["last_used"] or "", r["name"])
+        )
+        logger.info(f"Returning usage for {len(records)} recipes")
+
+        query = {
+            name: parameters[name]
+            for name in ("category", "not_used_within")
+            if parameters.get(name)
+        }
+        body = paginate_records(
+            "usage", records, {**query, "as_of": as_of}, offset, extra={"as_of": as_of}
+        )
+        return create_agent_response(event, 200, body)
+
+    except ValueError as e:
+        logger.warning(f"Validation error: {str(e)}")
+        return create_agent_response(event, 400, {"error": str(e), "usage": []})
+    except Exception as e:
+        logger.error(f"Error getting recipe usage: {str(e)}", exc_info=True)
+        return create_agent_response(event, 500, {"error": str(e), "usage": []})
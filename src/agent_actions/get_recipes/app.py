@@ -2,21 +2,147 @@ from __future__ import annotations
 
 import os
 import logging
-import json
-from typing import Any
+import re
+from typing import TYPE_CHECKING, Any
 
-from utils import get_dynamodb, decimal_to_float
+from utils import (
+    CATALOG_VERSION_KEY,
+    IngredientIndex,
+    build_projection,
+    create_agent_response,
+    decode_cursor,
+    get_dynamodb,
+    instrument_dynamodb,
+    log_event,
+    paginate_records,
+    prime_on_init,
+    profile_invocation,
+    query_all,
+    recipe_cache,
+    scan_all,
+    to_rows,
+)
+
+if TYPE_CHECKING:
+    from mypy_boto3_dynamodb.service_resource import Table
 
 # Configure logging for this module
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 RECIPES_TABLE = os.environ["RECIPES_TABLE"]
+# Number of parallel Segment/TotalSegments workers used to scan the catalog
+RECIPES_SCAN_SEGMENTS = int(os.environ.get("RECIPES_SCAN_SEGMENTS", "1"))
+# GSI on the recipes table keyed by category (see template.yaml)
+RECIPES_CATEGORY_INDEX = os.environ.get("RECIPES_CATEGORY_INDEX", "CategoryIndex")
+
+# Named attribute sets for the "view" parameter (None = every attribute)
+VIEWS: dict[str, list[str] | None] = {
+    "full": None,
+    "names": ["name", "category"],
+}
+RESPONSE_FORMATS = ("records", "table")
+INGREDIENT_MATCH_MODES = ("any", "all")
+FIELD_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def parse_name_list(value: Any, field_name: str) -> list[str]:
+    """Parse a list parameter sent as a list, "a, b", '["a", "b"]' or "[a, b]"."""
+    if isinstance(value, str):
+        value = value.strip().strip("[]").split(",")
+    if not isinstance(value, list):
+        raise ValueError(f"{field_name} must be a list")
+    names = [str(name).strip().strip("\"'").strip() for name in value]
+    return [name for name in names if name]
+
+
+def parse_fields(parameters: dict[str, Any]) -> list[str] | None:
+    """
+    Resolve the attributes to return from the "fields" and "view" parameters.
+
+    "fields" (a list or comma-separated string) takes precedence over "view".
+    "name" is always included since results are sorted and identified by it.
+
+    Returns:
+        Attribute names to project, or None for every attribute
+    """
+    if parameters.get("fields"):
+        fields = parse_name_list(parameters["fields"], "fields")
+        for field in fields:
+            if not FIELD_NAME_PATTERN.match(field):
+                raise ValueError(f"Invalid field name: {field}")
+    else:
+        view = parameters.get("view") or "full"
+        if view not in VIEWS:
+            raise ValueError(f"view must be one of: {', '.join(VIEWS)}")
+        fields = VIEWS[view] or []
+
+    if not fields:
+        return None
+    return ["name"] + [field for field in dict.fromkeys(fields) if field != "name"]
+
+
+def load_recipes(
+    table: Table, category: str | None, fields: list[str] | None = None
+) -> list[dict[str, Any]]:
+    """
+    Read recipes from DynamoDB, sorted by name.
+
+    When fields is given, a ProjectionExpression is pushed down so only those
+    attributes are transferred and deserialized.
+    """
+    projection = build_projection(fields) if fields else {}
+    if category:
+        # Read only the requested category from the GSI instead of
+        # scanning the whole catalog and filtering in Python
+        attribute_names = {
+            "#category": "category",
+            **projection.pop("ExpressionAttributeNames", {}),
+        }
+        items, consumed = query_all(
+            table,
+            IndexName=RECIPES_CATEGORY_INDEX,
+            KeyConditionExpression="#category = :category",
+            ExpressionAttributeNames=attribute_names,
+            ExpressionAttributeValues={":category": category},
+            **projection,
+        )
+        read_path = f"{RECIPES_CATEGORY_INDEX} query"
+    else:
+        items, consumed = scan_all(
+            table, total_segments=RECIPES_SCAN_SEGMENTS, **projection
+        )
+        read_path = "table scan"
+
+    recipes = [item for item in items if item.get("name") != CATALOG_VERSION_KEY]
+    logger.info(
+        f"Read {len(recipes)} recipes via {read_path} "
+        f"(consumed capacity: {consumed} RCU)"
+    )
+
+    # Sort by name for consistent ordering
+    recipes.sort(key=lambda x: x.get("name", ""))
+    return recipes
+
 
+# Opt-in INIT-phase priming (PRIME_ON_INIT); the agent's first call is
+# usually for the whole catalog
+prime_on_init(
+    RECIPES_TABLE,
+    {("recipes", None, ()): lambda table: load_recipes(table, None)},
+)
 
+
+@instrument_dynamodb
+@profile_invocation
 def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
     """
-    Bedrock Agent action to get all recipes, with optional category filtering.
+    Bedrock Agent action to get all recipes, with optional category and
+    ingredient filtering.
+
+    Responses are capped at RESPONSE_MAX_BYTES. When more recipes remain, the
+    body carries "next_cursor"; passing it back as "cursor" returns the next
+    page of the same query.
 
     Input (from agent):
         {
@@ -46,55 +172,86 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         }
     """
     try:
-        # Log the full event for debugging
-        logger.info(f"Received event: {json.dumps(event)}")
+        log_event(logger, event)
 
         # Extract parameters from Bedrock Agent event format
         parameters = {p["name"]: p["value"] for p in event.get("parameters", [])}
+        offset = 0
+        if parameters.get("cursor"):
+            # A cursor replays the query of the call that produced it
+            offset, parameters = decode_cursor(parameters["cursor"])
+
         category = parameters.get("category")
+        fields = parse_fields(parameters)
+        response_format = parameters.get("format") or "records"
+        if response_format not in RESPONSE_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(RESPONSE_FORMATS)}")
+        ingredients = parse_name_list(
+            parameters.get("ingredients") or [], "ingredients"
+        )
+        match = parameters.get("match") or "any"
+        if match not in INGREDIENT_MATCH_MODES:
+            raise ValueError(
+                f"match must be one of: {', '.join(INGREDIENT_MATCH_MODES)}"
+            )
 
-        logger.info(f"Getting recipes with category filter: {category}")
+        logger.info(
+            f"Getting recipes with category filter: {category}, "
+            f"ingredients: {ingredients or 'any'} (match {match}), "
+            f"fields: {fields or 'all'}, format: {response_format}, offset: {offset}"
+        )
 
         table = get_dynamodb().Table(RECIPES_TABLE)
-        response = table.scan()
-        recipes = decimal_to_float(response.get("Items", []))
+        recipes = recipe_cache.get(
+            ("recipes", category, tuple(fields or ())),
+            table,
+            lambda: load_recipes(table, category, fields),
+        )
 
-        # Filter by category if specified
-        if category:
-            recipes = [r for r in recipes if r.get("category") == category]
-            logger.info(f"Filtered to {len(recipes)} recipes in category '{category}'")
+        if ingredients:
+            # Built from the whole catalog once per warm container (and again
+            # whenever the catalog version changes)
+            index = recipe_cache.get(
+                ("ingredient_index",),
+                table,
+                lambda: IngredientIndex(
+                    load_recipes(table, None, ["name", "ingredients"])
+                ),
+            )
+            matches = index.search(ingredients, match)
+            recipes = [recipe for recipe in recipes if recipe["name"] in matches]
+            logger.info(f"Ingredient search matched {len(recipes)} recipes")
 
-        # Sort by name for consistent ordering
-        recipes.sort(key=lambda x: x.get("name", ""))
+        logger.info(f"Recipe cache stats: {recipe_cache.stats()}")
 
-        # Return in Bedrock Agent response format
-        return {
-            "messageVersion": "1.0",
-            "response": {
-                "actionGroup": event.get("actionGroup"),
-                "apiPath": event.get("apiPath"),
-                "httpMethod": event.get("httpMethod"),
-                "httpStatusCode": 200,
-                "responseBody": {
-                    "application/json": {"body": json.dumps({"recipes": recipes})}
-                },
-            },
+        query = {
+            name: parameters[name]
+            for name in ("category", "ingredients", "match", "view", "fields", "format")
+            if parameters.get(name)
         }
+        if response_format == "table":
+            # Dense encoding: one column header instead of repeating every
+            # attribute name in every recipe
+            columns = fields or list(
+                dict.fromkeys(key for recipe in recipes for key in recipe)
+            )
+            body = paginate_records(
+                "recipes",
+                to_rows(recipes, columns),
+                query,
+                offset,
+                extra={"columns": columns},
+            )
+        else:
+            body = paginate_records("recipes", recipes, query, offset)
+
+        # Return in Bedrock Agent response format
+        return create_agent_response(event, 200, body)
 
+    except ValueError as e:
+        logger.warning(f"Validation error: {str(e)}")
+        return create_agent_response(event, 400, {"error": str(e), "recipes": []})
     except Exception as e:
         logger.error(f"Error getting recipes: {str(e)}", exc_info=True)
         # Return error in Bedrock Agent format
-        return {
-            "messageVersion": "1.0",
-            "response": {
-                "actionGroup": event.get("actionGroup"),
-                "apiPath": event.get("apiPath"),
-                "httpMethod": event.get("httpMethod"),
-                "httpStatusCode": 500,
-                "responseBody": {
-                    "application/json": {
-                        "body": json.dumps({"error": str(e), "recipes": []})
-                    }
-                },
-            },
-        }
+        return create_agent_response(event, 500, {"error": str(e), "recipes": []})
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import importlib.util
+import logging
+import sys
+from pathlib import Path
+from typing import Any
+
+from utils import Handler, create_agent_response, log_event
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Deployed with CodeUri src/agent_actions/, so every action sits next to router/
+ACTIONS_DIR = Path(__file__).resolve().parent.parent
+
+# apiPath of each action's OpenAPI schema (see template.yaml)
+API_PATHS = {
+    "/get-recipes": "get_recipes",
+    "/get-history": "get_history",
+    "/get-recipe-usage": "get_recipe_usage",
+    "/save-menu": "save_menu",
+    "/save-menus": "save_menus",
+}
+# Fallback for events whose apiPath is missing or not listed above
+ACTION_GROUPS = {
+    "GetRecipes": "get_recipes",
+    "GetHistory": "get_history",
+    "GetRecipeUsage": "get_recipe_usage",
+    "SaveMenu": "save_menu",
+    "SaveMenus": "save_menus",
+}
+
+
+def load_action(action: str) -> Handler:
+    """
+    Import an action's app.py under its own module name and return its handler.
+
+    Every action module is named "app", so each one is loaded from its file
+    as "<action>_app" instead of through sys.path.
+    """
+    name = f"{action}_app"
+    spec = importlib.util.spec_from_file_location(name, ACTIONS_DIR / action / "app.py")
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Cannot load action {action} from {ACTIONS_DIR}")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    handler: Handler = module.lambda_handler
+    return handler
+
+
+# Imported during INIT, so each action's module-level setup (including
+# PRIME_ON_INIT priming) runs once per container. The actions share the
+# layer, and with it the clients and recipe_cache.
+HANDLERS = {action: load_action(action) for action in sorted(API_PATHS.values())}
+
+
+def resolve_action(event: dict[str, Any]) -> str | None:
+    """Return the action an agent event is for, by apiPath then actionGroup."""
+    return API_PATHS.get(event.get("apiPath") or "") or ACTION_GROUPS.get(
+        event.get("actionGroup") or ""
+    )
+
+
+def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
+    """
+    Bedrock Agent entry point for the single-function deployment mode.
+
+    Every action group's executor is this function (DeploymentMode=router in
+    template.yaml). The event is passed unchanged to the action's own
+    lambda_handler, so responses are identical to the per-function layout.
+    """
+    action = resolve_action(event)
+    if action is None:
+        log_event(logger, event)
+        logger.warning(
+            f"No action for apiPath {event.get('apiPath')!r}, "
+            f"actionGroup {event.get('actionGroup')!r}"
+        )
+        return create_agent_response(
+            event, 404, {"error": f"Unknown action: {event.get('apiPath')}"}
+        )
+
+    logger.info(f"Routing to {action}")
+    return HANDLERS[action](event, context)
@@ -2,28 +2,130 @@ from __future__ import annotations
 
 import os
 import logging
-import json
-from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from utils import get_dynamodb, decimal_to_float, parse_bedrock_parameter
+from utils import (
+    agent_parameters,
+    build_history_item,
+    create_agent_response,
+    deserialize_item,
+    dump_json,
+    get_dynamodb,
+    get_item,
+    history_key,
+    history_put_request,
+    idempotent,
+    instrument_dynamodb,
+    load_recipe_name_index,
+    log_event,
+    parse_bedrock_parameter,
+    prime_on_init,
+    profile_invocation,
+    screen_recipe_names,
+    update_recipe_usage,
+    validate_date_format,
+)
+
+if TYPE_CHECKING:
+    from mypy_boto3_dynamodb.service_resource import Table
 
 # Configure logging for this module
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 HISTORY_TABLE = os.environ["HISTORY_TABLE"]
+# Partition key value when HISTORY_TABLE is range-keyed (household + date)
+HISTORY_HOUSEHOLD = os.environ.get("HISTORY_HOUSEHOLD", "")
+USAGE_TABLE = os.environ["USAGE_TABLE"]
+RECIPES_TABLE = os.environ["RECIPES_TABLE"]
+# "reject" refuses menus with names missing from the catalog, "flag" saves
+# them and reports the names, "off" skips the check
+RECIPE_NAME_VALIDATION = os.environ.get("RECIPE_NAME_VALIDATION", "reject")
+# Retried agent calls replay the stored result instead of saving again
+IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE", "")
 
 
-def validate_date_format(date_string: str) -> bool:
-    """Validate date format (YYYY-MM-DD)."""
-    try:
-        datetime.strptime(date_string, "%Y-%m-%d")
-        return True
-    except (ValueError, TypeError):
-        return False
+def put_history(
+    table: Table, history: dict[str, Any], existing_item: dict[str, Any] | None
+) -> None:
+    """
+    Write a day's menu with one conditional PutItem.
+
+    Raises:
+        ConditionalCheckFailedException: If the condition failed; the error
+            carries the stored item (ReturnValuesOnConditionCheckFailure)
+    """
+    table.put_item(
+        **history_put_request(history, existing_item),
+        ReturnValuesOnConditionCheckFailure="ALL_OLD",
+    )
+
+
+def conflict_response(
+    event: dict[str, Any], date: str, current_item: dict[str, Any], overwrite: bool
+) -> dict[str, Any]:
+    """Build the 409 response for a save that lost its condition check."""
+    if overwrite:
+        logger.warning(f"Menu for {date} changed concurrently, overwrite rejected")
+        return create_agent_response(
+            event,
+            409,
+            {
+                "success": False,
+                "error": "concurrent_update",
+                "date": date,
+                "existing_menu": current_item,
+                "message": f"The menu for {date} was changed by another session. Please review it and confirm the overwrite again.",
+            },
+        )
+
+    logger.warning(f"Menu already exists for {date}, overwrite not confirmed")
+    return create_agent_response(
+        event,
+        409,
+        {
+            "success": False,
+            "error": "duplicate_date",
+            "date": date,
+            "existing_menu": current_item,
+            "message": f"A menu already exists for {date}. Please confirm if you want to overwrite it.",
+        },
+    )
 
 
+def unknown_recipes_response(
+    event: dict[str, Any], date: str, unknown: dict[str, list[str]]
+) -> dict[str, Any]:
+    """Build the 400 response for a menu naming recipes not in the catalog."""
+    logger.warning(f"Unknown recipes in menu for {date}: {list(unknown)}")
+    return create_agent_response(
+        event,
+        400,
+        {
+            "success": False,
+            "error": "unknown_recipes",
+            "date": date,
+            "unknown_recipes": unknown,
+            "message": f"These recipes are not in the recipe database: {', '.join(unknown)}. Use exact names from get_recipes() (suggestions are listed per name).",
+        },
+    )
+
+
+# Opt-in INIT-phase priming (PRIME_ON_INIT); the name index is what
+# check_recipe_names reads
+prime_on_init(
+    RECIPES_TABLE,
+    (
+        {("recipe_names",): load_recipe_name_index}
+        if RECIPE_NAME_VALIDATION != "off"
+        else None
+    ),
+)
+
+
+@instrument_dynamodb
+@profile_invocation
+@idempotent(IDEMPOTENCY_TABLE)
 def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
     """
     Bedrock Agent action to save menu history.
@@ -58,20 +160,10 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         }
     """
     try:
-        # Log the full event for debugging
-        logger.info(f"Received event: {json.dumps(event)}")
+        log_event(logger, event)
 
-        # Extract parameters from Bedrock Agent event format
-        # For POST requests with requestBody, parameters are in requestBody.content.application/json.properties
-        parameters_list = event.get("parameters", [])
-        if not parameters_list and "requestBody" in event:
-            request_body = event.get("requestBody", {})
-            content = request_body.get("content", {})
-            app_json = content.get("application/json", {})
-            parameters_list = app_json.get("properties", [])
-
-        parameters = {p["name"]: p["value"] for p in parameters_list}
-        logger.info(f"Extracted parameters: {json.dumps(parameters)}")
+        parameters = agent_parameters(event)
+        logger.info(f"Extracted parameters: {dump_json(parameters)}")
 
         # Parse meals using shared utility (handles both JSON and Python dict format)
         meals = parse_bedrock_parameter(parameters.get("meals"), "meals")
@@ -93,63 +185,38 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         if not isinstance(meals, dict):
             raise ValueError("meals must be an object")
 
+        meals, unknown, rejected = screen_recipe_names(
+            meals, get_dynamodb().Table(RECIPES_TABLE), RECIPE_NAME_VALIDATION
+        )
+        if rejected:
+            return unknown_recipes_response(event, date, unknown)
+
         logger.info(f"Saving menu history for date: {date}")
 
-        # Check for existing entry
         table = get_dynamodb().Table(HISTORY_TABLE)
-        existing_response = table.get_item(Key={"date": date})
-        existing_item = existing_response.get("Item")
-
-        if existing_item and not overwrite:
-            # Convert Decimal to float for JSON serialization
-            existing_item = decimal_to_float(existing_item)
-            logger.warning(f"Menu already exists for {date}, overwrite not confirmed")
-            return {
-                "messageVersion": "1.0",
-                "response": {
-                    "actionGroup": event.get("actionGroup"),
-                    "apiPath": event.get("apiPath"),
-                    "httpMethod": event.get("httpMethod"),
-                    "httpStatusCode": 409,
-                    "responseBody": {
-                        "application/json": {
-                            "body": json.dumps(
-                                {
-                                    "success": False,
-                                    "error": "duplicate_date",
-                                    "date": date,
-                                    "existing_menu": existing_item,
-                                    "message": f"A menu already exists for {date}. Please confirm if you want to overwrite it.",
-                                }
-                            )
-                        }
-                    },
-                },
-            }
-
-        # Build history object
-        history = {
-            "date": date,
-            "meals": meals,
-            "recipes": [],  # Flat list of recipe names
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
-        }
+        history = build_history_item(date, meals, notes, HISTORY_HOUSEHOLD)
 
-        # Extract recipe names from meals structure
-        # meals is now a simple structure: {breakfast: ["recipe1", "recipe2"], lunch: [...], dinner: [...]}
-        for meal_type in ["breakfast", "lunch", "dinner"]:
-            if meal_type in meals:
-                # meals[meal_type] is now an array of strings (recipe names)
-                if isinstance(meals[meal_type], list):
-                    history["recipes"].extend(meals[meal_type])
+        existing_item: dict[str, Any] | None = None
+        if overwrite:
+            # Read the current version, so the write below fails instead of
+            # clobbering a save made by another session in the meantime.
+            # Strongly consistent: a stale version would fail as a false 409
+            existing_item = get_item(
+                table, history_key(date, HISTORY_HOUSEHOLD), ConsistentRead=True
+            )
 
-        # Add optional notes
-        if notes:
-            history["notes"] = notes
+        try:
+            put_history(table, history, existing_item)
+        except table.meta.client.exceptions.ConditionalCheckFailedException as e:
+            # The item that failed the condition comes back with the error,
+            # so no extra read is needed to show it
+            failed_item: Any = e.response.get("Item", {})
+            current_item = deserialize_item(failed_item)
+            current_item.pop("household", None)
+            return conflict_response(event, date, current_item, overwrite)
 
-        # Save to DynamoDB
-        table.put_item(Item=history)
+        previous = existing_item.get("recipes", []) if existing_item else []
+        update_recipe_usage(USAGE_TABLE, [(date, previous, history["recipes"])])
 
         action_message = (
             "Menu history updated (overwritten)"
@@ -158,70 +225,39 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         )
         logger.info(f"Successfully saved menu history for {date}")
 
-        # Return in Bedrock Agent response format
-        return {
-            "messageVersion": "1.0",
-            "response": {
-                "actionGroup": event.get("actionGroup"),
-                "apiPath": event.get("apiPath"),
-                "httpMethod": event.get("httpMethod"),
-                "httpStatusCode": 200,
-                "responseBody": {
-                    "application/json": {
-                        "body": json.dumps(
-                            {
-                                "success": True,
-                                "date": date,
-                                "overwritten": existing_item is not None,
-                                "message": action_message,
-                            }
-                        )
-                    }
-                },
-            },
+        body: dict[str, Any] = {
+            "success": True,
+            "date": date,
+            "overwritten": existing_item is not None,
+            "version": int(history["version"]),
+            "message": action_message,
         }
+        if unknown:
+            # Saved anyway (RECIPE_NAME_VALIDATION=flag), but tell the agent
+            body["unknown_recipes"] = unknown
+
+        # Return in Bedrock Agent response format
+        return create_agent_response(event, 200, body)
 
     except ValueError as e:
         logger.warning(f"Validation error: {str(e)}")
-        return {
-            "messageVersion": "1.0",
-            "response": {
-                "actionGroup": event.get("actionGroup"),
-                "apiPath": event.get("apiPath"),
-                "httpMethod": event.get("httpMethod"),
-                "httpStatusCode": 400,
-                "responseBody": {
-                    "application/json": {
-                        "body": json.dumps(
-                            {
-                                "success": False,
-                                "error": str(e),
-                                "message": f"Failed to save menu: {str(e)}",
-                            }
-                        )
-                    }
-                },
+        return create_agent_response(
+            event,
+            400,
+            {
+                "success": False,
+                "error": str(e),
+                "message": f"Failed to save menu: {str(e)}",
             },
-        }
+        )
     except Exception as e:
         logger.error(f"Error saving menu: {str(e)}", exc_info=True)
-        return {
-            "messageVersion": "1.0",
-            "response": {
-                "actionGroup": event.get("actionGroup"),
-                "apiPath": event.get("apiPath"),
-                "httpMethod": event.get("httpMethod"),
-                "httpStatusCode": 500,
-                "responseBody": {
-                    "application/json": {
-                        "body": json.dumps(
-                            {
-                                "success": False,
-                                "error": str(e),
-                                "message": f"Error occurred while saving menu: {str(e)}",
-                            }
-                        )
-                    }
-                },
+        return create_agent_response(
+            event,
+            500,
+            {
+                "success": False,
+                "error": str(e),
+                "message": f"Error occurred while saving menu: {str(e)}",
             },
-        }
+        )
@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import os
+import logging
+from typing import TYPE_CHECKING, Any
+
+from utils import (
+    agent_parameters,
+    batch_get_all,
+    build_history_item,
+    create_agent_response,
+    deserialize_item,
+    get_dynamodb,
+    history_key,
+    history_put_request,
+    idempotent,
+    instrument_dynamodb,
+    load_recipe_name_index,
+    log_event,
+    parse_bedrock_parameter,
+    prime_on_init,
+    profile_invocation,
+    screen_recipe_names,
+    update_recipe_usage,
+    validate_date_format,
+)
+
+if TYPE_CHECKING:
+    from mypy_boto3_dynamodb.service_resource import Table
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+HISTORY_TABLE = os.environ["HISTORY_TABLE"]
+# Partition key value when HISTORY_TABLE is range-keyed (household + date)
+HISTORY_HOUSEHOLD = os.environ.get("HISTORY_HOUSEHOLD", "")
+USAGE_TABLE = os.environ["USAGE_TABLE"]
+RECIPES_TABLE = os.environ["RECIPES_TABLE"]
+# "reject" refuses days with names missing from the catalog, "flag" saves
+# them and reports the names, "off" skips the check
+RECIPE_NAME_VALIDATION = os.environ.get("RECIPE_NAME_VALIDATION", "reject")
+# Retried agent calls replay the stored result instead of saving again
+IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE", "")
+
+# One month per call keeps the whole plan in a single transaction
+MAX_MENUS = 31
+
+
+def parse_menus(value: Any) -> list[Any]:
+    """Parse the "menus" parameter into a list of per-day menus."""
+    menus = parse_bedrock_parameter(value, "menus")
+    if not menus:
+        raise ValueError("menus is required")
+    if not isinstance(menus, list):
+        raise ValueError("menus must be a list")
+    if len(menus) > MAX_MENUS:
+        raise ValueError(f"menus must contain at most {MAX_MENUS} days")
+    return menus
+
+
+def validate_menu(menu: Any, seen_dates: set[str]) -> tuple[str, dict[str, Any]]:
+    """
+    Validate one day's menu.
+
+    Returns:
+        The date and the parsed meals
+
+    Raises:
+        ValueError: If the menu is malformed
+    """
+    if not isinstance(menu, dict):
+        raise ValueError("each menu must be an object")
+    date = menu.get("date")
+    if not date:
+        raise ValueError("date is required")
+    if not validate_date_format(date):
+        raise ValueError("date must be in YYYY-MM-DD format")
+    if date in seen_dates:
+        raise ValueError(f"{date} appears more than once")
+    meals = parse_bedrock_parameter(menu.get("meals"), "meals")
+    if not meals:
+        raise ValueError("meals is required")
+    if not isinstance(meals, dict):
+        raise ValueError("meals must be an object")
+    return date, meals
+
+
+def unknown_recipes_result(date: str, unknown: dict[str, list[str]]) -> dict[str, Any]:
+    """Per-date result for a day naming recipes not in the catalog."""
+    return {
+        "date": date,
+        "success": False,
+        "error": "unknown_recipes",
+        "unknown_recipes": unknown,
+        "message": f"These recipes are not in the recipe database: {', '.join(unknown)}.",
+    }
+
+
+def check_menus(menus: list[Any]) -> tuple[
+    dict[int, dict[str, Any]],
+    dict[int, tuple[str, dict[str, Any], str | None]],
+    dict[int, dict[str, list[str]]],
+]:
+    """
+    Validate every day's menu and check its recipe names.
+
+    Returns:
+        Failed results by menu index, the (date, meals, notes) of the days
+        to save by index, and the unknown recipe names of days saved anyway
+        (RECIPE_NAME_VALIDATION=flag) by index
+    """
+    results: dict[int, dict[str, Any]] = {}
+    valid: dict[int, tuple[str, dict[str, Any], str | None]] = {}
+    flagged: dict[int, dict[str, list[str]]] = {}
+    seen_dates: set[str] = set()
+    recipes_table = get_dynamodb().Table(RECIPES_TABLE)
+    for i, menu in enumerate(menus):
+        try:
+            date, meals = validate_menu(menu, seen_dates)
+        except ValueError as e:
+            results[i] = {
+                "date": menu.get("date") if isinstance(menu, dict) else None,
+                "success": False,
+                "error": str(e),
+            }
+            continue
+        seen_dates.add(date)
+        meals, unknown, rejected = screen_recipe_names(
+            meals, recipes_table, RECIPE_NAME_VALIDATION
+        )
+        if rejected:
+            results[i] = unknown_recipes_result(date, unknown)
+            continue
+        if unknown:
+            flagged[i] = unknown
+        valid[i] = (date, meals, menu.get("notes"))
+    return results, valid, flagged
+
+
+def conflict_result(
+    date: str, current_item: dict[str, Any], overwrite: bool
+) -> dict[str, Any]:
+    """Per-date result for a day that could not be written."""
+    current_item.pop("household", None)
+    if overwrite:
+        return {
+            "date": date,
+            "success": False,
+            "error": "concurrent_update",
+            "existing_menu": current_item,
+            "message": f"The menu for {date} was changed by another session.",
+        }
+    return {
+        "date": date,
+        "success": False,
+        "error": "duplicate_date",
+        "existing_menu": current_item,
+        "message": f"A menu already exists for {date}.",
+    }
+
+
+def write_all(table: Table, requests: list[dict[str, Any]]) -> bool:
+    """
+    Write every day in one TransactWriteItems call.
+
+    Returns:
+        True if the transaction committed, False if it was cancelled (then
+        nothing was written)
+    """
+    client = table.meta.client
+    items: Any = [{"Put": {"TableName": table.name, **request}} for request in requests]
+    try:
+        client.transact_write_items(TransactItems=items)
+        return True
+    except client.exceptions.TransactionCanceledException as e:
+        reasons = [r.get("Code") for r in e.response.get("CancellationReasons", [])]
+        logger.warning(f"Transaction cancelled ({reasons}), saving day by day")
+        return False
+
+
+def write_one(
+    table: Table, date: str, request: dict[str, Any], overwrite: bool
+) -> dict[str, Any] | None:
+    """
+    Write one day with a conditional PutItem.
+
+    Returns:
+        None on success, otherwise the failed day's result
+    """
+    try:
+        table.put_item(**request, ReturnValuesOnConditionCheckFailure="ALL_OLD")
+        return None
+    except table.meta.client.exceptions.ConditionalCheckFailedException as e:
+        failed_item: Any = e.response.get("Item", {})
+        return conflict_result(date, deserialize_item(failed_item), overwrite)
+    except Exception as e:
+        logger.error(f"Error saving menu for {date}: {str(e)}")
+        return {"date": date, "success": False, "error": str(e)}
+
+
+# Opt-in INIT-phase priming (PRIME_ON_INIT); the name index is what
+# check_recipe_names reads
+prime_on_init(
+    RECIPES_TABLE,
+    (
+        {("recipe_names",): load_recipe_name_index}
+        if RECIPE_NAME_VALIDATION != "off"
+        else None
+    ),
+)
+
+
+@instrument_dynamodb
+@profile_invocation
+@idempotent(IDEMPOTENCY_TABLE)
+def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
+    """
+    Bedrock Agent action to save several days of menus in one call.
+
+    Every date is checked for an existing menu with one BatchGetItem. The days
+    that can be written are then saved together with TransactWriteItems. If
+    the transaction is cancelled (another session saved one of the days in
+    the meantime), each day is retried on its own with a conditional PutItem,
+    so the other days are still saved. The response has one result per date.
+
+    Input (from agent):
+        {
+            "messageVersion": "1.0",
+            "agent": {...},
+            "actionGroup": "...",
+            "function": "save_menus",
+            "parameters": [
+                {"name": "menus", "type": "array", "value": "[{\"date\": \"2025-11-09\", \"meals\": {...}}, ...]"},
+                {"name": "overwrite", "type": "boolean", "value": "false"}
+            ]
+        }
+
+    Output (to agent):
+        {
+            "messageVersion": "1.0",
+            "response": {
+                "actionGroup": "...",
+                "function": "save_menus",
+                "functionResponse": {
+                    "responseBody": {
+                        "TEXT": {
+                            "body": "{\"success\": false, \"saved\": [...], \"results\": [...]}"
+                        }
+                    }
+                }
+            }
+        }
+    """
+    try:
+        log_event(logger, event)
+
+        parameters = agent_parameters(event)
+        menus = parse_menus(parameters.get("menus"))
+        overwrite = str(parameters.get("overwrite", "false")).lower() == "true"
+
+        # Per-date results, in the order the menus were given
+        results, valid, flagged = check_menus(menus)
+
+        logger.info(f"Saving menus for {len(valid)} of {len(menus)} dates")
+
+        table = get_dynamodb().Table(HISTORY_TABLE)
+        existing = {
+            item["date"]: item
+            for item in batch_get_all(
+                table,
+                [history_key(date, HISTORY_HOUSEHOLD) for date, _, _ in valid.values()],
+                context,
+                # Versions for the conditional writes; a stale read is a false 409
+                ConsistentRead=True,
+            )
+        }
+
+        pending: dict[int, tuple[dict[str, Any], dict[str, Any]]] = {}
+        for i, (date, meals, notes) in valid.items():
+            existing_item = existing.get(date)
+            if existing_item and not overwrite:
+                results[i] = conflict_result(date, dict(existing_item), False)
+                continue
+            history = build_history_item(date, meals, notes, HISTORY_HOUSEHOLD)
+            pending[i] = (history, history_put_request(history, existing_item))
+
+        requests = [request for _, request in pending.values()]
+        committed = bool(requests) and write_all(table, requests)
+        saved_days: list[tuple[str, list[str], list[str]]] = []
+        for i, (history, request) in pending.items():
+            date = history["date"]
+            failure = None if committed else write_one(table, date, request, overwrite)
+            if failure:
+                results[i] = failure
+                continue
+            existing_item = existing.get(date)
+            saved_days.append(
+                (
+                    date,
+                    existing_item.get("recipes", []) if existing_item else [],
+                    history["recipes"],
+                )
+            )
+            results[i] = {
+                "date": date,
+                "success": True,
+                "overwritten": existing_item is not None,
+                "version": int(history["version"]),
+            }
+            if i in flagged:
+                results[i]["unknown_recipes"] = flagged[i]
+
+        update_recipe_usage(USAGE_TABLE, saved_days)
+
+        ordered = [results[i] for i in range(len(menus))]
+        saved = [result["date"] for result in ordered if result["success"]]
+        failed = [result["date"] for result in ordered if not result["success"]]
+        logger.info(f"Saved {len(saved)} menus, {len(failed)} not saved")
+
+        message = f"Saved {len(saved)} of {len(menus)} menus"
+        if failed:
+            message += f"; not saved: {', '.join(str(d) for d in failed)}"
+        return create_agent_response(
+            event,
+            200,
+            {
+                "success": not failed,
+                "saved": saved,
+                "results": ordered,
+                "message": message,
+            },
+        )
+
+    except ValueError as e:
+        logger.warning(f"Validation error: {str(e)}")
+        return create_agent_response(
+            event,
+            400,
+            {
+                "success": False,
+                "error": str(e),
+                "message": f"Failed to save menus: {str(e)}",
+            },
+        )
+    except Exception as e:
+        logger.error(f"Error saving menus: {str(e)}", exc_info=True)
+        return create_agent_response(
+            event,
+            500,
+            {
+                "success": False,
+                "error": str(e),
+                "message": f"Error occurred while saving menus: {str(e)}",
+            },
+        )
@@ -1,33 +1,1714 @@
 from __future__ import annotations
 
+import base64
+import difflib
+import functools
+import hashlib
 import json
+import logging
+import os
+import random
 import re
-import boto3
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 from decimal import Decimal
-from typing import Any
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Iterable, TypeVar
 
-from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource
-from mypy_boto3_bedrock_runtime.client import BedrockRuntimeClient
+# boto3 takes most of the layer's import time, so it is imported on first
+# use instead of during INIT; the stubs are only needed by the type checker
+if TYPE_CHECKING:
+    from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+    from botocore.config import Config
+    from mypy_boto3_dynamodb.client import DynamoDBClient
+    from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource, Table
+    from mypy_boto3_bedrock_runtime.client import BedrockRuntimeClient
+
+try:
+    import orjson
+
+    HAVE_ORJSON = True
+except ImportError:
+    # Shipped in the layer; dump_json falls back to the stdlib
+    HAVE_ORJSON = False
+
+T = TypeVar("T")
+
+Handler = Callable[[dict[str, Any], Any], dict[str, Any]]
+
+logger = logging.getLogger(__name__)
 
 # AWS Clients (lazy-initialized to avoid import-time errors in test environments)
 _dynamodb: DynamoDBServiceResource | None = None
+_dynamodb_client: DynamoDBClient | None = None
 _bedrock: BedrockRuntimeClient | None = None
 
+# Client settings. botocore's defaults (60 s connect and read timeouts, legacy
+# retries, 10 pooled connections) let one stalled connection hold an
+# invocation until the Lambda timeout.
+BEDROCK_REGION = os.environ.get("BEDROCK_REGION", "ap-northeast-1")
+CLIENT_CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get("CLIENT_CONNECT_TIMEOUT_SECONDS", "1")
+)
+DYNAMODB_READ_TIMEOUT_SECONDS = float(
+    os.environ.get("DYNAMODB_READ_TIMEOUT_SECONDS", "2")
+)
+# Model invocations stream for much longer than a DynamoDB call
+BEDROCK_READ_TIMEOUT_SECONDS = float(
+    os.environ.get("BEDROCK_READ_TIMEOUT_SECONDS", "60")
+)
+CLIENT_RETRY_MODE = os.environ.get("CLIENT_RETRY_MODE", "adaptive")
+CLIENT_MAX_ATTEMPTS = int(os.environ.get("CLIENT_MAX_ATTEMPTS", "3"))
+# Upper bound for the thread pools of scan_all and batch_get_all, so every
+# worker thread can keep a pooled connection open
+CLIENT_MAX_POOL_CONNECTIONS = int(os.environ.get("CLIENT_MAX_POOL_CONNECTIONS", "16"))
+CLIENT_TCP_KEEPALIVE = os.environ.get("CLIENT_TCP_KEEPALIVE", "true").lower() == "true"
+
+
+def client_config(service_name: str) -> Config:
+    """
+    Build the botocore Config shared by every client of a service.
+
+    Args:
+        service_name: "dynamodb" or "bedrock-runtime"
+
+    Returns:
+        Config with TCP keep-alive, CLIENT_MAX_POOL_CONNECTIONS pooled
+        connections, CLIENT_RETRY_MODE retries and short timeouts
+    """
+    from botocore.config import Config
+
+    read_timeout = (
+        BEDROCK_READ_TIMEOUT_SECONDS
+        if service_name == "bedrock-runtime"
+        else DYNAMODB_READ_TIMEOUT_SECONDS
+    )
+    # botocore validates the mode when the client is created
+    retries: Any = {"mode": CLIENT_RETRY_MODE, "max_attempts": CLIENT_MAX_ATTEMPTS}
+    return Config(
+        connect_timeout=CLIENT_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=read_timeout,
+        retries=retries,
+        max_pool_connections=CLIENT_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=CLIENT_TCP_KEEPALIVE,
+    )
+
+
+def get_dynamodb() -> DynamoDBServiceResource:
+    """Get or create DynamoDB resource."""
+    global _dynamodb
+    if _dynamodb is None:
+        import boto3
+
+        _dynamodb = boto3.resource("dynamodb", config=client_config("dynamodb"))
+        _register_call_hooks(_dynamodb.meta.client)
+    return _dynamodb
+
+
+def get_dynamodb_client() -> DynamoDBClient:
+    """
+    Get or create the low-level DynamoDB client used for reads.
+
+    Unlike the resource's own client it has no Decimal (de)serialization
+    hooks: read helpers serialize their parameters and deserialize items
+    straight to native types (NativeTypeDeserializer).
+    """
+    global _dynamodb_client
+    if _dynamodb_client is None:
+        import boto3
+
+        _dynamodb_client = boto3.client("dynamodb", config=client_config("dynamodb"))
+        _register_call_hooks(_dynamodb_client)
+    return _dynamodb_client
+
+
+def get_bedrock() -> BedrockRuntimeClient:
+    """Get or create Bedrock client."""
+    global _bedrock
+    if _bedrock is None:
+        import boto3
+
+        _bedrock = boto3.client(
+            "bedrock-runtime",
+            region_name=BEDROCK_REGION,
+            config=client_config("bedrock-runtime"),
+        )
+    return _bedrock
+
+
+class NativeTypeDeserializer:
+    """
+    Deserializer that returns numbers as int or float instead of Decimal.
+
+    Decimal cannot be JSON-encoded, so items read through the resource layer
+    had to be copied a second time by decimal_to_float. Deserializing wire
+    items with this class produces the same values in a single pass. Only
+    binary values are handed to boto3's TypeDeserializer, so reading items
+    does not import boto3 by itself.
+    """
+
+    def __init__(self) -> None:
+        self._binary: TypeDeserializer | None = None
+
+    def deserialize(self, value: Any) -> Any:
+        ((tag, data),) = value.items()
+        if tag == "S":
+            return data
+        if tag == "N":
+            return self._deserialize_n(data)
+        if tag == "M":
+            return {key: self.deserialize(item) for key, item in data.items()}
+        if tag == "L":
+            return [self.deserialize(item) for item in data]
+        if tag == "BOOL":
+            return data
+        if tag == "NULL":
+            return None
+        if tag == "SS":
+            return set(data)
+        if tag == "NS":
+            return {self._deserialize_n(number) for number in data}
+        if self._binary is None:
+            from boto3.dynamodb.types import TypeDeserializer
+
+            self._binary = TypeDeserializer()
+        return self._binary.deserialize(value)
+
+    def _deserialize_n(self, value: str) -> int | float:
+        try:
+            return int(value)
+        except ValueError:
+            number = Decimal(value)
+            return float(number) if number % 1 else int(number)
+
+
+@functools.cache
+def _type_serializer() -> TypeSerializer:
+    from boto3.dynamodb.types import TypeSerializer
+
+    return TypeSerializer()
+
+
+_deserializer = NativeTypeDeserializer()
+
+
+def serialize_item(item: dict[str, Any]) -> dict[str, Any]:
+    """Convert an item or key of Python values to the wire format."""
+    serializer = _type_serializer()
+    return {key: serializer.serialize(value) for key, value in item.items()}
+
+
+def deserialize_item(item: dict[str, Any]) -> dict[str, Any]:
+    """
+    Convert a low-level (wire format) item to native Python values.
+
+    Numbers become int or float, so the result can be JSON-encoded as is.
+    """
+    return {key: _deserializer.deserialize(value) for key, value in item.items()}
+
+
+def get_item(table: Table, key: dict[str, Any], **kwargs: Any) -> dict[str, Any] | None:
+    """
+    Get one item with native Python values.
+
+    Returns:
+        The item, or None if it does not exist
+    """
+    response = get_dynamodb_client().get_item(
+        TableName=table.name, Key=serialize_item(key), **kwargs
+    )
+    item = response.get("Item")
+    return deserialize_item(item) if item else None
+
+
+def _read_all_pages(
+    table: Table, operation: str, kwargs: dict[str, Any]
+) -> tuple[list[dict[str, Any]], float]:
+    """
+    Run a Scan or Query to completion, following LastEvaluatedKey.
+
+    Expressions must be strings; ExpressionAttributeValues are serialized
+    here. Returns the items (native Python values) and the total read
+    capacity units consumed.
+    """
+    # The low-level client is thread-safe (resources are not) and skips the
+    # resource layer's Decimal conversion
+    call = getattr(get_dynamodb_client(), operation)
+    kwargs = {"TableName": table.name, "ReturnConsumedCapacity": "TOTAL", **kwargs}
+    if "ExpressionAttributeValues" in kwargs:
+        kwargs["ExpressionAttributeValues"] = serialize_item(
+            kwargs["ExpressionAttributeValues"]
+        )
+
+    items: list[dict[str, Any]] = []
+    consumed = 0.0
+    while True:
+        response = call(**kwargs)
+        items.extend(deserialize_item(item) for item in response.get("Items", []))
+        consumed += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0.0)
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return items, consumed
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def scan_all(
+    table: Table,
+    total_segments: int = 1,
+    max_workers: int | None = None,
+    **scan_kwargs: Any,
+) -> tuple[list[dict[str, Any]], float]:
+    """
+    Scan every item of a table, following pagination.
+
+    A single Scan call stops at 1 MB of data, so callers that need the whole
+    table must follow LastEvaluatedKey. With total_segments > 1 the table is
+    split into parallel Segment/TotalSegments scans run in a thread pool, and
+    the results are concatenated in segment order.
+
+    Args:
+        table: DynamoDB Table resource to scan
+        total_segments: Number of parallel scan segments (1 = sequential scan)
+        max_workers: Thread pool size (defaults to total_segments, at most
+            CLIENT_MAX_POOL_CONNECTIONS)
+        **scan_kwargs: Extra Scan parameters (e.g. FilterExpression, Limit)
+
+    Returns:
+        All items of the table (or of the filtered scan), and the read
+        capacity units consumed across all pages and segments
+    """
+    if total_segments < 1:
+        raise ValueError("total_segments must be at least 1")
+
+    if total_segments == 1:
+        return _read_all_pages(table, "scan", scan_kwargs)
+
+    def scan_segment(segment: int) -> tuple[list[dict[str, Any]], float]:
+        kwargs = {**scan_kwargs, "Segment": segment, "TotalSegments": total_segments}
+        return _read_all_pages(table, "scan", kwargs)
+
+    workers = min(max_workers or total_segments, CLIENT_MAX_POOL_CONNECTIONS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(scan_segment, range(total_segments)))
+
+    items = [item for segment_items, _ in results for item in segment_items]
+    return items, sum(consumed for _, consumed in results)
+
+
+def query_all(table: Table, **query_kwargs: Any) -> tuple[list[dict[str, Any]], float]:
+    """
+    Query a table or index, following pagination.
+
+    Args:
+        table: DynamoDB Table resource to query
+        **query_kwargs: Query parameters (KeyConditionExpression, IndexName, ...)
+
+    Returns:
+        All matching items, and the read capacity units consumed across pages
+    """
+    return _read_all_pages(table, "query", query_kwargs)
+
+
+def history_key(date: str, household: str | None = None) -> dict[str, str]:
+    """
+    Build the primary key of the menu history item for a date.
+
+    With a household the history table is range-keyed (household + date), so
+    a date window is a single Query. Without one it is the legacy table keyed
+    by date alone.
+    """
+    if household:
+        return {"household": household, "date": date}
+    return {"date": date}
+
+
+def build_history_item(
+    date: str,
+    meals: dict[str, Any],
+    notes: str | None = None,
+    household: str | None = None,
+) -> dict[str, Any]:
+    """Build the history item for a day's menu."""
+    history: dict[str, Any] = {
+        **history_key(date, household),
+        "meals": meals,
+        "recipes": [],  # Flat list of recipe names
+        "created_at": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat(),
+    }
+
+    # Extract recipe names from meals structure
+    # meals is a simple structure: {breakfast: ["recipe1", "recipe2"], lunch: [...], dinner: [...]}
+    for meal_type in ["breakfast", "lunch", "dinner"]:
+        if meal_type in meals:
+            # meals[meal_type] is an array of strings (recipe names)
+            if isinstance(meals[meal_type], list):
+                history["recipes"].extend(meals[meal_type])
+
+    # Add optional notes
+    if notes:
+        history["notes"] = notes
+    return history
+
+
+def history_put_request(
+    history: dict[str, Any], existing_item: dict[str, Any] | None
+) -> dict[str, Any]:
+    """
+    Build conditional Put parameters for writing a day's menu.
+
+    A new day is only written if no menu exists for it yet. An overwrite is
+    only written if the stored item still has the version that was read
+    (optimistic concurrency); items saved before versioning count as
+    version 0. Sets the version (and, on overwrite, the original created_at)
+    on ``history``.
+
+    Args:
+        history: Item built by build_history_item
+        existing_item: The stored item that is being overwritten, or None
+
+    Returns:
+        Item, ConditionExpression and expression attribute parameters, usable
+        with PutItem or as a TransactWriteItems Put (plus TableName)
+    """
+    names = {"#date": "date", "#version": "version"}
+    values: dict[str, Any] = {}
+    if existing_item is None:
+        condition = "attribute_not_exists(#date)"
+        del names["#version"]
+        history["version"] = 1
+    else:
+        if "version" in existing_item:
+            condition = "#version = :version"
+            del names["#date"]
+            values[":version"] = existing_item["version"]
+        else:
+            condition = "attribute_exists(#date) AND attribute_not_exists(#version)"
+        history["version"] = existing_item.get("version", 0) + 1
+        history["created_at"] = existing_item.get("created_at", history["created_at"])
+
+    request = {
+        "Item": history,
+        "ConditionExpression": condition,
+        "ExpressionAttributeNames": names,
+    }
+    if values:
+        request["ExpressionAttributeValues"] = values
+    return request
+
+
+def agent_parameters(event: dict[str, Any]) -> dict[str, Any]:
+    """
+    Extract the action parameters from a Bedrock Agent event.
+
+    For POST requests with a requestBody the parameters are in
+    requestBody.content.application/json.properties.
+
+    Returns:
+        Parameter values by name
+    """
+    parameters_list = event.get("parameters", [])
+    if not parameters_list and "requestBody" in event:
+        request_body = event.get("requestBody", {})
+        content = request_body.get("content", {})
+        app_json = content.get("application/json", {})
+        parameters_list = app_json.get("properties", [])
+    return {p["name"]: p["value"] for p in parameters_list}
+
+
+def validate_date_format(date_string: str) -> bool:
+    """Validate date format (YYYY-MM-DD)."""
+    try:
+        datetime.strptime(date_string, "%Y-%m-%d")
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def screen_recipe_names(
+    meals: dict[str, Any], table: Table, mode: str
+) -> tuple[dict[str, Any], dict[str, list[str]], bool]:
+    """
+    Apply the RECIPE_NAME_VALIDATION mode to a day's meals.
+
+    Args:
+        meals: Meal structure ({breakfast: [...], lunch: [...], dinner: [...]})
+        table: Recipes table
+        mode: "reject", "flag" or "off"
+
+    Returns:
+        The meals (known names in their catalog spelling), the unknown names
+        mapped to suggestions, and whether the day must be rejected
+    """
+    if mode == "off":
+        return meals, {}, False
+    meals, unknown = check_recipe_names(meals, table)
+    return meals, unknown, bool(unknown) and mode == "reject"
+
+
+def update_recipe_usage(
+    table_name: str, days: list[tuple[str, list[str], list[str]]]
+) -> None:
+    """
+    Keep the per-recipe usage statistics in step with saved days.
+
+    Recipes kept on a day are checked again, so an earlier failed update heals
+    on the next save of that day without counting it twice. The changes of
+    all days are aggregated per recipe, so a month of menus costs one usage
+    read and one or two usage transactions per 100 recipes. The menus are already saved, so a failure
+    here is logged rather than raised; scripts/rebuild_recipe_usage.py
+    recomputes the statistics.
+
+    Args:
+        table_name: Usage table name
+        days: (date, previous recipes, current recipes) of each saved day
+    """
+    if not days:
+        return
+    try:
+        record_recipe_usage(get_dynamodb().Table(table_name), *usage_changes(days))
+    except Exception as e:
+        dates = ", ".join(day for day, _, _ in days)
+        logger.error(f"Failed to update recipe usage for {dates}: {str(e)}")
+
+
+def query_history(
+    table: Table, household: str, start_date: str, end_date: str
+) -> tuple[list[dict[str, Any]], float]:
+    """
+    Read a household's menus between two dates (inclusive), newest first.
+
+    Args:
+        table: Range-keyed history table (household HASH, date RANGE)
+        household: Partition key value
+        start_date: Oldest date to include (YYYY-MM-DD)
+        end_date: Newest date to include (YYYY-MM-DD)
+
+    Returns:
+        History items in date-descending order, and the read capacity units
+        consumed across pages
+    """
+    return query_all(
+        table,
+        KeyConditionExpression="#household = :household AND #date BETWEEN :start AND :end",
+        ExpressionAttributeNames={"#household": "household", "#date": "date"},
+        ExpressionAttributeValues={
+            ":household": household,
+            ":start": start_date,
+            ":end": end_date,
+        },
+        ScanIndexForward=False,
+    )
+
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "KondatePlanner")
+
+
+def emit_metrics(
+    metrics: dict[str, float],
+    dimensions: dict[str, str] | None = None,
+    unit: str = "Count",
+    units: dict[str, str] | None = None,
+    properties: dict[str, Any] | None = None,
+) -> None:
+    """
+    Publish metrics in CloudWatch Embedded Metric Format.
+
+    The record is printed rather than logged: the Lambda log handler prefixes
+    log lines, which stops CloudWatch from recognizing the JSON document.
+
+    Args:
+        metrics: Metric values by name
+        dimensions: Dimension values by name
+        unit: Unit of every metric not listed in units
+        units: Per-metric units (e.g. {"DynamoDBTime": "Milliseconds"})
+        properties: Extra fields for Logs Insights, not published as metrics
+    """
+    dimensions = dimensions or {}
+    units = units or {}
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [list(dimensions)],
+                    "Metrics": [
+                        {"Name": name, "Unit": units.get(name, unit)}
+                        for name in metrics
+                    ],
+                }
+            ],
+        },
+        **(properties or {}),
+        **dimensions,
+        **metrics,
+    }
+    print(dump_json(record))
+
+
+# DynamoDB operations whose capacity counts as reads; the rest are writes
+READ_OPERATIONS = frozenset(
+    {"BatchGetItem", "GetItem", "Query", "Scan", "TransactGetItems"}
+)
+
+
+class DynamoDBCallStats:
+    """
+    DynamoDB calls made during one invocation, filled by botocore event hooks.
+
+    Worker threads of scan_all and batch_get_all record into the same
+    instance, so updates are locked.
+    """
+
+    def __init__(self) -> None:
+        self.calls: dict[str, int] = {}
+        self.time_ms: dict[str, float] = {}
+        self.errors = 0
+        self.read_units = 0.0
+        self.write_units = 0.0
+        self._lock = threading.Lock()
+
+    def record(
+        self, operation: str, elapsed_ms: float, failed: bool, consumed: Any
+    ) -> None:
+        """Add one call (its retries included) and its ConsumedCapacity."""
+        # A dict for single-table calls, a list for batch and transact calls
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        units = sum(entry.get("CapacityUnits", 0.0) for entry in consumed or ())
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            self.time_ms[operation] = self.time_ms.get(operation, 0.0) + elapsed_ms
+            self.errors += failed
+            if operation in READ_OPERATIONS:
+                self.read_units += units
+            else:
+                self.write_units += units
+
+    def emit(self, action_group: str) -> None:
+        """Publish the totals and per-operation counts as one EMF record."""
+        metrics: dict[str, float] = {
+            "DynamoDBCalls": sum(self.calls.values()),
+            "DynamoDBErrors": self.errors,
+            "DynamoDBTime": sum(self.time_ms.values()),
+            "ConsumedReadCapacity": self.read_units,
+            "ConsumedWriteCapacity": self.write_units,
+        }
+        for operation, count in sorted(self.calls.items()):
+            metrics[f"{operation}Calls"] = count
+            metrics[f"{operation}Time"] = self.time_ms[operation]
+        emit_metrics(
+            metrics,
+            {"ActionGroup": action_group},
+            units={name: "Milliseconds" for name in metrics if name.endswith("Time")},
+        )
+
+
+# Stats of the running instrumented invocation (None outside one, e.g. INIT)
+_call_stats: DynamoDBCallStats | None = None
+
+
+def _register_call_hooks(client: Any) -> None:
+    """Record every call of a DynamoDB client into _call_stats."""
+    events = client.meta.events
+
+    def request_capacity(params: dict[str, Any], model: Any, **kwargs: Any) -> None:
+        if _call_stats is not None and (
+            "ReturnConsumedCapacity" in model.input_shape.members
+        ):
+            params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+    def start(model: Any, context: dict[str, Any], **kwargs: Any) -> None:
+        context["call_started"] = (model.name, time.perf_counter())
+
+    def finish(
+        context: dict[str, Any],
+        http_response: Any = None,
+        parsed: Any = None,
+        **kwargs: Any,
+    ) -> None:
+        # after-call-error (connection errors, timeouts) has no http_response
+        started = context.get("call_started")
+        if _call_stats is None or started is None:
+            return
+        operation, start_time = started
+        failed = http_response is None or http_response.status_code >= 300
+        _call_stats.record(
+            operation,
+            (time.perf_counter() - start_time) * 1000,
+            failed,
+            (parsed or {}).get("ConsumedCapacity"),
+        )
+
+    events.register("provide-client-params.dynamodb.*", request_capacity)
+    events.register("before-call.dynamodb.*", start)
+    events.register("after-call.dynamodb.*", finish)
+    events.register("after-call-error.dynamodb.*", finish)
+
+
+def instrument_dynamodb(handler: Handler) -> Handler:
+    """
+    Publish the DynamoDB calls of each invocation of an action handler.
+
+    Every call made through get_dynamodb() or get_dynamodb_client() during
+    the invocation is counted and timed per operation, with
+    ReturnConsumedCapacity=TOTAL requested where the caller did not ask for
+    capacity. One EMF record tagged with the event's actionGroup is printed
+    when the handler returns or raises (DynamoDBCalls, DynamoDBErrors,
+    DynamoDBTime, ConsumedRead/WriteCapacity and <Operation>Calls/Time).
+
+    Nested instrumented handlers are counted by the outermost one only.
+    """
+
+    @functools.wraps(handler)
+    def wrapper(event: dict[str, Any], context: Any) -> dict[str, Any]:
+        global _call_stats
+        if _call_stats is not None:
+            return handler(event, context)
+
+        stats = _call_stats = DynamoDBCallStats()
+        try:
+            return handler(event, context)
+        finally:
+            _call_stats = None
+            stats.emit(event.get("actionGroup") or "unknown")
+
+    return wrapper
+
+
+# Profile every invocation ("true") or a random share of them; read once, so
+# a disabled profiler leaves handlers undecorated
+PROFILE_HANDLER = os.environ.get("PROFILE_HANDLER", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# Also trace allocations with tracemalloc (slows the invocation noticeably)
+PROFILE_MEMORY = os.environ.get("PROFILE_MEMORY", "false").lower() == "true"
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "15"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp")
+
+
+def profile_invocation(handler: Handler) -> Handler:
+    """
+    Profile invocations of an action handler with cProfile.
+
+    Enabled by PROFILE_HANDLER=true (every invocation) or PROFILE_SAMPLE_RATE
+    (share of invocations, 0 to 1). A profiled invocation logs the top
+    PROFILE_TOP_N functions by cumulative time. It also writes the full
+    profile to PROFILE_DIR/<handler>-<request id>.pstats, to load with
+    pstats or snakeviz. With PROFILE_MEMORY=true the log also gets the
+    peak traced size and the lines holding the most memory when the
+    handler returns (e.g. the cached catalog).
+
+    Only the invoking thread is profiled: time spent in the worker threads
+    of scan_all and batch_get_all shows up as the executor waiting.
+
+    When neither setting is on the handler is returned unchanged, so a
+    disabled profiler adds no per-invocation cost.
+    """
+    if not PROFILE_HANDLER and PROFILE_SAMPLE_RATE <= 0:
+        return handler
+
+    @functools.wraps(handler)
+    def wrapper(event: dict[str, Any], context: Any) -> dict[str, Any]:
+        if not PROFILE_HANDLER and random.random() >= PROFILE_SAMPLE_RATE:
+            return handler(event, context)
+
+        import cProfile
+        import tracemalloc
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active (nested decorator or a debugger)
+            return handler(event, context)
+        trace_memory = PROFILE_MEMORY and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            return handler(event, context)
+        finally:
+            profiler.disable()
+            snapshot, peak = None, 0
+            if trace_memory:
+                snapshot = tracemalloc.take_snapshot().filter_traces(
+                    [tracemalloc.Filter(False, __file__)]
+                )
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            try:
+                _report_profile(handler, context, profiler, snapshot, peak)
+            except Exception as e:
+                logger.warning(f"Could not report the profile: {e}")
+
+    return wrapper
+
+
+def _report_profile(
+    handler: Handler, context: Any, profiler: Any, snapshot: Any, peak: int
+) -> None:
+    """Dump the profile to PROFILE_DIR and log its summary."""
+    request_id = getattr(context, "aws_request_id", None) or uuid.uuid4().hex
+    path = os.path.join(PROFILE_DIR, f"{handler.__name__}-{request_id}.pstats")
+    profiler.dump_stats(path)
+    lines = [f"Profile of {handler.__module__} written to {path}"]
+    lines += _profile_summary(profiler, PROFILE_TOP_N)
+    if snapshot is not None:
+        lines.append(
+            f"tracemalloc peak: {peak / 1024:.0f} KiB; "
+            "largest allocations still live at return:"
+        )
+        lines += [
+            f"  {stat.size / 1024:>8.1f} KiB {stat.count:>7} blocks  "
+            f"{stat.traceback}"
+            for stat in snapshot.statistics("lineno")[:PROFILE_TOP_N]
+        ]
+    logger.info("\n".join(lines))
+
+
+def _profile_summary(profiler: Any, top_n: int) -> list[str]:
+    """
+    Format the top_n functions by cumulative time, one line each.
+
+    Times come from pstats' stats profile, which rounds them to the
+    millisecond; the .pstats dump keeps full resolution.
+    """
+    import pstats
+
+    functions = pstats.Stats(profiler).get_stats_profile().func_profiles
+    rows = sorted(functions.items(), key=lambda row: -row[1].cumtime)
+    lines = [f"{'cum ms':>9} {'self ms':>9} {'calls':>8}  function"]
+    for function, row in rows[:top_n]:
+        # Built-in functions have no file ("~")
+        location = ""
+        if row.line_number:
+            location = f" ({os.path.basename(row.file_name)}:{row.line_number})"
+        lines.append(
+            f"{row.cumtime * 1000:>9.0f} {row.tottime * 1000:>9.0f} "
+            f"{row.ncalls:>8}  {function}{location}"
+        )
+    return lines
+
+
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_RETRIES = int(os.environ.get("BATCH_GET_MAX_RETRIES", "8"))
+BATCH_GET_BASE_DELAY_MS = float(os.environ.get("BATCH_GET_BASE_DELAY_MS", "50"))
+BATCH_GET_MAX_DELAY_MS = float(os.environ.get("BATCH_GET_MAX_DELAY_MS", "2000"))
+BATCH_GET_MAX_WORKERS = int(os.environ.get("BATCH_GET_MAX_WORKERS", "4"))
+# Time kept in reserve for building the response once retries give up
+DEADLINE_MARGIN_MS = float(os.environ.get("DEADLINE_MARGIN_MS", "1000"))
+
+
+class UnprocessedKeysError(Exception):
+    """Raised when BatchGetItem keys are still unprocessed after all retries."""
+
+    def __init__(self, message: str, unprocessed_keys: list[dict[str, Any]]):
+        super().__init__(message)
+        self.unprocessed_keys = unprocessed_keys
+
+
+def _batch_get_chunk(
+    table: Table,
+    keys: list[dict[str, Any]],
+    deadline: float | None,
+    request_kwargs: dict[str, Any],
+    stats: dict[str, int],
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]], str]:
+    """
+    Read one chunk of at most 100 keys, re-driving its unprocessed keys.
+
+    Returns the items, the keys left unprocessed (wire format, empty on
+    success) and why retrying stopped. Request counts are added to ``stats``.
+    """
+    # The low-level client is thread-safe (resources are not) and skips the
+    # resource layer's Decimal conversion
+    client = get_dynamodb_client()
+    items: list[dict[str, Any]] = []
+    pending = [serialize_item(key) for key in keys]
+    attempt = 0
+    while True:
+        request: Any = {"Keys": pending, **request_kwargs}
+        response = client.batch_get_item(RequestItems={table.name: request})
+        stats["requests"] += 1
+        items.extend(
+            deserialize_item(item)
+            for item in response.get("Responses", {}).get(table.name, [])
+        )
+        unprocessed: dict[str, Any] = response.get("UnprocessedKeys", {})
+        pending = unprocessed.get(table.name, {}).get("Keys") or []
+        if not pending:
+            return items, [], ""
+
+        stats["redriven"] += len(pending)
+        if attempt >= BATCH_GET_MAX_RETRIES:
+            return items, pending, f"after {attempt} retries"
+        cap = min(BATCH_GET_MAX_DELAY_MS, BATCH_GET_BASE_DELAY_MS * 2**attempt)
+        delay = random.uniform(0, cap) / 1000
+        if deadline is not None and time.monotonic() + delay > deadline:
+            return items, pending, "at the invocation deadline"
+        time.sleep(delay)
+        attempt += 1
+        stats["retries"] += 1
+
+
+def batch_get_all(
+    table: Table,
+    keys: list[dict[str, Any]],
+    context: Any = None,
+    max_workers: int | None = None,
+    **request_kwargs: Any,
+) -> list[dict[str, Any]]:
+    """
+    Get items by key with BatchGetItem, re-driving unprocessed keys.
+
+    Keys are sent in chunks of 100 (the BatchGetItem limit), fetched
+    concurrently on a bounded thread pool. DynamoDB may answer only part of a
+    request under throttling or when the response reaches 16 MB; the rest
+    comes back as UnprocessedKeys and is retried with full-jitter exponential
+    backoff. Retries stop before the Lambda deadline.
+
+    Publishes BatchGetRequests, BatchGetRetries and BatchGetUnprocessedKeys
+    metrics for the table.
+
+    Args:
+        table: DynamoDB Table resource to read from
+        keys: Primary keys of the items to get
+        context: Lambda context, used to respect the remaining invocation time
+        max_workers: Concurrent chunk requests (defaults to
+            BATCH_GET_MAX_WORKERS, at most CLIENT_MAX_POOL_CONNECTIONS)
+        **request_kwargs: Extra per-table request parameters
+            (e.g. ProjectionExpression, ConsistentRead)
+
+    Returns:
+        The items found as native Python values, grouped by chunk in key
+        order but in no particular order within a chunk (missing keys are
+        skipped)
+
+    Raises:
+        UnprocessedKeysError: If keys remain unprocessed after the retry
+            budget or before the deadline
+    """
+    deadline = None
+    if context is not None:
+        remaining_ms = context.get_remaining_time_in_millis() - DEADLINE_MARGIN_MS
+        deadline = time.monotonic() + remaining_ms / 1000
+
+    chunks = [
+        keys[i : i + BATCH_GET_MAX_KEYS]
+        for i in range(0, len(keys), BATCH_GET_MAX_KEYS)
+    ]
+    # One counter dict per chunk, so worker threads never share one
+    chunk_stats: list[dict[str, int]] = []
+
+    def read_chunk(
+        chunk: list[dict[str, Any]],
+    ) -> tuple[list[dict[str, Any]], list[dict[str, Any]], str]:
+        stats = {"requests": 0, "retries": 0, "redriven": 0}
+        chunk_stats.append(stats)
+        return _batch_get_chunk(table, chunk, deadline, request_kwargs, stats)
+
+    workers = min(
+        max_workers or BATCH_GET_MAX_WORKERS, len(chunks), CLIENT_MAX_POOL_CONNECTIONS
+    )
+    try:
+        if workers <= 1:
+            results = [read_chunk(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(read_chunk, chunks))
+    finally:
+        emit_metrics(
+            {
+                "BatchGetRequests": sum(s["requests"] for s in chunk_stats),
+                "BatchGetRetries": sum(s["retries"] for s in chunk_stats),
+                "BatchGetUnprocessedKeys": sum(s["redriven"] for s in chunk_stats),
+            },
+            {"Table": table.name},
+        )
+
+    unprocessed = [
+        deserialize_item(key) for _, pending, _ in results for key in pending
+    ]
+    if unprocessed:
+        reason = next(reason for _, pending, reason in results if pending)
+        raise UnprocessedKeysError(
+            f"{len(unprocessed)} keys still unprocessed {reason}", unprocessed
+        )
+    return [item for chunk_items, _, _ in results for item in chunk_items]
+
+
+# Rolling windows (in days, ending at the as-of date) reported per recipe
+USAGE_WINDOWS = (7, 30, 90)
+# Served dates older than the largest window are pruned from a recipe's date
+# set on write and folded into its archived_use_count / archived_last_used
+USAGE_HORIZON_DAYS = max(USAGE_WINDOWS)
+USAGE_WRITE_ATTEMPTS = 3
+TRANSACT_MAX_ITEMS = 100
+
+
+def usage_changes(
+    days: Iterable[tuple[str, Iterable[str], Iterable[str]]],
+) -> tuple[dict[str, set[str]], dict[str, set[str]], dict[str, set[str]]]:
+    """
+    Aggregate saved days into per-recipe usage changes.
+
+    Recipes served on a day both before and after the save are reported as
+    kept, so an earlier failed update of that day can be healed without
+    counting the day twice.
+
+    Args:
+        days: (date, previous recipes, current recipes) of each saved day
+
+    Returns:
+        The dates added, removed and kept, per recipe name
+    """
+    added: dict[str, set[str]] = {}
+    removed: dict[str, set[str]] = {}
+    kept: dict[str, set[str]] = {}
+    for day, previous, current in days:
+        before, served = set(previous), set(current)
+        for changes, names in (
+            (added, served - before),
+            (removed, before - served),
+            (kept, served & before),
+        ):
+            for name in names:
+                changes.setdefault(name, set()).add(day)
+    return added, removed, kept
+
+
+def record_recipe_usage(
+    table: Table,
+    added: dict[str, set[str]],
+    removed: dict[str, set[str]],
+    kept: dict[str, set[str]] | None = None,
+    today: str | None = None,
+) -> None:
+    """
+    Update recipes' usage after menus were written.
+
+    Each usage item holds the set of dates a recipe was served on since
+    archived_before; earlier dates are only counted, in archived_use_count
+    and archived_last_used, so items (and the get_recipe_usage Scan) stay
+    bounded. Counts are derived on read (see summarize_usage).
+
+    The touched items are read first (consistently, one BatchGetItem per 100
+    recipes): TransactWriteItems returns no attributes, and whether a date is
+    in the set, archived or not yet recorded decides how it is applied:
+
+    - a date in the set is added or removed idempotently, so saving the same
+      day twice never double counts, and a kept date missing from the set
+      (an earlier failed update) is added back
+    - an added or removed date before archived_before moves the archived
+      count by one; a kept one is left alone
+    - set dates more than USAGE_HORIZON_DAYS before ``today`` (or before the
+      recipe's latest use, if that is earlier) are moved into the archive
+
+    Each recipe gets at most one update adding dates and one for the rest,
+    100 recipes per transaction; a recipe with both has the second in a later
+    transaction, since one transaction cannot touch an item twice. The second
+    is conditional on the archived_before that was read: if another save
+    archived first, the cancelled recipes are read and applied again, up to
+    USAGE_WRITE_ATTEMPTS times.
+
+    Args:
+        table: Recipe usage table (name HASH)
+        added: Dates newly served on, per recipe (see usage_changes)
+        removed: Dates no longer served on, per recipe
+        kept: Dates still served on, per recipe
+        today: Date the horizon is counted back from (defaults to today)
+    """
+    kept = kept or {}
+    pending = sorted({name for changes in (added, removed, kept) for name in changes})
+    today = today or datetime.now().strftime("%Y-%m-%d")
+
+    for _ in range(USAGE_WRITE_ATTEMPTS):
+        if not pending:
+            return
+        stored = {
+            item["name"]: item
+            for item in batch_get_all(
+                table,
+                [{"name": name} for name in pending],
+                ConsistentRead=True,
+                **build_projection(
+                    [
+                        "name",
+                        "dates",
+                        "archived_before",
+                        "archived_use_count",
+                        "archived_last_used",
+                    ]
+                ),
+            )
+        }
+        updates: list[tuple[str, dict[str, Any]]] = []
+        deferred: list[tuple[str, dict[str, Any]]] = []
+        for name in pending:
+            addition, change = _plan_usage_update(
+                name,
+                stored.get(name, {}),
+                added.get(name, set()),
+                removed.get(name, set()),
+                kept.get(name, set()),
+                today,
+            )
+            if addition:
+                updates.append((name, addition))
+            if change:
+                (deferred if addition else updates).append((name, change))
+
+        cancelled = _transact_usage_updates(table, updates)
+        cancelled |= _transact_usage_updates(
+            table,
+            [(name, update) for name, update in deferred if name not in cancelled],
+        )
+        pending = sorted(cancelled)
+        if pending:
+            logger.warning(f"Usage update raced another save, retrying: {pending}")
+
+    if pending:
+        logger.error(
+            f"Usage of {pending} not updated; run scripts/rebuild_recipe_usage.py"
+        )
+
+
+def _plan_usage_update(
+    name: str,
+    item: dict[str, Any],
+    added: set[str],
+    removed: set[str],
+    kept: set[str],
+    today: str,
+) -> tuple[dict[str, Any] | None, dict[str, Any] | None]:
+    """
+    Plan one recipe's usage update against its stored item.
+
+    Returns:
+        The update adding dates to the set, and the update removing dates,
+        archiving and adjusting the archived count (either may be None)
+    """
+    dates = set(item.get("dates", ()))
+    before = item.get("archived_before")
+    last_used = item.get("archived_last_used") or ""
+
+    def archived(day: str) -> bool:
+        return before is not None and day < before
+
+    additions = {d for d in added | kept if not archived(d)} - dates
+    deletions = {d for d in removed if not archived(d)} & dates
+    counted = {d for d in added if archived(d)}
+    delta = len(counted) - sum(1 for d in removed if archived(d))
+
+    current = (dates | additions) - deletions
+    # Counted back from the latest use when that is before today, so the
+    # windows stay exact for any as_of from the latest use on
+    anchor = min(today, max(current, default=today))
+    horizon = (
+        datetime.strptime(anchor, "%Y-%m-%d") - timedelta(days=USAGE_HORIZON_DAYS - 1)
+    ).strftime("%Y-%m-%d")
+    stale = {d for d in current if d < horizon}
+    additions -= stale
+    deletions |= stale & dates
+    counted |= stale
+    delta += len(stale)
+
+    addition = (
+        {
+            "Key": {"name": name},
+            "UpdateExpression": "ADD #dates :dates",
+            "ExpressionAttributeNames": {"#dates": "dates"},
+            "ExpressionAttributeValues": {":dates": additions},
+        }
+        if additions
+        else None
+    )
+    if not (deletions or delta or stale):
+        return addition, None
+
+    clauses: list[str] = []
+    names: dict[str, str] = {}
+    values: dict[str, Any] = {}
+    if deletions:
+        clauses.append("DELETE #dates :dates")
+        names["#dates"] = "dates"
+        values[":dates"] = deletions
+    if delta:
+        clauses.append("ADD #count :delta")
+        names["#count"] = "archived_use_count"
+        values[":delta"] = delta
+    assignments: list[str] = []
+    if max(counted, default="") > last_used:
+        assignments.append("#last = :last")
+        names["#last"] = "archived_last_used"
+        values[":last"] = max(counted)
+    if stale:
+        assignments.append("#before = :horizon")
+        values[":horizon"] = horizon
+    if assignments:
+        clauses.append("SET " + ", ".join(assignments))
+    names["#before"] = "archived_before"
+    if before is None:
+        condition = "attribute_not_exists(#before)"
+    else:
+        condition = "#before = :before"
+        values[":before"] = before
+    change = {
+        "Key": {"name": name},
+        "UpdateExpression": " ".join(clauses),
+        "ConditionExpression": condition,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+    return addition, change
+
+
+def _transact_usage_updates(
+    table: Table, updates: list[tuple[str, dict[str, Any]]]
+) -> set[str]:
+    """
+    Apply (recipe name, Update action) pairs, 100 per TransactWriteItems.
+
+    Returns:
+        Names of the recipes whose transaction was cancelled
+    """
+    cancelled: set[str] = set()
+    for i in range(0, len(updates), TRANSACT_MAX_ITEMS):
+        chunk = updates[i : i + TRANSACT_MAX_ITEMS]
+        items: Any = [
+            {"Update": {"TableName": table.name, **update}} for _, update in chunk
+        ]
+        try:
+            table.meta.client.transact_write_items(TransactItems=items)
+        except table.meta.client.exceptions.TransactionCanceledException:
+            cancelled.update(name for name, _ in chunk)
+    return cancelled
+
+
+def summarize_usage(
+    dates: set[str] | list[str],
+    as_of: str,
+    archived_use_count: int = 0,
+    archived_last_used: str | None = None,
+) -> dict[str, Any]:
+    """
+    Derive usage statistics from the dates a recipe was served on.
+
+    Dates after as_of are planned menus: they count towards next_planned only.
+    Archived uses (pruned by record_recipe_usage, all older than the largest
+    window) count towards use_count, and towards last_used when no date in
+    the set is on or before as_of.
+
+    Returns:
+        last_used, days_since_last_used, use_count, uses_<N>d for each of
+        USAGE_WINDOWS, and next_planned
+    """
+    end = datetime.strptime(as_of, "%Y-%m-%d")
+    past = sorted((d for d in dates if d <= as_of), reverse=True)
+    future = sorted(d for d in dates if d > as_of)
+
+    if archived_use_count <= 0 or not archived_last_used or archived_last_used > as_of:
+        archived_use_count, archived_last_used = 0, None
+    last_used = past[0] if past else archived_last_used
+
+    summary: dict[str, Any] = {
+        "last_used": last_used,
+        "days_since_last_used": (
+            (end - datetime.strptime(last_used, "%Y-%m-%d")).days if last_used else None
+        ),
+        "use_count": len(past) + archived_use_count,
+    }
+    for window in USAGE_WINDOWS:
+        start = (end - timedelta(days=window - 1)).strftime("%Y-%m-%d")
+        summary[f"uses_{window}d"] = sum(1 for d in past if d >= start)
+    summary["next_planned"] = future[0] if future else None
+    return summary
+
+
+def build_projection(fields: list[str]) -> dict[str, Any]:
+    """
+    Build Scan/Query parameters that return only the given attributes.
+
+    Names always go through ExpressionAttributeNames because common attribute
+    names such as "name" and "date" are DynamoDB reserved words.
+    """
+    names = {f"#p{i}": field for i, field in enumerate(fields)}
+    return {
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+    }
+
+
+def to_rows(records: list[dict[str, Any]], columns: list[str]) -> list[list[Any]]:
+    """Encode records as positional rows matching a column header."""
+    return [[record.get(column) for column in columns] for record in records]
+
+
+# Reserved item in the recipes table whose "version" attribute changes
+# whenever the catalog is written. It has no category, so it never appears in
+# the CategoryIndex GSI, but full-table scans must skip it.
+CATALOG_VERSION_KEY = "__catalog_version__"
+
+
+def get_catalog_version(table: Table) -> str | None:
+    """Read the current catalog version token (None if never bumped)."""
+    response = table.get_item(
+        Key={"name": CATALOG_VERSION_KEY},
+        ProjectionExpression="#version",
+        ExpressionAttributeNames={"#version": "version"},
+    )
+    version = response.get("Item", {}).get("version")
+    return str(version) if version is not None else None
+
+
+def bump_catalog_version(table: Table) -> str:
+    """
+    Mark the recipe catalog as changed so warm caches reload it.
+
+    Every writer of the recipes table must call this after writing. A random
+    token is used instead of a counter so that clearing and re-seeding the
+    table can never reproduce a version a cache has already seen.
+    """
+    version = uuid.uuid4().hex
+    table.put_item(Item={"name": CATALOG_VERSION_KEY, "version": version})
+    return version
+
+
+class CatalogCache:
+    """
+    In-process cache for recipe catalog reads.
 
-def get_dynamodb() -> DynamoDBServiceResource:
-    """Get or create DynamoDB resource."""
-    global _dynamodb
-    if _dynamodb is None:
-        _dynamodb = boto3.resource("dynamodb")
-    return _dynamodb
+    Module-level instances live as long as the Lambda container, so warm
+    invocations are answered from memory. Within ttl_seconds of the last
+    freshness check entries are returned without touching DynamoDB; after that
+    a single GetItem on the catalog version item decides whether every entry
+    is still current or the whole cache must be dropped. Entries beyond
+    max_entries are evicted least-recently-used first.
 
+    Lambda runs one invocation per container at a time, so no locking is done.
+    """
 
-def get_bedrock() -> BedrockRuntimeClient:
-    """Get or create Bedrock client."""
-    global _bedrock
-    if _bedrock is None:
-        _bedrock = boto3.client("bedrock-runtime", region_name="ap-northeast-1")
-    return _bedrock
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 32) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._version: str | None = None
+        self._checked_at: float | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version_checks = 0
+
+    def get(self, key: Hashable, table: Table, loader: Callable[[], T]) -> T:
+        """
+        Return the cached value for key, calling loader on a miss.
+
+        Args:
+            key: Cache key (e.g. the category filter of the request)
+            table: Recipes table holding the catalog version item
+            loader: Function that reads the value from DynamoDB
+
+        Returns:
+            The cached or freshly loaded value. Callers must not mutate it.
+        """
+        self._ensure_fresh(table)
+
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            value: T = self._entries[key]
+            return value
+
+        self.misses += 1
+        value = loader()
+        if self.max_entries > 0:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def _ensure_fresh(self, table: Table) -> None:
+        """Drop all entries if the catalog version changed since last check."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.ttl_seconds:
+            return
+
+        self.version_checks += 1
+        version = get_catalog_version(table)
+        if self._checked_at is None or version != self._version:
+            self._entries.clear()
+        self._version = version
+        self._checked_at = now
+
+    def revalidate(self, table: Table) -> bool:
+        """
+        Check the catalog version now, ignoring ttl_seconds.
+
+        For callers that found something missing from a cached value and want
+        to rule out a catalog change within the TTL before reporting it.
+
+        Returns:
+            True if the version changed and the entries were dropped
+        """
+        self.version_checks += 1
+        version = get_catalog_version(table)
+        self._checked_at = time.monotonic()
+        if version == self._version:
+            return False
+        self._entries.clear()
+        self._version = version
+        return True
+
+    def clear(self) -> None:
+        """Drop every entry and force a version check on the next access."""
+        self._entries.clear()
+        self._version = None
+        self._checked_at = None
+
+    def stats(self) -> dict[str, int]:
+        """Return hit/miss/eviction counters for logging."""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "version_checks": self.version_checks,
+        }
+
+
+# Shared by every invocation served by this container
+recipe_cache = CatalogCache(
+    ttl_seconds=float(os.environ.get("RECIPE_CACHE_TTL_SECONDS", "60")),
+    max_entries=int(os.environ.get("RECIPE_CACHE_MAX_ENTRIES", "32")),
+)
+
+
+def normalize_ingredient(ingredient: str) -> str:
+    """Normalize an ingredient name for matching (NFKC width folding, case)."""
+    return unicodedata.normalize("NFKC", ingredient).strip().casefold()
+
+
+class IngredientIndex:
+    """
+    Inverted index from normalized ingredient to the names of the recipes
+    that use it.
+
+    Built once from the catalog and kept in recipe_cache, so an ingredient
+    search costs a few dictionary probes and a posting-list intersection
+    instead of a pass over every recipe.
+    """
+
+    def __init__(self, recipes: list[dict[str, Any]]) -> None:
+        self._postings: dict[str, set[str]] = {}
+        for recipe in recipes:
+            for ingredient in recipe.get("ingredients") or []:
+                if not isinstance(ingredient, str):
+                    continue
+                key = normalize_ingredient(ingredient)
+                if key:
+                    self._postings.setdefault(key, set()).add(recipe["name"])
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def search(self, ingredients: list[str], match: str = "any") -> set[str]:
+        """
+        Find recipes by ingredient.
+
+        Args:
+            ingredients: Ingredient names (normalized before lookup)
+            match: "any" for recipes using at least one of the ingredients,
+                "all" for recipes using every one of them
+
+        Returns:
+            Names of the matching recipes
+        """
+        if match not in ("any", "all"):
+            raise ValueError("match must be one of: any, all")
+
+        postings = [
+            self._postings.get(normalize_ingredient(ingredient), set())
+            for ingredient in ingredients
+        ]
+        if not postings:
+            return set()
+        if match == "any":
+            return set().union(*postings)
+
+        # Intersect starting from the shortest posting list so the working set
+        # only shrinks, and stop as soon as it is empty
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            if not result:
+                break
+            result &= posting
+        return result
+
+
+def normalize_recipe_name(name: str) -> str:
+    """Normalize a recipe name for matching (NFKC width folding, spaces, case)."""
+    return "".join(unicodedata.normalize("NFKC", name).split()).casefold()
+
+
+class RecipeNameIndex:
+    """
+    Hash-set snapshot of the recipe names in the catalog.
+
+    Names are looked up exactly first, then by their normalized form, so a
+    full-width/half-width or spacing variant of a catalog name resolves to
+    the catalog spelling. Each lookup is one or two set probes; only names
+    that are not found at all are compared against the catalog for
+    suggestions.
+    """
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self._names: set[str] = set()
+        self._normalized: dict[str, str] = {}
+        for name in names:
+            self._names.add(name)
+            self._normalized.setdefault(normalize_recipe_name(name), name)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def resolve(self, name: str) -> str | None:
+        """Return the catalog spelling of name, or None if it is unknown."""
+        if name in self._names:
+            return name
+        return self._normalized.get(normalize_recipe_name(name))
+
+    def suggest(self, name: str, limit: int = 3) -> list[str]:
+        """Return up to limit catalog names that look like name."""
+        matches = difflib.get_close_matches(
+            normalize_recipe_name(name), self._normalized, n=limit, cutoff=0.5
+        )
+        return [self._normalized[match] for match in matches]
+
+
+def load_recipe_name_index(table: Table) -> RecipeNameIndex:
+    """Read every recipe name (names only) into a RecipeNameIndex."""
+    items, _ = scan_all(table, **build_projection(["name"]))
+    return RecipeNameIndex(
+        item["name"] for item in items if item.get("name") != CATALOG_VERSION_KEY
+    )
+
+
+def check_recipe_names(
+    meals: dict[str, Any], table: Table
+) -> tuple[dict[str, Any], dict[str, list[str]]]:
+    """
+    Check every dish of a day's meals against the recipe catalog.
+
+    The name set comes from recipe_cache, so a warm call costs no reads (at
+    most a catalog version check). When unknown names are found the version
+    is checked once more before they are reported, so a recipe added within
+    the cache TTL is not rejected.
+
+    Args:
+        meals: Meal structure ({breakfast: [...], lunch: [...], dinner: [...]})
+        table: Recipes table
+
+    Returns:
+        The meals with every known name in its catalog spelling, and the
+        unknown names mapped to suggested catalog names
+    """
+    for attempt in range(2):
+        index = recipe_cache.get(
+            ("recipe_names",), table, lambda: load_recipe_name_index(table)
+        )
+        resolved: dict[str, Any] = {}
+        unknown: dict[str, list[str]] = {}
+        for meal_type, dishes in meals.items():
+            if not isinstance(dishes, list):
+                resolved[meal_type] = dishes
+                continue
+            resolved[meal_type] = []
+            for dish in dishes:
+                name = index.resolve(dish) if isinstance(dish, str) else None
+                if name is None:
+                    unknown[str(dish)] = []
+                resolved[meal_type].append(name or dish)
+        if not unknown or attempt or not recipe_cache.revalidate(table):
+            break
+
+    for name in unknown:
+        unknown[name] = index.suggest(name)
+    return resolved, unknown
+
+
+# Work moved from the first request into the Lambda INIT phase (opt-in):
+# "connection" opens the DynamoDB connections, "catalog" also loads the
+# handler's recipe cache entries. Off when empty or "off".
+PRIME_ON_INIT = os.environ.get("PRIME_ON_INIT", "").lower()
+PRIME_LEVELS = ("off", "connection", "catalog")
+
+
+def prime_on_init(
+    table_name: str,
+    catalog_loaders: dict[Hashable, Callable[[Table], Any]] | None = None,
+) -> dict[str, float]:
+    """
+    Do the first request's setup work at import time, if PRIME_ON_INIT asks.
+
+    Handlers call this at module level, so the work runs during INIT (which
+    SnapStart snapshots) instead of on the agent's critical path. boto3 is
+    imported and both DynamoDB clients are created and connected with one
+    DescribeTable call each. At the "catalog" level each loader is run
+    through recipe_cache under its key, so the first request is a cache hit.
+
+    Under SnapStart an after-restore runtime hook is registered: connections
+    in the snapshot are stale, so the clients are rebuilt and reconnected,
+    and the cached catalog is revalidated against its version item.
+
+    Priming is an optimization only. Errors are logged and the handler falls
+    back to doing the same work on its first request.
+
+    Args:
+        table_name: Table the function may describe; with catalog_loaders,
+            the recipes table
+        catalog_loaders: recipe_cache keys mapped to the loader the handler
+            uses for them
+
+    Returns:
+        Milliseconds spent per priming step (empty when priming is off)
+    """
+    level = PRIME_ON_INIT or "off"
+    if level not in PRIME_LEVELS:
+        logger.warning(
+            f"Ignoring PRIME_ON_INIT={level!r}, expected one of {PRIME_LEVELS}"
+        )
+        return {}
+    if level == "off":
+        return {}
+
+    catalog = catalog_loaders if level == "catalog" else None
+    timings = _prime(table_name, catalog)
+    try:
+        from snapshot_restore_py import register_after_restore
+    except ImportError:
+        pass  # not running under SnapStart
+    else:
+        register_after_restore(_prime_after_restore, table_name, bool(catalog))
+    return timings
+
+
+def _prime(
+    table_name: str, catalog: dict[Hashable, Callable[[Table], Any]] | None
+) -> dict[str, float]:
+    """Connect both DynamoDB clients and load catalog entries, timing each."""
+    timings: dict[str, float] = {}
+    start = time.perf_counter()
+    try:
+        get_dynamodb_client().describe_table(TableName=table_name)
+        get_dynamodb().meta.client.describe_table(TableName=table_name)
+        timings["connection_ms"] = (time.perf_counter() - start) * 1000
+
+        if catalog:
+            start = time.perf_counter()
+            table = get_dynamodb().Table(table_name)
+            for key, loader in catalog.items():
+                recipe_cache.get(key, table, functools.partial(loader, table))
+            timings["catalog_ms"] = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        logger.warning(f"Priming on INIT failed, continuing unprimed: {e}")
+    logger.info(f"Primed on INIT: {timings}")
+    return timings
+
+
+def _prime_after_restore(table_name: str, revalidate_catalog: bool) -> None:
+    """SnapStart after-restore hook: reconnect and revalidate the catalog."""
+    global _dynamodb, _dynamodb_client, _bedrock
+    _dynamodb = _dynamodb_client = _bedrock = None
+    _prime(table_name, None)
+    if revalidate_catalog:
+        recipe_cache.revalidate(get_dynamodb().Table(table_name))
+
+
+# Encoder of response bodies: "stdlib" (default) keeps json.dumps' default
+# format, byte for byte what clients always received; "orjson" opts into
+# compact UTF-8 JSON, equal once decoded but not byte-identical
+JSON_ENCODER = os.environ.get("JSON_ENCODER", "stdlib")
+
+
+def _json_default(obj: Any) -> Any:
+    """Encode the non-JSON types found in DynamoDB items and handler results."""
+    if isinstance(obj, Decimal):
+        return float(obj) if obj % 1 else int(obj)
+    if isinstance(obj, (set, frozenset)):
+        # Sorted so the output does not depend on hash order
+        try:
+            return sorted(obj)
+        except TypeError:
+            return list(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _orjson_bodies() -> bool:
+    """Return whether response bodies are encoded with orjson."""
+    return JSON_ENCODER == "orjson" and HAVE_ORJSON
+
+
+def encode_json(obj: Any, ensure_ascii: bool = True) -> str:
+    """
+    Encode a response body.
+
+    By default this is exactly json.dumps(obj, ensure_ascii=ensure_ascii):
+    ", " and ": " separators and, unless ensure_ascii is False, non-ASCII
+    characters escaped. Decimal, datetime, date and set values are encoded
+    directly, so results read through the resource layer need no
+    decimal_to_float pass first.
+
+    With JSON_ENCODER=orjson (and orjson installed) the body is compact
+    UTF-8 JSON instead, whatever ensure_ascii says. It decodes to the same
+    value, except that orjson writes floats in shortest form (1e16, not
+    1e+16) and NaN and infinities as null. Values orjson rejects (integers
+    beyond 64 bits, non-string keys) are encoded by the stdlib.
+    """
+    if _orjson_bodies():
+        try:
+            return orjson.dumps(obj, default=_json_default).decode()
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=ensure_ascii, default=_json_default)
+
+
+def dump_json(obj: Any) -> str:
+    """
+    Encode a value that never reaches a client (logs, metrics, stored
+    records) as compact UTF-8 JSON, with orjson whenever it is installed.
+    """
+    if HAVE_ORJSON:
+        try:
+            return orjson.dumps(obj, default=_json_default).decode()
+        except TypeError:
+            pass
+    return json.dumps(
+        obj, ensure_ascii=False, separators=(",", ":"), default=_json_default
+    )
+
+
+def log_event(log: logging.Logger, event: dict[str, Any]) -> None:
+    """
+    Log an incoming agent event.
+
+    The full event is only encoded when debug logging is enabled, since
+    events carry the whole request body.
+
+    Args:
+        log: The handler's logger
+        event: Bedrock Agent event
+    """
+    log.info(f"Received {event.get('apiPath') or event.get('function')} request")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"Received event: {dump_json(event)}")
 
 
 def create_response(
@@ -41,13 +1722,331 @@ def create_response(
     }
     if is_json:
         headers["Content-Type"] = "application/json"
-        body = json.dumps(body, ensure_ascii=False)
+        body = encode_json(body, ensure_ascii=False)
 
     return {"statusCode": status_code, "headers": headers, "body": body}
 
 
+# Bedrock Agent action responses are capped at 25 KB. Leave headroom for the
+# response envelope around the body.
+RESPONSE_MAX_BYTES = int(os.environ.get("RESPONSE_MAX_BYTES", "20000"))
+
+
+def create_agent_response(
+    event: dict[str, Any], status_code: int, body: dict[str, Any] | str
+) -> dict[str, Any]:
+    """Creates a Bedrock Agent action group response."""
+    if not isinstance(body, str):
+        body = encode_json(body)
+
+    return {
+        "messageVersion": "1.0",
+        "response": {
+            "actionGroup": event.get("actionGroup"),
+            "apiPath": event.get("apiPath"),
+            "httpMethod": event.get("httpMethod"),
+            "httpStatusCode": status_code,
+            "responseBody": {"application/json": {"body": body}},
+        },
+    }
+
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "3600"))
+# How long a retry waits for the first invocation of the same request
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_SECONDS = 0.2
+
+
+def idempotency_key(event: dict[str, Any]) -> str:
+    """
+    Build the deduplication key of an agent action request.
+
+    The agent session ID plus a SHA-256 of the action and its parameters, so
+    a retry of the same call maps to the same key while a changed request
+    (or another session) does not.
+    """
+    payload = {
+        name: event.get(name)
+        for name in (
+            "actionGroup",
+            "apiPath",
+            "httpMethod",
+            "function",
+            "parameters",
+            "requestBody",
+        )
+    }
+    digest = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+    return f"{event.get('sessionId', '')}#{digest}"
+
+
+def _claim_request(
+    table: Table, key: str, in_progress_seconds: float
+) -> dict[str, Any] | None:
+    """
+    Record a request as in progress with one conditional PutItem.
+
+    The claim succeeds if there is no record, the record expired (DynamoDB TTL
+    deletes lazily), or the invocation holding it ran past its own deadline.
+
+    Returns:
+        None if claimed, otherwise the existing record
+    """
+    now = int(time.time())
+    try:
+        table.put_item(
+            Item={
+                "id": key,
+                "status": "INPROGRESS",
+                "expires_at": now + IDEMPOTENCY_TTL_SECONDS,
+                "in_progress_until": now + int(in_progress_seconds) + 1,
+            },
+            ConditionExpression=(
+                "attribute_not_exists(#id) OR #expires_at < :now "
+                "OR (#status = :in_progress AND #in_progress_until < :now)"
+            ),
+            ExpressionAttributeNames={
+                "#id": "id",
+                "#expires_at": "expires_at",
+                "#status": "status",
+                "#in_progress_until": "in_progress_until",
+            },
+            ExpressionAttributeValues={":now": now, ":in_progress": "INPROGRESS"},
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+        return None
+    except table.meta.client.exceptions.ConditionalCheckFailedException as e:
+        record: Any = e.response.get("Item", {})
+        return deserialize_item(record)
+
+
+def _wait_for_result(
+    table: Table,
+    key: str,
+    record: dict[str, Any],
+    wait_seconds: float,
+    in_progress_seconds: float,
+) -> tuple[bool, dict[str, Any] | None]:
+    """
+    Poll an in-progress record until it completes or wait_seconds pass.
+
+    If the record disappears (the first invocation failed and released its
+    claim) or its holder ran past in_progress_until, the request is claimed
+    again, so the caller runs it instead of waiting for a result that will
+    never be stored.
+
+    Returns:
+        (claimed, response): claimed is True when this invocation now holds
+        the claim. Otherwise response is the stored response, or None if the
+        first invocation was still running when the wait ended.
+    """
+    start = time.monotonic()
+    while record.get("status") != "COMPLETED":
+        if not record or record.get("in_progress_until", 0) < int(time.time()):
+            elapsed = time.monotonic() - start
+            record = _claim_request(table, key, in_progress_seconds - elapsed) or {}
+            if not record:
+                return True, None
+            continue
+        if time.monotonic() - start + IDEMPOTENCY_POLL_SECONDS > wait_seconds:
+            return False, None
+        time.sleep(IDEMPOTENCY_POLL_SECONDS)
+        record = table.get_item(Key={"id": key}, ConsistentRead=True).get("Item", {})
+    response: dict[str, Any] = json.loads(record["response"])
+    return False, response
+
+
+def _finish_request(table: Table, key: str, response: dict[str, Any] | None) -> None:
+    """Store the response of a claimed request, or release the claim if None."""
+    try:
+        if response is None:
+            table.delete_item(Key={"id": key})
+            return
+        table.put_item(
+            Item={
+                "id": key,
+                "status": "COMPLETED",
+                "response": dump_json(response),
+                "expires_at": int(time.time()) + IDEMPOTENCY_TTL_SECONDS,
+            }
+        )
+    except Exception as e:
+        # The request itself already finished; a retry just runs it again
+        logger.warning(f"Failed to record the result of request {key}: {e}")
+
+
+def idempotent(table_name: str) -> Callable[[Handler], Handler]:
+    """
+    Make an action handler return the stored result for retried requests.
+
+    Bedrock Agent retries an action call when the Lambda is slow, so the same
+    save can arrive twice. Each request is claimed in table_name under
+    idempotency_key() before the handler runs, and the handler's response is
+    stored for IDEMPOTENCY_TTL_SECONDS. A retry replays the stored response
+    without running the handler; a retry that arrives while the first
+    invocation is still running waits for its result, and runs the request
+    itself if that invocation gives up its claim.
+
+    Only successes (2xx) and conflicts (409) are stored. Other rejections,
+    such as unknown recipe names, depend on state that may change before the
+    retry, so they release the claim like server errors and exceptions do.
+
+    With an empty table_name the handler is returned unchanged. If the
+    idempotency table cannot be reached the handler runs without
+    deduplication.
+    """
+
+    def decorator(handler: Handler) -> Handler:
+        if not table_name:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event: dict[str, Any], context: Any) -> dict[str, Any]:
+            table = get_dynamodb().Table(table_name)
+            key = idempotency_key(event)
+            remaining = (
+                context.get_remaining_time_in_millis() / 1000
+                if context is not None
+                else IDEMPOTENCY_WAIT_SECONDS
+            )
+            try:
+                record = _claim_request(table, key, remaining)
+            except Exception as e:
+                logger.warning(f"Idempotency check failed, running without it: {e}")
+                return handler(event, context)
+
+            if record is not None:
+                wait = min(
+                    IDEMPOTENCY_WAIT_SECONDS, remaining - DEADLINE_MARGIN_MS / 1000
+                )
+                claimed, stored = _wait_for_result(table, key, record, wait, remaining)
+                if stored is not None:
+                    logger.info(f"Returning the stored result of request {key}")
+                    return stored
+                if not claimed:
+                    return create_agent_response(
+                        event,
+                        409,
+                        {
+                            "success": False,
+                            "error": "request_in_progress",
+                            "message": "The same request is still being processed. Please check the result before retrying.",
+                        },
+                    )
+
+            try:
+                response = handler(event, context)
+            except Exception:
+                _finish_request(table, key, None)
+                raise
+            status = response.get("response", {}).get("httpStatusCode", 500)
+            final = 200 <= status < 300 or status == 409
+            _finish_request(table, key, response if final else None)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def encode_cursor(offset: int, query: dict[str, Any]) -> str:
+    """Encode a continuation cursor carrying the offset and the original query."""
+    payload = json.dumps({"offset": offset, "query": query}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, dict[str, Any]]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Returns:
+        The offset of the next record and the query of the first call
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        offset = payload["offset"]
+        query = payload["query"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    if not isinstance(offset, int) or offset < 0 or not isinstance(query, dict):
+        raise ValueError("Invalid cursor")
+    return offset, query
+
+
+def paginate_records(
+    key: str,
+    records: list[Any],
+    query: dict[str, Any],
+    offset: int = 0,
+    extra: dict[str, Any] | None = None,
+    max_bytes: int | None = None,
+) -> str:
+    """
+    Serialize records into a JSON body that fits a byte budget.
+
+    Records are encoded one by one starting at offset and the body is closed
+    at the last record boundary that fits. When records remain, the body
+    carries a "next_cursor" the agent passes back (as the "cursor" parameter)
+    to continue with the same query. At least one record is always included so
+    that pagination makes progress.
+
+    The output is byte-identical to encode_json of the same dict, with either
+    JSON_ENCODER.
+
+    Args:
+        key: Body key holding the record list (e.g. "recipes")
+        records: Full result list
+        query: Request parameters needed to rebuild the same result list
+        offset: Index of the first record to include
+        extra: Other body fields, placed before the record list
+        max_bytes: Body size budget in UTF-8 bytes (default RESPONSE_MAX_BYTES)
+
+    Returns:
+        The JSON body string
+    """
+    budget = RESPONSE_MAX_BYTES if max_bytes is None else max_bytes
+    comma, colon = (",", ":") if _orjson_bodies() else (", ", ": ")
+    head = "{" + "".join(
+        f"{encode_json(name)}{colon}{encode_json(value)}{comma}"
+        for name, value in (extra or {}).items()
+    )
+    head += f"{encode_json(key)}{colon}["
+
+    # Reserve room for the closing brackets and a worst-case cursor
+    cursor = encode_cursor(len(records), query)
+    reserve = len(f']{comma}"next_cursor"{colon}"{cursor}"}}')
+    used = len(head.encode()) + reserve
+
+    parts: list[str] = []
+    end = offset
+    while end < len(records):
+        part = encode_json(records[end])
+        size = len(part.encode()) + (len(comma) if parts else 0)
+        if parts and used + size > budget:
+            break
+        parts.append(part)
+        used += size
+        end += 1
+
+    body = head + comma.join(parts) + "]"
+    if end < len(records):
+        body += f'{comma}"next_cursor"{colon}{encode_json(encode_cursor(end, query))}'
+    return body + "}"
+
+
 def decimal_to_float(obj: Any) -> Any:
-    """Recursively converts DynamoDB Decimal types to Python floats or ints."""
+    """
+    Recursively converts DynamoDB Decimal types to Python floats or ints.
+
+    Only needed for items read through the resource layer; the read helpers
+    above already return native types.
+    """
     if isinstance(obj, Decimal):
         return float(obj) if obj % 1 else int(obj)
     if isinstance(obj, dict):
@@ -57,6 +2056,252 @@ def decimal_to_float(obj: Any) -> Any:
     return obj
 
 
+class ParameterParseError(ValueError):
+    """Raised when a Bedrock Agent parameter cannot be parsed."""
+
+    def __init__(self, message: str, position: int):
+        super().__init__(message)
+        self.position = position
+
+
+# Closing bracket of each container
+_CLOSING = {"{": "}", "[": "]"}
+_WHITESPACE = re.compile(r"\s*")
+# A double-quoted string; a backslash escapes any character but a line break
+_STRING = r'"[^"\\]*(?:\\[^\n][^"\\]*)*"'
+_STRING_PATTERN = re.compile(_STRING)
+# An object key: a quoted key followed by ":" or "=", or bare text followed by
+# "=". Whitespace before a bare key belongs to it (it is stripped later), so
+# "{ =x}" has the empty key while "{=x}" has none.
+_KEY = re.compile(rf'\s*({_STRING})\s*[:=]|([^={{}}\[\],"]+)=')
+# A quoted value and the separator after it
+_QUOTED_VALUE = re.compile(rf"({_STRING})\s*([,}}\]])")
+# An unquoted array element and the separator after it
+_ARRAY_SCALAR = re.compile(r"([^,\]]*)([,\]])")
+_OBJECT_SCALAR_END = re.compile(r"[,}]")
+# Structural characters of the key=value format, and the NUL standing in for
+# each string while the text around strings is rewritten to JSON
+_JSON_TOKENS = ",[]{}=\0"
+_SPACED_TOKEN = re.compile(r"\s[,\[\]{}=\0]|[,\[\]{}=\0]\s")
+
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    """Return the position of the first non-whitespace character from ``pos``."""
+    return _WHITESPACE.match(text, pos).end()  # type: ignore[union-attr]
+
+
+def _scan_string(text: str, pos: int) -> int:
+    """Return the position after the quoted string at ``pos``, or -1."""
+    match = _STRING_PATTERN.match(text, pos)
+    return match.end() if match else -1
+
+
+def _scan_object_scalar(text: str, pos: int) -> int:
+    """
+    Scan an unquoted object value starting at ``pos``.
+
+    A comma only ends the value when another key follows it. If the input
+    ends before a "}", the value ends at its last comma instead (the next
+    member then fails to parse and reports the error).
+
+    Returns:
+        The position of the "," or "}" ending the value, or -1
+    """
+    last_comma = -1
+    stop = _OBJECT_SCALAR_END.search(text, pos)
+    while stop:
+        end = stop.start()
+        if text[end] == "}" or _KEY.match(text, end + 1):
+            return end
+        last_comma = end
+        stop = _OBJECT_SCALAR_END.search(text, end + 1)
+    return last_comma
+
+
+def _parse_error(text: str, pos: int, expected: str) -> ParameterParseError:
+    """Build the error for parsing stopping at ``pos``."""
+    pos = _skip_whitespace(text, pos)
+    found = repr(text[pos]) if pos < len(text) else "end of input"
+    return ParameterParseError(
+        f"expected {expected} at position {pos}, found {found}", pos
+    )
+
+
+def _item_error(text: str, pos: int, closing: str) -> ParameterParseError:
+    """Find where the object member or array element at ``pos`` is malformed."""
+    if closing == "}":
+        key = _KEY.match(text, pos)
+        if key is None:
+            return _parse_error(text, pos, "a key followed by '='")
+        pos = key.end()
+    pos = _skip_whitespace(text, pos)
+    if text.startswith('"', pos):
+        end = _scan_string(text, pos)
+        if end < 0:
+            return ParameterParseError(f"unterminated string at position {pos}", pos)
+        return _parse_error(text, end, f"',' or '{closing}'")
+    return _parse_error(text, len(text), f"'{closing}'")
+
+
+def _open_container(text: str, pos: int) -> tuple[str, int]:
+    """Return the separator after an opening bracket: "," or an empty close."""
+    close = _skip_whitespace(text, pos)
+    if close < len(text) and text[close] in "}]":
+        return text[close], close + 1
+    return ",", pos
+
+
+def _scan_value(text: str, pos: int, item: int, closing: str) -> tuple[Any, str, int]:
+    """
+    Scan the quoted or unquoted value at ``pos`` and the separator after it.
+
+    Args:
+        text: The whole parameter
+        pos: Start of the value (after whitespace)
+        item: Start of the member or element, for error reporting
+        closing: Bracket closing the container the value is in
+
+    Returns:
+        The value, the separator ("," or ``closing``) and the position after it
+
+    Raises:
+        ParameterParseError: If the value or its separator is malformed
+    """
+    if text.startswith('"', pos):
+        match = _QUOTED_VALUE.match(text, pos)
+        if match is None or match[2] not in ("," + closing):
+            raise _item_error(text, item, closing)
+        raw = match[1]
+        value = json.loads(raw) if "\\" in raw else raw[1:-1]
+        return value, match[2], match.end()
+
+    if closing == "]":
+        match = _ARRAY_SCALAR.match(text, pos)
+        if match is None:
+            raise _item_error(text, item, closing)
+        return match[1].rstrip(), match[2], match.end()
+
+    end = _scan_object_scalar(text, pos)
+    if end < 0:
+        raise _item_error(text, item, closing)
+    return text[pos:end].rstrip(), text[end], end + 1
+
+
+def _key_value_to_json(text: str) -> str | None:
+    """
+    Rewrite key=value text to JSON by quoting its unquoted scalars and keys.
+
+    Only str methods run over the text (no Python code per token): every
+    structural character is wrapped in quotes, so the scalars and keys
+    between them end up quoted, and the empty quotes left between adjacent
+    brackets are dropped. Strings are set aside first and put back after.
+
+    Returns:
+        The JSON text, or None if the text holds a backslash, a NUL or an
+        unterminated string, or whitespace next to a structural character
+        other than after a comma
+    """
+    if "\\" in text or "\0" in text:
+        return None
+    parts = text.split('"')
+    if len(parts) % 2 == 0:
+        return None
+    outside = "\0".join(parts[::2]).replace(", ", ",")
+    if outside != outside.strip() or _SPACED_TOKEN.search(outside):
+        return None
+    for token in _JSON_TOKENS:
+        outside = outside.replace(token, f'"{token}"')
+    outside = f'"{outside}"'.replace('"="', '":"').replace('""', "")
+    parts[::2] = outside.split("\0")
+    return '"'.join(parts)
+
+
+def _parse_key_value(text: str) -> Any:
+    """
+    Parse the key=value format Bedrock Agent sends.
+
+    Objects are ``{key=value, ...}`` and arrays ``[a, b]``, nested freely.
+    Unquoted scalars are returned as strings with surrounding whitespace
+    removed, double-quoted strings are decoded as JSON strings.
+
+    Inside an object a comma only ends a value when another ``key=``
+    follows it, so values may contain commas, ``=`` and ``:``. Inside an
+    array every comma separates elements.
+
+    Text whose scalars need no context (see _key_value_to_json) is rewritten
+    to JSON and parsed by json.loads; the result is the same wherever that
+    parse succeeds. Anything else is scanned: keys, strings and scalars are
+    matched with precompiled patterns from a position index, and the open
+    containers are kept on an explicit stack, so nesting depth costs no
+    recursion.
+
+    Raises:
+        ParameterParseError: With the position where parsing stopped
+    """
+    pos = _skip_whitespace(text, 0)
+    if pos == len(text) or text[pos] not in _CLOSING:
+        raise _parse_error(text, 0, "'{' or '['")
+    converted = _key_value_to_json(text)
+    if converted is not None:
+        try:
+            return json.loads(converted)
+        except (ValueError, RecursionError):
+            pass
+    return _scan_key_value(text, pos)
+
+
+def _scan_key_value(text: str, pos: int) -> Any:
+    """Scan key=value text from its opening bracket at ``pos`` (see _parse_key_value)."""
+    root: Any = {} if text[pos] == "{" else []
+    # Open containers, innermost last, with the bracket that closes each
+    stack: list[tuple[Any, str]] = [(root, _CLOSING[text[pos]])]
+    sep, pos = _open_container(text, pos + 1)
+    skip = _WHITESPACE.match
+
+    while True:
+        container, closing = stack[-1]
+        if sep != ",":
+            # sep closes the innermost container
+            if sep != closing:
+                raise _parse_error(text, pos - 1, f"',' or '{closing}'")
+            stack.pop()
+            if not stack:
+                break
+            pos = skip(text, pos).end()  # type: ignore[union-attr]
+            if pos == len(text) or text[pos] not in ",}]":
+                raise _parse_error(text, pos, f"',' or '{stack[-1][1]}'")
+            sep, pos = text[pos], pos + 1
+            continue
+
+        item = pos
+        key = None
+        if closing == "}":
+            match = _KEY.match(text, pos)
+            if match is None:
+                raise _item_error(text, item, closing)
+            key, pos = match[1] or match[2], match.end()
+
+        pos = skip(text, pos).end()  # type: ignore[union-attr]
+        char = text[pos : pos + 1]
+        value: Any
+        if char in _CLOSING:
+            value = {} if char == "{" else []
+            sep, pos = _open_container(text, pos + 1)
+        else:
+            value, sep, pos = _scan_value(text, pos, item, closing)
+
+        if key is None:
+            container.append(value)
+        else:
+            container[json.loads(key) if key[0] == '"' else key.strip()] = value
+        if char in _CLOSING:
+            stack.append((value, _CLOSING[char]))
+
+    if _skip_whitespace(text, pos) != len(text):
+        raise _parse_error(text, pos, "end of input")
+    return root
+
+
 def parse_bedrock_parameter(value: Any, field_name: str = "parameter") -> Any:
     """
     Convert Bedrock Agent parameter format to proper Python object.
@@ -68,7 +2313,7 @@ def parse_bedrock_parameter(value: Any, field_name: str = "parameter") -> Any:
     - Python dict format: {lunch=[焼きそば, サラダ], breakfast=[...]}
 
     With the simplified schema, meal arrays now contain recipe names as strings instead
-    of objects.
+    of objects. Values in the dict-like format are returned as strings.
 
     Args:
         value: The parameter value (can be string, dict, or other type)
@@ -78,7 +2323,8 @@ def parse_bedrock_parameter(value: Any, field_name: str = "parameter") -> Any:
         Parsed Python object (dict, list, etc.)
 
     Raises:
-        ValueError: If the value cannot be parsed
+        ParameterParseError: If the value cannot be parsed (a ValueError
+            carrying the position of the error)
     """
     # If already a dict or list, return as-is
     if isinstance(value, (dict, list)):
@@ -92,43 +2338,23 @@ def parse_bedrock_parameter(value: Any, field_name: str = "parameter") -> Any:
     if value == "":
         return value
 
-    # Try to parse as JSON first
-    try:
-        return json.loads(value)
-    except json.JSONDecodeError:
-        pass
-
-    # Convert Python-like dict format to JSON
-    # Example: {lunch=[焼きそば, サラダ]} -> {"lunch":["焼きそば","サラダ"]}
-
     try:
-        converted = value
-
-        # Step 1: Replace = with :
-        converted = converted.replace("=", ":")
-
-        # Step 2: Add quotes around keys (words followed by colon)
-        # Matches: word: -> "word":
-        converted = re.sub(r"([{,]\s*)([a-z_]+):", r'\1"\2":', converted)
-
-        # Step 3: Add quotes around unquoted string values
-        # Matches values that are not already quoted and not numbers/booleans
-        # Pattern: ": value" -> ": "value""
-        converted = re.sub(r":\s*([a-zA-Z][a-zA-Z0-9_]*)", r': "\1"', converted)
+        # Try to parse as JSON first
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            pass
 
-        # Step 4: Add quotes around Japanese/special character values
-        # Matches: ": 焼きそば," -> ": "焼きそば","
-        converted = re.sub(
-            r':\s*([^"\[\]{},:\s][^,}\]]*?)([,}\]])',
-            lambda m: f': "{m.group(1).strip()}"{m.group(2)}',
-            converted,
-        )
-
-        # Try to parse the converted string
-        return json.loads(converted)
-
-    except (json.JSONDecodeError, Exception) as e:
-        raise ValueError(
+        # Parse the Python-like dict format directly
+        # Example: {lunch=[焼きそば, サラダ]} -> {"lunch": ["焼きそば", "サラダ"]}
+        return _parse_key_value(value)
+    except ParameterParseError as e:
+        raise ParameterParseError(
             f"Unable to parse {field_name}. "
-            f"Expected JSON or Python dict format. Error: {str(e)}"
-        )
+            f"Expected JSON or Python dict format. Error: {e}",
+            e.position,
+        ) from None
+    except RecursionError:
+        raise ParameterParseError(
+            f"Unable to parse {field_name}. Error: nesting is too deep", 0
+        ) from None
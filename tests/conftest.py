@@ -31,6 +31,123 @@ def import_action_handler(action_name):
         sys.path.remove(str(action_path))
 
 
+@pytest.fixture(autouse=True)
+def reset_warm_caches(monkeypatch):
+    """Start every test with cold in-process caches, like a new Lambda container."""
+    import utils
+
+    # Lambda always sets a region; the low-level read client needs one
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "ap-northeast-1")
+    monkeypatch.setattr(utils, "_dynamodb_client", None)
+    utils.recipe_cache.clear()
+    yield
+
+
+# Operations the actions call; a budget key must be one of these or a group
+DYNAMODB_OPERATIONS = frozenset(
+    {
+        "BatchGetItem",
+        "BatchWriteItem",
+        "DeleteItem",
+        "DescribeTable",
+        "GetItem",
+        "PutItem",
+        "Query",
+        "Scan",
+        "TransactGetItems",
+        "TransactWriteItems",
+        "UpdateItem",
+    }
+)
+DYNAMODB_CALL_GROUPS = ("calls", "reads", "writes")
+
+
+class DynamoDBCallRecorder:
+    """
+    DynamoDB operations made by each instrumented handler invocation of a test.
+
+    Filled through instrument_dynamodb, so it sees the calls the handlers
+    publish as metrics; tables seeded by fixtures are not counted.
+    """
+
+    def __init__(self):
+        self.invocations = []
+
+    def count(self, name, invocation=-1):
+        """Count an operation, or "calls", "reads" or "writes", in one invocation."""
+        import utils
+
+        operations = self.invocations[invocation]
+        if name == "calls":
+            return len(operations)
+        if name == "reads":
+            return sum(op in utils.READ_OPERATIONS for op in operations)
+        if name == "writes":
+            return sum(op not in utils.READ_OPERATIONS for op in operations)
+        return operations.count(name)
+
+    def check(self, exact=(), **budget):
+        """
+        Assert that every invocation stays within budget.
+
+        Args:
+            exact: Budget keys that must be met exactly instead of at most
+            **budget: Operation name or group mapped to its call limit
+        """
+        unknown = set(budget) - DYNAMODB_OPERATIONS - set(DYNAMODB_CALL_GROUPS)
+        if unknown or not set(exact) <= set(budget):
+            raise ValueError(f"Invalid DynamoDB budget: {budget}, exact={exact}")
+        assert self.invocations, "No instrumented handler was invoked"
+
+        for i, operations in enumerate(self.invocations):
+            for name, limit in budget.items():
+                count = self.count(name, i)
+                within = count == limit if name in exact else count <= limit
+                assert within, (
+                    f"Invocation {i + 1} made {count} {name} "
+                    f"({'expected' if name in exact else 'budget'} {limit}): "
+                    f"{operations}"
+                )
+
+
+@pytest.fixture
+def dynamodb_calls(monkeypatch):
+    """Record the DynamoDB operations of every handler invocation in the test."""
+    import utils
+
+    recorder = DynamoDBCallRecorder()
+
+    class RecordingStats(utils.DynamoDBCallStats):
+        def __init__(self):
+            super().__init__()
+            self.operations = []
+            recorder.invocations.append(self.operations)
+
+        def record(self, operation, elapsed_ms, failed, consumed):
+            super().record(operation, elapsed_ms, failed, consumed)
+            self.operations.append(operation)
+
+    monkeypatch.setattr(utils, "DynamoDBCallStats", RecordingStats)
+    return recorder
+
+
+def pytest_collection_modifyitems(items):
+    """Give every test marked dynamodb_budget the dynamodb_calls recorder."""
+    for item in items:
+        if item.get_closest_marker("dynamodb_budget"):
+            item.fixturenames.append("dynamodb_calls")
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    """Fail a test whose handler invocations exceed its dynamodb_budget."""
+    result = yield
+    marker = item.get_closest_marker("dynamodb_budget")
+    if marker:
+        item.funcargs["dynamodb_calls"].check(*marker.args, **marker.kwargs)
+    return result
+
+
 @pytest.fixture
 def get_recipes_handler():
     """Get the get_recipes lambda handler."""
@@ -49,6 +166,24 @@ def save_menu_handler():
     return import_action_handler("save_menu")
 
 
+@pytest.fixture
+def save_menus_handler():
+    """Get the save_menus lambda handler."""
+    return import_action_handler("save_menus")
+
+
+@pytest.fixture
+def get_recipe_usage_handler():
+    """Get the get_recipe_usage lambda handler."""
+    return import_action_handler("get_recipe_usage")
+
+
+@pytest.fixture
+def router_handler():
+    """Get the router lambda handler (single-function deployment mode)."""
+    return import_action_handler("router")
+
+
 @pytest.fixture
 def sample_recipes():
     """Load sample recipes from fixtures."""
@@ -75,6 +210,7 @@ def mock_env_vars():
     env = {
         "RECIPES_TABLE": "test-recipes-table",
         "HISTORY_TABLE": "test-history-table",
+        "USAGE_TABLE": "test-usage-table",
         "AWS_DEFAULT_REGION": "ap-northeast-1",
     }
     for key, value in env.items():
@@ -97,7 +233,17 @@ def mock_dynamodb_tables(mock_env_vars, sample_recipes, sample_history):
         recipes_table = dynamodb.create_table(
             TableName=mock_env_vars["RECIPES_TABLE"],
             KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+            AttributeDefinitions=[
+                {"AttributeName": "name", "AttributeType": "S"},
+                {"AttributeName": "category", "AttributeType": "S"},
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": "CategoryIndex",
+                    "KeySchema": [{"AttributeName": "category", "KeyType": "HASH"}],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+            ],
             BillingMode="PAY_PER_REQUEST",
         )
 
@@ -109,6 +255,14 @@ def mock_dynamodb_tables(mock_env_vars, sample_recipes, sample_history):
             BillingMode="PAY_PER_REQUEST",
         )
 
+        # Create recipe usage table
+        usage_table = dynamodb.create_table(
+            TableName=mock_env_vars["USAGE_TABLE"],
+            KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
         # Populate recipes table
         for recipe in sample_recipes:
             recipes_table.put_item(Item=recipe)
@@ -117,13 +271,60 @@ def mock_dynamodb_tables(mock_env_vars, sample_recipes, sample_history):
         for history_item in sample_history:
             history_table.put_item(Item=history_item)
 
+        # Populate usage table to match the history
+        usage_dates = {}
+        for history_item in sample_history:
+            for name in history_item["recipes"]:
+                usage_dates.setdefault(name, set()).add(history_item["date"])
+        for name, dates in usage_dates.items():
+            usage_table.put_item(Item={"name": name, "dates": dates})
+
         yield {
             "recipes_table": recipes_table,
             "history_table": history_table,
+            "usage_table": usage_table,
             "dynamodb": dynamodb,
         }
 
 
+@pytest.fixture
+def range_keyed_history(mock_dynamodb_tables, sample_history, monkeypatch):
+    """Switch the history actions to a range-keyed (household + date) table."""
+    monkeypatch.setenv("HISTORY_TABLE", "test-history-v2-table")
+    monkeypatch.setenv("HISTORY_HOUSEHOLD", "test-household")
+
+    table = mock_dynamodb_tables["dynamodb"].create_table(
+        TableName="test-history-v2-table",
+        KeySchema=[
+            {"AttributeName": "household", "KeyType": "HASH"},
+            {"AttributeName": "date", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "household", "AttributeType": "S"},
+            {"AttributeName": "date", "AttributeType": "S"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    for history_item in sample_history:
+        table.put_item(Item={"household": "test-household", **history_item})
+    # Another household's menus must never leak into results
+    table.put_item(Item={"household": "other-household", **sample_history[0]})
+    yield table
+
+
+@pytest.fixture
+def idempotency_table(mock_dynamodb_tables, monkeypatch):
+    """Enable request deduplication for the save actions."""
+    monkeypatch.setenv("IDEMPOTENCY_TABLE", "test-idempotency-table")
+
+    yield mock_dynamodb_tables["dynamodb"].create_table(
+        TableName="test-idempotency-table",
+        KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
 @pytest.fixture
 def bedrock_agent_event():
     """Create a sample Bedrock Agent event."""
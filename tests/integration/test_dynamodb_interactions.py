@@ -153,7 +153,7 @@ class TestDynamoDBIntegration:
                         {
                             "name": "meals",
                             "type": "object",
-                            "value": json.dumps({"breakfast": ["新しい"]}),
+                            "value": json.dumps({"breakfast": ["白米"]}),
                         },
                     ]
                 }
@@ -2,6 +2,8 @@
 
 import json
 
+import pytest
+
 
 class TestGetHistoryAction:
     """Test cases for get_history Lambda handler."""
@@ -26,6 +28,7 @@ class TestGetHistoryAction:
         # Should return the 2 history items from sample_history.json
         assert len(body["history"]) == 2
 
+    @pytest.mark.dynamodb_budget(BatchGetItem=1, calls=1)
     def test_get_history_custom_days(
         self, mock_dynamodb_tables, bedrock_agent_event, get_history_handler
     ):
@@ -57,6 +60,7 @@ class TestGetHistoryAction:
             # Check that dates are in descending order
             assert dates == sorted(dates, reverse=True)
 
+    @pytest.mark.dynamodb_budget(calls=0)
     def test_get_history_invalid_days_string(
         self, mock_dynamodb_tables, bedrock_agent_event, get_history_handler
     ):
@@ -168,3 +172,141 @@ class TestGetHistoryAction:
             body_str = response["response"]["responseBody"]["application/json"]["body"]
             body = json.loads(body_str)
             assert "error" in body
+
+    @pytest.mark.dynamodb_budget(BatchGetItem=1, calls=1)
+    def test_get_history_paginates_with_cursor(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_history_handler
+    ):
+        """Test that a large window is split into budgeted cursor pages."""
+        from datetime import datetime, timedelta
+
+        import utils
+
+        today = datetime.now()
+        history_table = mock_dynamodb_tables["history_table"]
+        for i in range(20):
+            date = (today - timedelta(days=i)).strftime("%Y-%m-%d")
+            history_table.put_item(
+                Item={
+                    "date": date,
+                    "meals": {"dinner": ["カレーライス", "味噌汁"]},
+                    "recipes": ["カレーライス", "味噌汁"],
+                }
+            )
+
+        original_budget = utils.RESPONSE_MAX_BYTES
+        utils.RESPONSE_MAX_BYTES = 1000
+        try:
+            dates = []
+            event = bedrock_agent_event.copy()
+            event["parameters"] = [{"name": "days", "type": "integer", "value": "20"}]
+            while True:
+                response = get_history_handler(event, None)
+                assert response["response"]["httpStatusCode"] == 200
+                body_str = response["response"]["responseBody"]["application/json"][
+                    "body"
+                ]
+                assert len(body_str.encode()) <= 1000
+                body = json.loads(body_str)
+                dates.extend(item["date"] for item in body["history"])
+                if "next_cursor" not in body:
+                    break
+                event = bedrock_agent_event.copy()
+                event["parameters"] = [
+                    {"name": "cursor", "type": "string", "value": body["next_cursor"]}
+                ]
+        finally:
+            utils.RESPONSE_MAX_BYTES = original_budget
+
+        assert len(dates) == 20
+        assert dates == sorted(dates, reverse=True)
+
+    def test_get_history_range_keyed_uses_single_query(
+        self, range_keyed_history, bedrock_agent_event, get_history_handler
+    ):
+        """Test that a range-keyed table reads the window with one Query."""
+        import utils
+
+        operations = []
+
+        def record(model, **kwargs):
+            operations.append(model.name)
+
+        events = utils.get_dynamodb_client().meta.events
+        events.register("before-call.dynamodb", record)
+        try:
+            event = bedrock_agent_event.copy()
+            event["parameters"] = [
+                {"name": "days", "type": "integer", "value": "365"},
+                {"name": "as_of", "type": "string", "value": "2025-11-10"},
+            ]
+            response = get_history_handler(event, None)
+        finally:
+            events.unregister("before-call.dynamodb", record)
+
+        assert operations == ["Query"]
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        body = json.loads(body_str)
+        assert [item["date"] for item in body["history"]] == [
+            "2025-11-08",
+            "2025-11-07",
+        ]
+        assert all("household" not in item for item in body["history"])
+
+    def test_get_history_range_keyed_window_bounds(
+        self, range_keyed_history, bedrock_agent_event, get_history_handler
+    ):
+        """Test that the Query window covers exactly the requested days."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "days", "type": "integer", "value": "2"},
+            {"name": "as_of", "type": "string", "value": "2025-11-8"},
+        ]
+
+        response = get_history_handler(event, None)
+
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        body = json.loads(body_str)
+        assert [item["date"] for item in body["history"]] == [
+            "2025-11-08",
+            "2025-11-07",
+        ]
+
+        event["parameters"][0]["value"] = "1"
+        response = get_history_handler(event, None)
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        assert [item["date"] for item in json.loads(body_str)["history"]] == [
+            "2025-11-08"
+        ]
+
+    @pytest.mark.dynamodb_budget(BatchGetItem=4, calls=4)
+    def test_get_history_year_window_fetches_chunks_concurrently(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_history_handler
+    ):
+        """Test that a 365-day window costs about one BatchGetItem latency."""
+        import time
+
+        import utils
+
+        def slow_network(**kwargs):
+            time.sleep(0.3)
+
+        events = utils.get_dynamodb_client().meta.events
+        events.register("before-call.dynamodb.BatchGetItem", slow_network)
+        try:
+            event = bedrock_agent_event.copy()
+            event["parameters"] = [
+                {"name": "days", "type": "integer", "value": "365"},
+                {"name": "as_of", "type": "string", "value": "2025-11-10"},
+            ]
+            start = time.perf_counter()
+            response = get_history_handler(event, None)
+            elapsed = time.perf_counter() - start
+        finally:
+            events.unregister("before-call.dynamodb.BatchGetItem", slow_network)
+
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        dates = [item["date"] for item in json.loads(body_str)["history"]]
+        assert dates == ["2025-11-08", "2025-11-07"]
+        # 4 chunks one after another would take at least 1.2 s
+        assert elapsed < 0.9
@@ -0,0 +1,151 @@
+"""Unit tests for get_recipe_usage action (src/agent_actions/get_recipe_usage/app.py)."""
+
+import json
+
+import pytest
+
+
+def usage_event(bedrock_agent_event, **parameters):
+    """Build a get_recipe_usage event with the given parameters."""
+    event = bedrock_agent_event.copy()
+    event["actionGroup"] = "GetRecipeUsage"
+    event["apiPath"] = "/get-recipe-usage"
+    event["parameters"] = [
+        {"name": name, "type": "string", "value": value}
+        for name, value in parameters.items()
+    ]
+    return event
+
+
+def parse_body(response):
+    """Parse the JSON body of an agent response."""
+    return json.loads(response["response"]["responseBody"]["application/json"]["body"])
+
+
+class TestGetRecipeUsageAction:
+    """Test cases for get_recipe_usage Lambda handler."""
+
+    @pytest.mark.dynamodb_budget(Scan=2, calls=3)
+    def test_usage_for_every_recipe(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipe_usage_handler
+    ):
+        """Test statistics for served and never-served recipes."""
+        event = usage_event(bedrock_agent_event, as_of="2025-11-10")
+
+        response = get_recipe_usage_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        body = parse_body(response)
+        assert body["as_of"] == "2025-11-10"
+        usage = {record["name"]: record for record in body["usage"]}
+        assert len(usage) == 5
+        assert usage["カレーライス"] == {
+            "name": "カレーライス",
+            "category": "主菜",
+            "last_used": "2025-11-08",
+            "days_since_last_used": 2,
+            "use_count": 2,
+            "uses_7d": 2,
+            "uses_30d": 2,
+            "uses_90d": 2,
+            "next_planned": None,
+        }
+        assert usage["ほうれん草のおひたし"]["use_count"] == 1
+
+    def test_least_recently_used_first(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipe_usage_handler
+    ):
+        """Test ordering: never served, then served longest ago."""
+        usage_table = mock_dynamodb_tables["usage_table"]
+        usage_table.put_item(Item={"name": "白米", "dates": {"2025-10-01"}})
+
+        response = get_recipe_usage_handler(
+            usage_event(bedrock_agent_event, as_of="2025-11-10"), None
+        )
+
+        names = [record["name"] for record in parse_body(response)["usage"]]
+        assert names[0] == "白米"
+
+    def test_archived_uses_counted(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipe_usage_handler
+    ):
+        """Test that uses pruned from the date set still count."""
+        usage_table = mock_dynamodb_tables["usage_table"]
+        usage_table.put_item(
+            Item={
+                "name": "白米",
+                "archived_use_count": 12,
+                "archived_last_used": "2025-06-30",
+            }
+        )
+
+        response = get_recipe_usage_handler(
+            usage_event(bedrock_agent_event, as_of="2025-11-10"), None
+        )
+
+        usage = {r["name"]: r for r in parse_body(response)["usage"]}
+        assert usage["白米"]["use_count"] == 12
+        assert usage["白米"]["last_used"] == "2025-06-30"
+        assert usage["白米"]["uses_90d"] == 0
+
+    def test_not_used_within_filter(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipe_usage_handler
+    ):
+        """Test that recipes served within the window are left out."""
+        mock_dynamodb_tables["usage_table"].delete_item(Key={"name": "白米"})
+
+        response = get_recipe_usage_handler(
+            usage_event(bedrock_agent_event, as_of="2025-11-10", not_used_within="3"),
+            None,
+        )
+
+        records = parse_body(response)["usage"]
+        assert [record["name"] for record in records] == ["白米"]
+        assert records[0]["last_used"] is None
+
+    @pytest.mark.dynamodb_budget(Scan=2, calls=3)
+    def test_category_filter(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipe_usage_handler
+    ):
+        """Test filtering the statistics by category."""
+        response = get_recipe_usage_handler(
+            usage_event(bedrock_agent_event, category="汁物"), None
+        )
+
+        records = parse_body(response)["usage"]
+        assert [record["name"] for record in records] == ["味噌汁"]
+
+    def test_planned_dates_not_counted_as_used(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipe_usage_handler
+    ):
+        """Test that dates after as_of show up as next_planned only."""
+        response = get_recipe_usage_handler(
+            usage_event(bedrock_agent_event, as_of="2025-11-07"), None
+        )
+
+        usage = {r["name"]: r for r in parse_body(response)["usage"]}
+        assert usage["ほうれん草のおひたし"]["use_count"] == 0
+        assert usage["ほうれん草のおひたし"]["next_planned"] == "2025-11-08"
+        assert usage["カレーライス"]["last_used"] == "2025-11-07"
+
+    def test_invalid_not_used_within(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipe_usage_handler
+    ):
+        """Test validation error with a non-integer window."""
+        response = get_recipe_usage_handler(
+            usage_event(bedrock_agent_event, not_used_within="soon"), None
+        )
+
+        assert response["response"]["httpStatusCode"] == 400
+        assert "must be an integer" in parse_body(response)["error"]
+
+    @pytest.mark.dynamodb_budget(calls=0)
+    def test_invalid_as_of(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipe_usage_handler
+    ):
+        """Test validation error with a malformed as_of date."""
+        response = get_recipe_usage_handler(
+            usage_event(bedrock_agent_event, as_of="11/10"), None
+        )
+
+        assert response["response"]["httpStatusCode"] == 400
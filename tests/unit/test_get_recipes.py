@@ -2,10 +2,13 @@
 
 import json
 
+import pytest
+
 
 class TestGetRecipesAction:
     """Test cases for get_recipes Lambda handler."""
 
+    @pytest.mark.dynamodb_budget(Scan=1, calls=2)
     def test_get_all_recipes(
         self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
     ):
@@ -33,6 +36,7 @@ class TestGetRecipesAction:
         recipe_names = [r["name"] for r in body["recipes"]]
         assert recipe_names == sorted(recipe_names)
 
+    @pytest.mark.dynamodb_budget(Query=1, Scan=0, calls=2)
     def test_get_recipes_by_category(
         self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
     ):
@@ -137,3 +141,350 @@ class TestGetRecipesAction:
             body = json.loads(body_str)
             assert "error" in body
             assert body["recipes"] == []
+
+    def test_get_recipes_large_catalog_is_not_truncated(
+        self, mock_env_vars, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test that recipes beyond the 1 MB scan page are still returned."""
+        from moto import mock_aws
+        import boto3
+
+        with mock_aws():
+            dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+            table = dynamodb.create_table(
+                TableName=mock_env_vars["RECIPES_TABLE"],
+                KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+            # ~1.5 MB of recipes: more than a single Scan page can hold
+            with table.batch_writer() as batch:
+                for i in range(2500):
+                    batch.put_item(
+                        Item={
+                            "name": f"レシピ{i:04d}",
+                            "category": "主菜",
+                            "instructions": "x" * 600,
+                        }
+                    )
+
+            # Follow the continuation cursors until every recipe is returned
+            names = []
+            event = bedrock_agent_event.copy()
+            while True:
+                response = get_recipes_handler(event, None)
+                body_str = response["response"]["responseBody"]["application/json"][
+                    "body"
+                ]
+                body = json.loads(body_str)
+                names.extend(recipe["name"] for recipe in body["recipes"])
+                if "next_cursor" not in body:
+                    break
+                event = bedrock_agent_event.copy()
+                event["parameters"] = [
+                    {"name": "cursor", "type": "string", "value": body["next_cursor"]}
+                ]
+
+            assert len(names) == 2500
+            assert names == sorted(set(names))
+
+    def test_get_recipes_by_category_uses_index_query(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test that category requests query the GSI instead of scanning."""
+        from utils import get_dynamodb_client
+
+        operations = []
+
+        def record(model, **kwargs):
+            operations.append(model.name)
+
+        events = get_dynamodb_client().meta.events
+        events.register("before-call.dynamodb", record)
+        try:
+            event = bedrock_agent_event.copy()
+            event["parameters"] = [
+                {"name": "category", "type": "string", "value": "主菜"}
+            ]
+            response = get_recipes_handler(event, None)
+        finally:
+            events.unregister("before-call.dynamodb", record)
+
+        assert response["response"]["httpStatusCode"] == 200
+        assert "Query" in operations
+        assert "Scan" not in operations
+
+    def test_get_recipes_warm_invocation_uses_cache(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test that a warm invocation is answered without reading DynamoDB."""
+        from utils import get_dynamodb, get_dynamodb_client
+
+        first = get_recipes_handler(bedrock_agent_event.copy(), None)
+
+        operations = []
+
+        def record(model, **kwargs):
+            operations.append(model.name)
+
+        clients = [get_dynamodb().meta.client, get_dynamodb_client()]
+        for client in clients:
+            client.meta.events.register("before-call.dynamodb", record)
+        try:
+            second = get_recipes_handler(bedrock_agent_event.copy(), None)
+        finally:
+            for client in clients:
+                client.meta.events.unregister("before-call.dynamodb", record)
+
+        assert operations == []
+        assert (
+            second["response"]["responseBody"]["application/json"]["body"]
+            == first["response"]["responseBody"]["application/json"]["body"]
+        )
+
+    def test_get_recipes_primed_on_init(
+        self, mock_dynamodb_tables, bedrock_agent_event, monkeypatch, request
+    ):
+        """Test that PRIME_ON_INIT=catalog answers the first call from memory."""
+        import utils
+
+        monkeypatch.setattr(utils, "PRIME_ON_INIT", "catalog")
+        # Importing the handler is its INIT phase
+        handler = request.getfixturevalue("get_recipes_handler")
+
+        operations = []
+
+        def record(model, **kwargs):
+            operations.append(model.name)
+
+        clients = [utils.get_dynamodb().meta.client, utils.get_dynamodb_client()]
+        for client in clients:
+            client.meta.events.register("before-call.dynamodb", record)
+        try:
+            response = handler(bedrock_agent_event.copy(), None)
+        finally:
+            for client in clients:
+                client.meta.events.unregister("before-call.dynamodb", record)
+
+        assert operations == []
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        assert len(json.loads(body_str)["recipes"]) == 5
+
+    def test_get_recipes_cache_invalidated_by_catalog_version(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test that bumping the catalog version makes new recipes visible."""
+        import utils
+
+        utils.recipe_cache.ttl_seconds = 0
+        try:
+            get_recipes_handler(bedrock_agent_event.copy(), None)
+
+            recipes_table = mock_dynamodb_tables["recipes_table"]
+            recipes_table.put_item(Item={"name": "親子丼", "category": "主菜"})
+            utils.bump_catalog_version(recipes_table)
+
+            response = get_recipes_handler(bedrock_agent_event.copy(), None)
+        finally:
+            utils.recipe_cache.ttl_seconds = 60
+
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        names = [r["name"] for r in json.loads(body_str)["recipes"]]
+        assert "親子丼" in names
+        assert utils.CATALOG_VERSION_KEY not in names
+
+    def test_get_recipes_names_view(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test that the names view returns only name and category."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [{"name": "view", "type": "string", "value": "names"}]
+
+        response = get_recipes_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        body = json.loads(body_str)
+        assert len(body["recipes"]) == 5
+        for recipe in body["recipes"]:
+            assert set(recipe) == {"name", "category"}
+
+    def test_get_recipes_custom_fields_with_category(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test projecting custom fields on a category query."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "category", "type": "string", "value": "主菜"},
+            {"name": "fields", "type": "string", "value": "ingredients, name"},
+        ]
+
+        response = get_recipes_handler(event, None)
+
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        body = json.loads(body_str)
+        assert len(body["recipes"]) == 2
+        for recipe in body["recipes"]:
+            assert set(recipe) == {"name", "ingredients"}
+
+    def test_get_recipes_table_format(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test the dense column header plus rows encoding."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "view", "type": "string", "value": "names"},
+            {"name": "format", "type": "string", "value": "table"},
+        ]
+
+        response = get_recipes_handler(event, None)
+
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        body = json.loads(body_str)
+        assert body["columns"] == ["name", "category"]
+        assert len(body["recipes"]) == 5
+        assert ["味噌汁", "汁物"] in body["recipes"]
+        names = [row[0] for row in body["recipes"]]
+        assert names == sorted(names)
+
+    @pytest.mark.dynamodb_budget(calls=0)
+    def test_get_recipes_invalid_view(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test validation error with an unknown view."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [{"name": "view", "type": "string", "value": "tiny"}]
+
+        response = get_recipes_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 400
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        body = json.loads(body_str)
+        assert "view must be one of" in body["error"]
+        assert body["recipes"] == []
+
+    def test_get_recipes_invalid_field_name(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test validation error with a field that is not an attribute name."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "fields", "type": "string", "value": "name, category.x"}
+        ]
+
+        response = get_recipes_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 400
+
+    def test_get_recipes_response_fits_byte_budget(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test that a small budget splits the catalog across cursor pages."""
+        import utils
+
+        original_budget = utils.RESPONSE_MAX_BYTES
+        utils.RESPONSE_MAX_BYTES = 250
+        try:
+            pages = []
+            event = bedrock_agent_event.copy()
+            event["parameters"] = [
+                {"name": "view", "type": "string", "value": "names"},
+                {"name": "format", "type": "string", "value": "table"},
+            ]
+            while True:
+                response = get_recipes_handler(event, None)
+                body_str = response["response"]["responseBody"]["application/json"][
+                    "body"
+                ]
+                assert len(body_str.encode()) <= 250
+                body = json.loads(body_str)
+                pages.append(body)
+                if "next_cursor" not in body:
+                    break
+                event = bedrock_agent_event.copy()
+                event["parameters"] = [
+                    {"name": "cursor", "type": "string", "value": body["next_cursor"]}
+                ]
+        finally:
+            utils.RESPONSE_MAX_BYTES = original_budget
+
+        assert len(pages) > 1
+        # The cursor keeps the original view and format on every page
+        assert all(page["columns"] == ["name", "category"] for page in pages)
+        rows = [row for page in pages for row in page["recipes"]]
+        assert len(rows) == 5
+
+    def test_get_recipes_invalid_cursor(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test validation error with a malformed cursor."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [{"name": "cursor", "type": "string", "value": "!!"}]
+
+        response = get_recipes_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 400
+
+    @pytest.mark.dynamodb_budget(Scan=2, calls=3)
+    def test_get_recipes_by_ingredients_any(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test ingredient search where any listed ingredient matches."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "ingredients", "type": "string", "value": "[豚肉, 豆腐]"}
+        ]
+
+        response = get_recipes_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        names = [r["name"] for r in json.loads(body_str)["recipes"]]
+        assert names == ["カレーライス", "味噌汁"]
+
+    def test_get_recipes_by_ingredients_all(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test ingredient search where every listed ingredient must match."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "ingredients", "type": "string", "value": "鮭, レモン"},
+            {"name": "match", "type": "string", "value": "all"},
+            {"name": "view", "type": "string", "value": "names"},
+        ]
+
+        response = get_recipes_handler(event, None)
+
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        body = json.loads(body_str)
+        assert body["recipes"] == [{"name": "鮭の塩焼き", "category": "主菜"}]
+
+    def test_get_recipes_by_ingredients_and_category(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test that ingredient search combines with the category filter."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "category", "type": "string", "value": "汁物"},
+            {"name": "ingredients", "type": "string", "value": "豚肉, 豆腐"},
+        ]
+
+        response = get_recipes_handler(event, None)
+
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        names = [r["name"] for r in json.loads(body_str)["recipes"]]
+        assert names == ["味噌汁"]
+
+    def test_get_recipes_invalid_match(
+        self, mock_dynamodb_tables, bedrock_agent_event, get_recipes_handler
+    ):
+        """Test validation error with an unknown match mode."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "ingredients", "type": "string", "value": "豚肉"},
+            {"name": "match", "type": "string", "value": "most"},
+        ]
+
+        response = get_recipes_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 400
@@ -0,0 +1,44 @@
+"""Import-time checks for the action handlers (benchmarks/import_budget.json)."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent.parent
+ACTIONS = sorted(
+    p.name
+    for p in (ROOT / "src" / "agent_actions").iterdir()
+    if (p / "app.py").exists()
+)
+BUDGET = json.loads((ROOT / "benchmarks" / "import_budget.json").read_text())
+
+
+@pytest.mark.parametrize("action", ACTIONS)
+def test_handler_import_defers_heavy_modules(action):
+    """Test that importing a handler (Lambda INIT) loads no forbidden module."""
+    action_dir = ROOT / "src" / "agent_actions" / action
+    env = {
+        **os.environ,
+        "RECIPES_TABLE": "t",
+        "HISTORY_TABLE": "t",
+        "USAGE_TABLE": "t",
+        "PYTHONPATH": os.pathsep.join(
+            [str(action_dir), str(ROOT / "src" / "layers" / "common")]
+        ),
+    }
+    script = "import sys, app; print('\\n'.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=action_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    loaded = set(result.stdout.split())
+    assert loaded & set(BUDGET["forbidden_modules"]) == set()
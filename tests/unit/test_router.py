@@ -0,0 +1,123 @@
+"""Unit tests for the router action (src/agent_actions/router/app.py)."""
+
+import json
+import sys
+
+import pytest
+
+
+def body_of(response):
+    return json.loads(response["response"]["responseBody"]["application/json"]["body"])
+
+
+class TestRouterAction:
+    """Test cases for the single-function router Lambda handler."""
+
+    @pytest.mark.dynamodb_budget(Scan=1, calls=2)
+    def test_routes_by_api_path(
+        self, mock_dynamodb_tables, bedrock_agent_event, router_handler
+    ):
+        """Test that each schema apiPath reaches its action."""
+        event = bedrock_agent_event.copy()
+        event["apiPath"] = "/get-recipes"
+        event["actionGroup"] = "GetRecipes"
+        recipes = body_of(router_handler(event, None))
+        assert len(recipes["recipes"]) == 5
+
+        event = bedrock_agent_event.copy()
+        event["apiPath"] = "/get-history"
+        event["actionGroup"] = "GetHistory"
+        event["parameters"] = [{"name": "days", "type": "integer", "value": "7"}]
+        assert "history" in body_of(router_handler(event, None))
+
+    def test_falls_back_to_action_group(
+        self, mock_dynamodb_tables, bedrock_agent_event, router_handler
+    ):
+        """Test routing an event whose apiPath is not in the table."""
+        event = bedrock_agent_event.copy()
+        event["apiPath"] = "/menu"
+        event["actionGroup"] = "SaveMenu"
+        event["httpMethod"] = "POST"
+        event["requestBody"] = {
+            "content": {
+                "application/json": {
+                    "properties": [
+                        {"name": "date", "type": "string", "value": "2025-11-10"},
+                        {
+                            "name": "meals",
+                            "type": "object",
+                            "value": json.dumps({"dinner": ["カレーライス"]}),
+                        },
+                    ]
+                }
+            }
+        }
+
+        response = router_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        assert body_of(response)["date"] == "2025-11-10"
+
+    def test_unknown_action(self, mock_env_vars, bedrock_agent_event, router_handler):
+        """Test that an event for no known action gets a 404 response."""
+        event = bedrock_agent_event.copy()
+        event["apiPath"] = "/plan-party"
+        event["actionGroup"] = "PlanParty"
+
+        response = router_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 404
+        assert response["response"]["apiPath"] == "/plan-party"
+        assert "Unknown action" in body_of(response)["error"]
+
+    def test_matches_per_function_response(
+        self,
+        mock_dynamodb_tables,
+        bedrock_agent_event,
+        router_handler,
+        get_recipes_handler,
+    ):
+        """Test that routing does not change an action's response."""
+        event = bedrock_agent_event.copy()
+        event["apiPath"] = "/get-recipes"
+        event["parameters"] = [{"name": "category", "type": "string", "value": "主菜"}]
+
+        assert router_handler(event, None) == get_recipes_handler(event, None)
+
+    def test_usage_catalog_not_served_as_names_view(
+        self, mock_dynamodb_tables, bedrock_agent_event, router_handler, monkeypatch
+    ):
+        """Test that get_recipe_usage's cached catalog never answers view=names."""
+        usage_app = sys.modules["get_recipe_usage_app"]
+        scan_all = usage_app.scan_all
+
+        def unordered_scan(table, **kwargs):
+            # DynamoDB scans in hash order, not name order; moto sorts by key
+            items, consumed = scan_all(table, **kwargs)
+            return items[::-1], consumed
+
+        monkeypatch.setattr(usage_app, "scan_all", unordered_scan)
+
+        event = bedrock_agent_event.copy()
+        event["apiPath"] = "/get-recipe-usage"
+        event["actionGroup"] = "GetRecipeUsage"
+        assert router_handler(event, None)["response"]["httpStatusCode"] == 200
+
+        event = bedrock_agent_event.copy()
+        event["apiPath"] = "/get-recipes"
+        event["parameters"] = [{"name": "view", "type": "string", "value": "names"}]
+        names = [
+            recipe["name"] for recipe in body_of(router_handler(event, None))["recipes"]
+        ]
+
+        assert names == sorted(names)
+        assert len(names) == 5
+
+    def test_actions_share_layer_state(self, mock_env_vars, router_handler):
+        """Test that every routed action uses the one layer, cache and clients."""
+        import utils
+
+        for action in ("get_recipes", "get_recipe_usage"):
+            assert sys.modules[f"{action}_app"].recipe_cache is utils.recipe_cache
+        for action in ("get_history", "get_recipes", "save_menu", "save_menus"):
+            assert sys.modules[f"{action}_app"].get_dynamodb is utils.get_dynamodb
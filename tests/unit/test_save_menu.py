@@ -1,11 +1,17 @@
 """Unit tests for save_menu action (src/agent_actions/save_menu/app.py)."""
 
+import inspect
 import json
 
+import pytest
+
 
 class TestSaveMenuAction:
     """Test cases for save_menu Lambda handler."""
 
+    @pytest.mark.dynamodb_budget(
+        PutItem=1, BatchGetItem=1, writes=2, calls=5, exact=("PutItem", "BatchGetItem")
+    )
     def test_save_menu_success(
         self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
     ):
@@ -74,6 +80,7 @@ class TestSaveMenuAction:
         response = save_menu_handler(event, None)
         assert response["response"]["httpStatusCode"] == 200
 
+    @pytest.mark.dynamodb_budget(PutItem=1, writes=1, calls=3, exact=("PutItem",))
     def test_save_menu_duplicate_without_overwrite(
         self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
     ):
@@ -105,6 +112,9 @@ class TestSaveMenuAction:
         assert body["error"] == "duplicate_date"
         assert "existing_menu" in body
 
+    @pytest.mark.dynamodb_budget(
+        PutItem=1, BatchGetItem=1, writes=2, calls=6, exact=("PutItem", "BatchGetItem")
+    )
     def test_save_menu_duplicate_with_overwrite(
         self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
     ):
@@ -162,6 +172,7 @@ class TestSaveMenuAction:
         assert body["success"] is False
         assert "YYYY-MM-DD" in body["error"]
 
+    @pytest.mark.dynamodb_budget(calls=0)
     def test_save_menu_missing_date(
         self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
     ):
@@ -226,7 +237,7 @@ class TestSaveMenuAction:
                         {
                             "name": "meals",
                             "type": "object",
-                            "value": '{"breakfast": ["味噌汁"], "lunch": ["カレー"]}',
+                            "value": '{"breakfast": ["味噌汁"], "lunch": ["カレーライス"]}',
                         },
                     ]
                 }
@@ -258,9 +269,13 @@ class TestSaveMenuAction:
                             "type": "object",
                             "value": json.dumps(
                                 {
-                                    "breakfast": ["味噌汁", "納豆"],
-                                    "lunch": ["焼き鮭", "サラダ"],
-                                    "dinner": ["おひたし", "カレー"],
+                                    "breakfast": ["味噌汁", "白米"],
+                                    "lunch": ["カレーライス"],
+                                    "dinner": [
+                                        "鮭の塩焼き",
+                                        "ほうれん草のおひたし",
+                                        "白米",
+                                    ],
                                 }
                             ),
                         },
@@ -278,11 +293,10 @@ class TestSaveMenuAction:
         saved_item = table.get_item(Key={"date": "2025-11-13"})["Item"]
         assert len(saved_item["recipes"]) == 6
         assert "味噌汁" in saved_item["recipes"]
-        assert "納豆" in saved_item["recipes"]
-        assert "焼き鮭" in saved_item["recipes"]
-        assert "サラダ" in saved_item["recipes"]
-        assert "おひたし" in saved_item["recipes"]
-        assert "カレー" in saved_item["recipes"]
+        assert "白米" in saved_item["recipes"]
+        assert "カレーライス" in saved_item["recipes"]
+        assert "鮭の塩焼き" in saved_item["recipes"]
+        assert "ほうれん草のおひたし" in saved_item["recipes"]
 
     def test_save_menu_error_handling(
         self, mock_env_vars, bedrock_agent_event, save_menu_handler
@@ -316,3 +330,406 @@ class TestSaveMenuAction:
             body = json.loads(body_str)
             assert body["success"] is False
             assert "error" in body
+
+    def test_save_menu_range_keyed_history(
+        self, range_keyed_history, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that saves and duplicate checks use the household + date key."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-08"},
+            {"name": "meals", "type": "object", "value": '{"dinner": ["白米"]}'},
+        ]
+
+        response = save_menu_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 409
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        body = json.loads(body_str)
+        assert body["existing_menu"]["date"] == "2025-11-08"
+        assert "household" not in body["existing_menu"]
+
+        event["parameters"][0]["value"] = "2025-11-10"
+        response = save_menu_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        item = range_keyed_history.get_item(
+            Key={"household": "test-household", "date": "2025-11-10"}
+        )["Item"]
+        assert item["meals"] == {"dinner": ["白米"]}
+
+    def test_save_menu_records_recipe_usage(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that a new menu adds its date to each recipe's usage."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-10"},
+            {
+                "name": "meals",
+                "type": "object",
+                "value": '{"lunch": ["カレーライス"], "dinner": ["白米", "味噌汁"]}',
+            },
+        ]
+
+        response = save_menu_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        usage_table = mock_dynamodb_tables["usage_table"]
+        assert usage_table.get_item(Key={"name": "カレーライス"})["Item"]["dates"] == {
+            "2025-11-07",
+            "2025-11-08",
+            "2025-11-10",
+        }
+        assert (
+            "2025-11-10" in usage_table.get_item(Key={"name": "白米"})["Item"]["dates"]
+        )
+
+    def test_save_menu_overwrite_decrements_recipe_usage(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that overwriting a day removes the date from dropped recipes."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-08"},
+            {
+                "name": "meals",
+                "type": "object",
+                "value": '{"dinner": ["カレーライス"]}',
+            },
+            {"name": "overwrite", "type": "boolean", "value": "true"},
+        ]
+
+        response = save_menu_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        usage_table = mock_dynamodb_tables["usage_table"]
+        assert usage_table.get_item(Key={"name": "カレーライス"})["Item"]["dates"] == {
+            "2025-11-07",
+            "2025-11-08",
+        }
+        assert usage_table.get_item(Key={"name": "味噌汁"})["Item"]["dates"] == {
+            "2025-11-07"
+        }
+        # The last date of a set removes the attribute altogether
+        item = usage_table.get_item(Key={"name": "ほうれん草のおひたし"})["Item"]
+        assert "dates" not in item
+
+    def test_save_menu_succeeds_when_usage_update_fails(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that the menu is saved even if the usage table is unavailable."""
+        mock_dynamodb_tables["usage_table"].delete()
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-10"},
+            {"name": "meals", "type": "object", "value": '{"dinner": ["白米"]}'},
+        ]
+
+        response = save_menu_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        history_table = mock_dynamodb_tables["history_table"]
+        assert history_table.get_item(Key={"date": "2025-11-10"})["Item"]
+
+    @staticmethod
+    def _record_operations():
+        """Record the DynamoDB operations made through the shared resource."""
+        import utils
+
+        # Warm container: the recipe name snapshot is already cached
+        utils.check_recipe_names({}, utils.get_dynamodb().Table("test-recipes-table"))
+        operations = []
+
+        def record(model, **kwargs):
+            operations.append(model.name)
+
+        for client in (utils.get_dynamodb().meta.client, utils.get_dynamodb_client()):
+            client.meta.events.register("before-call.dynamodb", record)
+        return operations, record
+
+    @staticmethod
+    def _stop_recording(record):
+        import utils
+
+        for client in (utils.get_dynamodb().meta.client, utils.get_dynamodb_client()):
+            client.meta.events.unregister("before-call.dynamodb", record)
+
+    def test_save_menu_new_date_single_conditional_put(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that a new day is saved without a separate existence check."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-10"},
+            {"name": "meals", "type": "object", "value": '{"dinner": ["白米"]}'},
+        ]
+
+        operations, record = self._record_operations()
+        try:
+            response = save_menu_handler(event, None)
+        finally:
+            self._stop_recording(record)
+
+        assert response["response"]["httpStatusCode"] == 200
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        assert json.loads(body_str)["version"] == 1
+        # One history write, then the usage read and update
+        assert operations == ["PutItem", "BatchGetItem", "TransactWriteItems"]
+
+    def test_save_menu_duplicate_detected_by_condition(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that a duplicate costs one round trip and returns the stored menu."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-08"},
+            {"name": "meals", "type": "object", "value": '{"dinner": ["白米"]}'},
+        ]
+
+        operations, record = self._record_operations()
+        try:
+            response = save_menu_handler(event, None)
+        finally:
+            self._stop_recording(record)
+
+        assert operations == ["PutItem"]
+        assert response["response"]["httpStatusCode"] == 409
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        existing_menu = json.loads(body_str)["existing_menu"]
+        assert existing_menu["date"] == "2025-11-08"
+        assert existing_menu["notes"] == "バランスの良い献立"
+        assert existing_menu["meals"]["lunch"] == ["カレーライス"]
+        # The stored menu is untouched
+        item = mock_dynamodb_tables["history_table"].get_item(
+            Key={"date": "2025-11-08"}
+        )["Item"]
+        assert item["notes"] == "バランスの良い献立"
+
+    def test_save_menu_overwrite_increments_version(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that overwrites bump the version and keep created_at."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-08"},
+            {"name": "meals", "type": "object", "value": '{"dinner": ["白米"]}'},
+            {"name": "overwrite", "type": "boolean", "value": "true"},
+        ]
+
+        versions = []
+        for _ in range(2):
+            response = save_menu_handler(event, None)
+            assert response["response"]["httpStatusCode"] == 200
+            body_str = response["response"]["responseBody"]["application/json"]["body"]
+            versions.append(json.loads(body_str)["version"])
+
+        # Fixture items predate versioning and count as version 0
+        assert versions == [1, 2]
+        item = mock_dynamodb_tables["history_table"].get_item(
+            Key={"date": "2025-11-08"}
+        )["Item"]
+        assert item["version"] == 2
+        assert item["created_at"] == "2025-11-08T10:00:00"
+
+    def test_save_menu_overwrite_rejects_concurrent_change(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that an overwrite racing another save does not clobber it."""
+        import utils
+
+        history_table = mock_dynamodb_tables["history_table"]
+
+        def concurrent_save(**kwargs):
+            # Another session saves the same day between our read and write
+            history_table.put_item(
+                Item={
+                    "date": "2025-11-08",
+                    "meals": {"dinner": ["鮭の塩焼き"]},
+                    "recipes": ["鮭の塩焼き"],
+                    "version": 5,
+                }
+            )
+
+        events = utils.get_dynamodb().meta.client.meta.events
+        events.register("before-call.dynamodb.PutItem", concurrent_save)
+        try:
+            event = bedrock_agent_event.copy()
+            event["parameters"] = [
+                {"name": "date", "type": "string", "value": "2025-11-08"},
+                {"name": "meals", "type": "object", "value": '{"dinner": ["白米"]}'},
+                {"name": "overwrite", "type": "boolean", "value": "true"},
+            ]
+            response = save_menu_handler(event, None)
+        finally:
+            events.unregister("before-call.dynamodb.PutItem", concurrent_save)
+
+        assert response["response"]["httpStatusCode"] == 409
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        body = json.loads(body_str)
+        assert body["error"] == "concurrent_update"
+        assert body["existing_menu"]["meals"] == {"dinner": ["鮭の塩焼き"]}
+        item = history_table.get_item(Key={"date": "2025-11-08"})["Item"]
+        assert item["recipes"] == ["鮭の塩焼き"]
+
+    def test_save_menu_overwrite_reads_version_consistently(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that the version check does not read a stale replica."""
+        import utils
+
+        reads = []
+
+        def record(params, **kwargs):
+            reads.append(params.get("ConsistentRead"))
+
+        events = utils.get_dynamodb_client().meta.events
+        events.register("provide-client-params.dynamodb.GetItem", record)
+        try:
+            event = bedrock_agent_event.copy()
+            event["parameters"] = [
+                {"name": "date", "type": "string", "value": "2025-11-08"},
+                {"name": "meals", "type": "object", "value": '{"dinner": ["白米"]}'},
+                {"name": "overwrite", "type": "boolean", "value": "true"},
+            ]
+            response = save_menu_handler(event, None)
+        finally:
+            events.unregister("provide-client-params.dynamodb.GetItem", record)
+
+        assert response["response"]["httpStatusCode"] == 200
+        # An eventually consistent read could miss the latest save: false 409
+        assert reads == [True]
+
+    @pytest.mark.dynamodb_budget(writes=0, calls=3)
+    def test_save_menu_rejects_unknown_recipes(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that invented recipe names are rejected with suggestions."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-10"},
+            {
+                "name": "meals",
+                "type": "object",
+                "value": '{"dinner": ["カレー", "白米", "ハンバーグ"]}',
+            },
+        ]
+
+        response = save_menu_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 400
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        body = json.loads(body_str)
+        assert body["error"] == "unknown_recipes"
+        assert body["unknown_recipes"] == {"カレー": ["カレーライス"], "ハンバーグ": []}
+        history_table = mock_dynamodb_tables["history_table"]
+        assert "Item" not in history_table.get_item(Key={"date": "2025-11-10"})
+
+    def test_save_menu_normalizes_recipe_names(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that width variants are saved in the catalog spelling."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-10"},
+            {"name": "meals", "type": "object", "value": '{"dinner": ["ｶﾚｰﾗｲｽ"]}'},
+        ]
+
+        response = save_menu_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        item = mock_dynamodb_tables["history_table"].get_item(
+            Key={"date": "2025-11-10"}
+        )["Item"]
+        assert item["meals"] == {"dinner": ["カレーライス"]}
+        assert item["recipes"] == ["カレーライス"]
+
+    def test_save_menu_flags_unknown_recipes(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler, monkeypatch
+    ):
+        """Test that flag mode saves the menu and reports the unknown names."""
+        monkeypatch.setitem(
+            inspect.unwrap(save_menu_handler).__globals__,
+            "RECIPE_NAME_VALIDATION",
+            "flag",
+        )
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-10"},
+            {"name": "meals", "type": "object", "value": '{"dinner": ["カレー"]}'},
+        ]
+
+        response = save_menu_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        assert json.loads(body_str)["unknown_recipes"] == {"カレー": ["カレーライス"]}
+
+    def test_save_menu_accepts_recipe_added_within_cache_ttl(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that a new recipe is found without waiting for the cache TTL."""
+        import utils
+
+        recipes_table = mock_dynamodb_tables["recipes_table"]
+        utils.check_recipe_names({}, recipes_table)
+        recipes_table.put_item(Item={"name": "肉じゃが", "category": "主菜"})
+        utils.bump_catalog_version(recipes_table)
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-10"},
+            {"name": "meals", "type": "object", "value": '{"dinner": ["肉じゃが"]}'},
+        ]
+
+        response = save_menu_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 200
+
+    def test_retried_save_returns_original_result(
+        self, idempotency_table, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that an agent retry replays the first result without a write."""
+        import utils
+
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-10"},
+            {"name": "meals", "type": "object", "value": '{"dinner": ["白米"]}'},
+        ]
+        first = save_menu_handler(event, None)
+
+        tables = []
+
+        def record(params, **kwargs):
+            tables.append(params.get("TableName"))
+
+        events = utils.get_dynamodb().meta.client.meta.events
+        events.register("provide-client-params.dynamodb", record)
+        try:
+            retry = save_menu_handler(event, None)
+        finally:
+            events.unregister("provide-client-params.dynamodb", record)
+
+        # Without deduplication the retry would report 409 duplicate_date
+        assert retry == first
+        assert retry["response"]["httpStatusCode"] == 200
+        assert tables == ["test-idempotency-table"]
+
+    def test_changed_request_is_not_deduplicated(
+        self, idempotency_table, bedrock_agent_event, save_menu_handler
+    ):
+        """Test that a different payload in the same session is processed."""
+        event = bedrock_agent_event.copy()
+        event["parameters"] = [
+            {"name": "date", "type": "string", "value": "2025-11-10"},
+            {"name": "meals", "type": "object", "value": '{"dinner": ["白米"]}'},
+        ]
+        save_menu_handler(event, None)
+
+        event["parameters"] = event["parameters"] + [
+            {"name": "overwrite", "type": "boolean", "value": "true"}
+        ]
+        response = save_menu_handler(event, None)
+
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        assert json.loads(body_str)["version"] == 2
@@ -0,0 +1,246 @@
+"""Unit tests for save_menus action (src/agent_actions/save_menus/app.py)."""
+
+import json
+
+import pytest
+
+
+def menus_event(bedrock_agent_event, menus, overwrite=None):
+    """Build a save_menus event for the given per-day menus."""
+    event = bedrock_agent_event.copy()
+    event["actionGroup"] = "SaveMenus"
+    event["apiPath"] = "/save-menus"
+    event["httpMethod"] = "POST"
+    properties = [{"name": "menus", "type": "array", "value": json.dumps(menus)}]
+    if overwrite is not None:
+        properties.append(
+            {"name": "overwrite", "type": "boolean", "value": str(overwrite).lower()}
+        )
+    event["requestBody"] = {"content": {"application/json": {"properties": properties}}}
+    return event
+
+
+def parse_body(response):
+    """Parse the JSON body of an agent response."""
+    return json.loads(response["response"]["responseBody"]["application/json"]["body"])
+
+
+WEEK = [
+    {"date": f"2025-11-{day}", "meals": {"dinner": ["カレーライス", "味噌汁"]}}
+    for day in range(10, 17)
+]
+
+
+class TestSaveMenusAction:
+    """Test cases for save_menus Lambda handler."""
+
+    def test_save_week_in_one_transaction(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menus_handler
+    ):
+        """Test that a week is checked and written with one call each."""
+        import utils
+
+        # Warm container: the recipe name snapshot is already cached
+        utils.check_recipe_names({}, utils.get_dynamodb().Table("test-recipes-table"))
+        operations = []
+        history_reads = []
+
+        def record(model, **kwargs):
+            operations.append(model.name)
+
+        def record_read(params, **kwargs):
+            request = params["RequestItems"].get("test-history-table")
+            if request is not None:
+                history_reads.append(request.get("ConsistentRead"))
+
+        clients = [utils.get_dynamodb().meta.client, utils.get_dynamodb_client()]
+        for client in clients:
+            client.meta.events.register("before-call.dynamodb", record)
+            client.meta.events.register(
+                "provide-client-params.dynamodb.BatchGetItem", record_read
+            )
+        try:
+            response = save_menus_handler(menus_event(bedrock_agent_event, WEEK), None)
+        finally:
+            for client in clients:
+                client.meta.events.unregister("before-call.dynamodb", record)
+                client.meta.events.unregister(
+                    "provide-client-params.dynamodb.BatchGetItem", record_read
+                )
+
+        assert response["response"]["httpStatusCode"] == 200
+        body = parse_body(response)
+        assert body["success"] is True
+        assert body["saved"] == [menu["date"] for menu in WEEK]
+        assert all(result["version"] == 1 for result in body["results"])
+        read_ops = [op for op in operations if op != "TransactWriteItems"]
+        # The history read, then the usage read for the whole week
+        assert read_ops == ["BatchGetItem", "BatchGetItem"]
+        # Stale versions would turn into false 409s
+        assert history_reads == [True]
+        # One history transaction plus one usage update for the whole week
+        assert operations.count("TransactWriteItems") == 2
+
+        history_table = mock_dynamodb_tables["history_table"]
+        item = history_table.get_item(Key={"date": "2025-11-16"})["Item"]
+        assert item["recipes"] == ["カレーライス", "味噌汁"]
+        usage = mock_dynamodb_tables["usage_table"].get_item(Key={"name": "味噌汁"})
+        assert "2025-11-13" in usage["Item"]["dates"]
+
+    @pytest.mark.dynamodb_budget(BatchGetItem=2, calls=6, exact=("BatchGetItem",))
+    def test_conflicts_reported_per_date(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menus_handler
+    ):
+        """Test that existing days are reported and the others saved."""
+        menus = [
+            {"date": "2025-11-07", "meals": {"dinner": ["白米"]}},
+            {"date": "2025-11-09", "meals": {"dinner": ["白米"]}, "notes": "簡単"},
+        ]
+
+        response = save_menus_handler(menus_event(bedrock_agent_event, menus), None)
+
+        body = parse_body(response)
+        assert body["success"] is False
+        assert body["saved"] == ["2025-11-09"]
+        conflict, saved = body["results"]
+        assert conflict["error"] == "duplicate_date"
+        assert conflict["existing_menu"]["meals"]["lunch"] == ["鮭の塩焼き"]
+        assert saved == {
+            "date": "2025-11-09",
+            "success": True,
+            "overwritten": False,
+            "version": 1,
+        }
+        history_table = mock_dynamodb_tables["history_table"]
+        assert (
+            history_table.get_item(Key={"date": "2025-11-09"})["Item"]["notes"]
+            == "簡単"
+        )
+        assert history_table.get_item(Key={"date": "2025-11-07"})["Item"][
+            "recipes"
+        ] == ["味噌汁", "鮭の塩焼き", "カレーライス"]
+
+    @pytest.mark.dynamodb_budget(BatchGetItem=2, calls=6, exact=("BatchGetItem",))
+    def test_overwrite_existing_days(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menus_handler
+    ):
+        """Test overwriting existing days with overwrite=true."""
+        menus = [
+            {"date": "2025-11-07", "meals": {"dinner": ["白米"]}},
+            {"date": "2025-11-08", "meals": {"dinner": ["白米"]}},
+        ]
+
+        response = save_menus_handler(
+            menus_event(bedrock_agent_event, menus, overwrite=True), None
+        )
+
+        body = parse_body(response)
+        assert body["success"] is True
+        assert [result["overwritten"] for result in body["results"]] == [True, True]
+        usage = mock_dynamodb_tables["usage_table"].get_item(Key={"name": "味噌汁"})
+        assert "dates" not in usage["Item"]
+
+    @pytest.mark.dynamodb_budget(BatchGetItem=2, calls=9, exact=("BatchGetItem",))
+    def test_falls_back_per_day_when_transaction_cancelled(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menus_handler
+    ):
+        """Test partial success when another session saves a day mid-call."""
+        import utils
+
+        history_table = mock_dynamodb_tables["history_table"]
+
+        def concurrent_save(**kwargs):
+            history_table.put_item(
+                Item={"date": "2025-11-11", "meals": {"dinner": ["鮭の塩焼き"]}}
+            )
+
+        events = utils.get_dynamodb().meta.client.meta.events
+        events.register_first(
+            "before-call.dynamodb.TransactWriteItems", concurrent_save
+        )
+        try:
+            response = save_menus_handler(
+                menus_event(bedrock_agent_event, WEEK[:3]), None
+            )
+        finally:
+            events.unregister(
+                "before-call.dynamodb.TransactWriteItems", concurrent_save
+            )
+
+        body = parse_body(response)
+        assert body["saved"] == ["2025-11-10", "2025-11-12"]
+        assert body["results"][1]["error"] == "duplicate_date"
+        assert body["results"][1]["existing_menu"]["meals"] == {
+            "dinner": ["鮭の塩焼き"]
+        }
+        assert history_table.get_item(Key={"date": "2025-11-12"})["Item"]
+
+    def test_invalid_days_reported_without_blocking_others(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menus_handler
+    ):
+        """Test that malformed days get an error result and the rest are saved."""
+        menus = [
+            {"date": "11/20", "meals": {"dinner": ["白米"]}},
+            {"date": "2025-11-21", "meals": {"dinner": ["白米"]}},
+            {"date": "2025-11-21", "meals": {"dinner": ["味噌汁"]}},
+            {"date": "2025-11-22"},
+        ]
+
+        response = save_menus_handler(menus_event(bedrock_agent_event, menus), None)
+
+        assert response["response"]["httpStatusCode"] == 200
+        body = parse_body(response)
+        assert body["saved"] == ["2025-11-21"]
+        errors = [result.get("error") for result in body["results"]]
+        assert errors == [
+            "date must be in YYYY-MM-DD format",
+            None,
+            "2025-11-21 appears more than once",
+            "meals is required",
+        ]
+
+    def test_menus_must_be_a_list(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menus_handler
+    ):
+        """Test validation error when menus is not a list."""
+        event = menus_event(bedrock_agent_event, [])
+        event["requestBody"]["content"]["application/json"]["properties"][0][
+            "value"
+        ] = '{"date": "2025-11-20"}'
+
+        response = save_menus_handler(event, None)
+
+        assert response["response"]["httpStatusCode"] == 400
+        assert parse_body(response)["error"] == "menus must be a list"
+
+    @pytest.mark.dynamodb_budget(calls=0)
+    def test_too_many_menus(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menus_handler
+    ):
+        """Test validation error above the per-call limit."""
+        menus = [
+            {"date": f"2025-12-{day:02d}", "meals": {"dinner": ["白米"]}}
+            for day in range(1, 32)
+        ] + [{"date": "2026-01-01", "meals": {"dinner": ["白米"]}}]
+
+        response = save_menus_handler(menus_event(bedrock_agent_event, menus), None)
+
+        assert response["response"]["httpStatusCode"] == 400
+        assert "at most 31" in parse_body(response)["error"]
+
+    def test_unknown_recipes_rejected_per_day(
+        self, mock_dynamodb_tables, bedrock_agent_event, save_menus_handler
+    ):
+        """Test that a day naming unknown recipes does not block the others."""
+        menus = [
+            {"date": "2025-11-20", "meals": {"dinner": ["焼き鮭", "白米"]}},
+            {"date": "2025-11-21", "meals": {"dinner": ["鮭の塩焼き", "白米"]}},
+        ]
+
+        response = save_menus_handler(menus_event(bedrock_agent_event, menus), None)
+
+        body = parse_body(response)
+        assert body["saved"] == ["2025-11-21"]
+        rejected = body["results"][0]
+        assert rejected["error"] == "unknown_recipes"
+        assert rejected["unknown_recipes"] == {"焼き鮭": ["鮭の塩焼き"]}
@@ -1,10 +1,53 @@
 """Unit tests for shared utilities (src/layers/common/utils.py)."""
 
+import json
+import random
+import re
+from datetime import date, datetime
 from decimal import Decimal
+from types import SimpleNamespace
 
 import pytest
 
-from utils import decimal_to_float, parse_bedrock_parameter
+import utils
+from utils import (
+    UnprocessedKeysError,
+    agent_parameters,
+    batch_get_all,
+    CatalogCache,
+    IngredientIndex,
+    ParameterParseError,
+    RecipeNameIndex,
+    build_projection,
+    bump_catalog_version,
+    client_config,
+    create_agent_response,
+    decimal_to_float,
+    decode_cursor,
+    deserialize_item,
+    emit_metrics,
+    encode_cursor,
+    dump_json,
+    encode_json,
+    get_catalog_version,
+    get_item,
+    history_key,
+    idempotency_key,
+    idempotent,
+    normalize_ingredient,
+    normalize_recipe_name,
+    paginate_records,
+    parse_bedrock_parameter,
+    query_all,
+    record_recipe_usage,
+    scan_all,
+    screen_recipe_names,
+    serialize_item,
+    summarize_usage,
+    usage_changes,
+    to_rows,
+    validate_date_format,
+)
 
 
 class TestDecimalToFloat:
@@ -141,6 +184,88 @@ class TestParseBedRockParameter:
         result = parse_bedrock_parameter("", "test")
         assert result == ""
 
+    def test_parse_python_dict_arrays(self):
+        """Test parsing unquoted array elements, which the regex chain could not."""
+        result = parse_bedrock_parameter(
+            "{lunch=[焼きそば, サラダ], dinner=[]}", "meals"
+        )
+        assert result == {"lunch": ["焼きそば", "サラダ"], "dinner": []}
+
+    def test_parse_python_dict_nested_menus(self):
+        """Test parsing the multi-day menus format."""
+        result = parse_bedrock_parameter(
+            "[{date=2025-11-09, meals={dinner=[カレーライス, 味噌汁]}, notes=作り置き}]",
+            "menus",
+        )
+        assert result == [
+            {
+                "date": "2025-11-09",
+                "meals": {"dinner": ["カレーライス", "味噌汁"]},
+                "notes": "作り置き",
+            }
+        ]
+
+    def test_parse_values_with_separators(self):
+        """Test values containing "=", ":" and commas."""
+        result = parse_bedrock_parameter(
+            '{notes=12:30 開始, 2人分, ratio=1=2, title="a, b"}', "menu"
+        )
+        assert result == {"notes": "12:30 開始, 2人分", "ratio": "1=2", "title": "a, b"}
+
+    @pytest.mark.parametrize(
+        "value, position",
+        [
+            ("{lunch=[カレー}", 12),
+            ("{lunch=[カレー]] ", 12),
+            ("{=x}", 1),
+            ("カレー", 0),
+            ("{a=x, y", 6),
+            ('{a="x', 3),
+        ],
+    )
+    def test_parse_error_position(self, value, position):
+        """Test that parse errors report where parsing stopped."""
+        with pytest.raises(ParameterParseError, match="Unable to parse") as e:
+            parse_bedrock_parameter(value, "meals")
+        assert e.value.position == position
+
+    def test_parse_whitespace_key(self):
+        """Test that whitespace before "=" is an (empty) key, unlike "{=x}"."""
+        assert parse_bedrock_parameter("{ =x}", "test") == {"": "x"}
+
+    def test_parse_deep_nesting(self):
+        """Test that nesting depth is not limited by recursion."""
+        depth = 2000
+        value = parse_bedrock_parameter("{a=" * depth + "x" + "}" * depth, "test")
+        for _ in range(depth):
+            value = value["a"]
+        assert value == "x"
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "{date=2025-11-08, meals={lunch=[焼きそば, サラダ], dinner=[]}, notes=}",
+            '{date="2025-11-08", meals={lunch=["焼きそば", "サラダ"]}, "n"="a=b, c"}',
+            "{a=12:00, b:c=[x y, 　z], c={}}",
+            "[a, , b]",
+            "{a = x}",
+            '{a="x"y}',
+            "{a:[x]}",
+        ],
+    )
+    def test_parse_json_rewrite_matches_scan(self, value, monkeypatch):
+        """Test that rewriting to JSON agrees with the scan, errors included."""
+
+        def parse():
+            try:
+                return utils._parse_key_value(value)
+            except ParameterParseError as e:
+                return str(e)
+
+        rewritten = parse()
+        monkeypatch.setattr(utils, "_key_value_to_json", lambda text: None)
+        assert rewritten == parse()
+
     def test_parse_python_dict_multiple_recipe_items(self):
         """Test parsing JSON with multiple items in a meal array."""
         json_string = '{"dinner": ["味噌汁", "白米", "焼き魚"]}'
@@ -149,3 +274,1625 @@ class TestParseBedRockParameter:
         assert result["dinner"][0] == "味噌汁"
         assert result["dinner"][1] == "白米"
         assert result["dinner"][2] == "焼き魚"
+
+
+def legacy_parse_bedrock_parameter(value):
+    """The regex-chain parser parse_bedrock_parameter replaced, for fuzzing."""
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        pass
+    try:
+        converted = value.replace("=", ":")
+        converted = re.sub(r"([{,]\s*)([a-z_]+):", r'\1"\2":', converted)
+        converted = re.sub(r":\s*([a-zA-Z][a-zA-Z0-9_]*)", r': "\1"', converted)
+        converted = re.sub(
+            r':\s*([^"\[\]{},:\s][^,}\]]*?)([,}\]])',
+            lambda m: f': "{m.group(1).strip()}"{m.group(2)}',
+            converted,
+        )
+        return json.loads(converted)
+    except Exception as e:
+        raise ValueError(f"Unable to parse: {e}")
+
+
+def bedrock_format(value):
+    """Render a value the way Bedrock Agent sends it (Java toString style)."""
+    if isinstance(value, dict):
+        return (
+            "{" + ", ".join(f"{k}={bedrock_format(v)}" for k, v in value.items()) + "}"
+        )
+    if isinstance(value, list):
+        return "[" + ", ".join(bedrock_format(v) for v in value) + "]"
+    return value
+
+
+class TestParseBedrockParameterFuzz:
+    """Fuzz parse_bedrock_parameter against the parser it replaced."""
+
+    KEYS = ["breakfast", "lunch", "dinner", "date", "notes", "meals", "a_b"]
+    WORDS = ["カレーライス", "味噌汁", "curry", "Beef Stew", "2025-11-09"]
+    # The regex chain decoded these as JSON inside arrays; they are strings now
+    LITERALS = ["7", "true", "null"]
+    SPECIAL = ["12:30", "a=b", "x, y", "ratio: 1=2, done"]
+
+    def random_value(self, rng, depth, words):
+        """Build a random nested dict/list of string scalars."""
+        kind = rng.random()
+        if depth > 2 or kind < 0.4:
+            return rng.choice(words)
+        if kind < 0.7:
+            keys = rng.sample(self.KEYS, rng.randint(0, 3))
+            return {k: self.random_value(rng, depth + 1, words) for k in keys}
+        return [
+            self.random_value(rng, depth + 1, words) for _ in range(rng.randint(0, 3))
+        ]
+
+    def test_matches_legacy_where_legacy_parses(self):
+        """Test the same result wherever the regex chain produced one."""
+        rng = random.Random(20251109)
+        compared = 0
+        for _ in range(2000):
+            value = {
+                k: self.random_value(rng, 1, self.WORDS)
+                for k in rng.sample(self.KEYS, rng.randint(1, 3))
+            }
+            text = bedrock_format(value)
+            assert parse_bedrock_parameter(text) == value, text
+            try:
+                legacy = legacy_parse_bedrock_parameter(text)
+            except ValueError:
+                continue
+            compared += 1
+            assert parse_bedrock_parameter(text) == legacy, text
+        assert compared > 100
+
+    def test_round_trips_values_with_separators(self):
+        """Test object values containing "=", ":" and commas."""
+        rng = random.Random(1109)
+        for _ in range(500):
+            value = {
+                k: rng.choice(self.WORDS + self.LITERALS + self.SPECIAL)
+                for k in rng.sample(self.KEYS, rng.randint(1, 4))
+            }
+            text = bedrock_format(value)
+            assert parse_bedrock_parameter(text) == value, text
+
+    def test_garbage_raises_value_error_only(self):
+        """Test that arbitrary input either parses or raises ValueError."""
+        rng = random.Random(42)
+        alphabet = '{}[]=:,"\\ ab1カ'
+        for _ in range(3000):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 20)))
+            try:
+                parse_bedrock_parameter(text)
+            except ValueError:
+                pass
+
+
+class TestScanAll:
+    """Test cases for scan_all function."""
+
+    @staticmethod
+    def _create_table(item_count):
+        import boto3
+
+        dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+        table = dynamodb.create_table(
+            TableName="scan-test-table",
+            KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        with table.batch_writer() as batch:
+            for i in range(item_count):
+                batch.put_item(Item={"name": f"recipe-{i:03d}", "servings": i})
+        return table
+
+    def test_follows_pagination(self):
+        """Test that every page is read when the scan is paginated."""
+        from moto import mock_aws
+
+        with mock_aws():
+            table = self._create_table(25)
+            items, consumed = scan_all(table, Limit=4)
+            assert len(items) == 25
+            assert consumed > 0
+            assert {item["name"] for item in items} == {
+                f"recipe-{i:03d}" for i in range(25)
+            }
+
+    def test_parallel_segments_return_every_item_once(self):
+        """Test that segmented scans cover the table without duplicates."""
+        from moto import mock_aws
+
+        with mock_aws():
+            table = self._create_table(40)
+            items, _ = scan_all(table, total_segments=3, Limit=5)
+            names = [item["name"] for item in items]
+            assert len(names) == 40
+            assert len(set(names)) == 40
+
+    def test_empty_table(self):
+        """Test scanning an empty table."""
+        from moto import mock_aws
+
+        with mock_aws():
+            table = self._create_table(0)
+            assert scan_all(table, total_segments=2)[0] == []
+
+    def test_invalid_segments_raises_error(self):
+        """Test that a non-positive segment count is rejected."""
+        with pytest.raises(ValueError, match="total_segments"):
+            scan_all(None, total_segments=0)
+
+
+class TestQueryAll:
+    """Test cases for query_all function."""
+
+    def test_follows_pagination_on_index(self):
+        """Test that every page of a GSI query is read."""
+        from moto import mock_aws
+        import boto3
+
+        with mock_aws():
+            dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+            table = dynamodb.create_table(
+                TableName="query-test-table",
+                KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                AttributeDefinitions=[
+                    {"AttributeName": "name", "AttributeType": "S"},
+                    {"AttributeName": "category", "AttributeType": "S"},
+                ],
+                GlobalSecondaryIndexes=[
+                    {
+                        "IndexName": "CategoryIndex",
+                        "KeySchema": [{"AttributeName": "category", "KeyType": "HASH"}],
+                        "Projection": {"ProjectionType": "ALL"},
+                    }
+                ],
+                BillingMode="PAY_PER_REQUEST",
+            )
+            with table.batch_writer() as batch:
+                for i in range(30):
+                    category = "主菜" if i % 3 == 0 else "副菜"
+                    batch.put_item(Item={"name": f"r{i}", "category": category})
+
+            items, consumed = query_all(
+                table,
+                IndexName="CategoryIndex",
+                KeyConditionExpression="#category = :category",
+                ExpressionAttributeNames={"#category": "category"},
+                ExpressionAttributeValues={":category": "主菜"},
+                Limit=3,
+            )
+            assert len(items) == 10
+            assert all(item["category"] == "主菜" for item in items)
+            assert consumed > 0
+
+
+class TestCatalogCache:
+    """Test cases for CatalogCache and the catalog version helpers."""
+
+    @staticmethod
+    def _create_table():
+        import boto3
+
+        dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+        return dynamodb.create_table(
+            TableName="cache-test-table",
+            KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+    def test_catalog_version_roundtrip(self):
+        """Test that bumping the version changes what is read back."""
+        from moto import mock_aws
+
+        with mock_aws():
+            table = self._create_table()
+            assert get_catalog_version(table) is None
+            first = bump_catalog_version(table)
+            assert get_catalog_version(table) == first
+            second = bump_catalog_version(table)
+            assert second != first
+            assert get_catalog_version(table) == second
+
+    def test_hit_within_ttl_skips_version_check(self):
+        """Test that warm hits inside the TTL do not touch DynamoDB."""
+        from moto import mock_aws
+
+        with mock_aws():
+            table = self._create_table()
+            cache = CatalogCache(ttl_seconds=60)
+            calls = []
+
+            def loader():
+                calls.append(1)
+                return ["カレーライス"]
+
+            assert cache.get("all", table, loader) == ["カレーライス"]
+            assert cache.get("all", table, loader) == ["カレーライス"]
+            assert len(calls) == 1
+            assert cache.stats()["hits"] == 1
+            assert cache.stats()["misses"] == 1
+            assert cache.stats()["version_checks"] == 1
+
+    def test_version_bump_invalidates_after_ttl(self):
+        """Test that a changed catalog version forces a reload."""
+        from moto import mock_aws
+
+        with mock_aws():
+            table = self._create_table()
+            cache = CatalogCache(ttl_seconds=0)
+            values = iter([["v1"], ["v2"]])
+
+            assert cache.get("all", table, lambda: next(values)) == ["v1"]
+            # Unchanged version: served from cache after the freshness check
+            assert cache.get("all", table, lambda: next(values)) == ["v1"]
+
+            bump_catalog_version(table)
+            assert cache.get("all", table, lambda: next(values)) == ["v2"]
+            assert cache.stats()["misses"] == 2
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        from moto import mock_aws
+
+        with mock_aws():
+            table = self._create_table()
+            cache = CatalogCache(ttl_seconds=60, max_entries=2)
+
+            cache.get("a", table, lambda: "A")
+            cache.get("b", table, lambda: "B")
+            cache.get("a", table, lambda: "A")  # "a" is now most recent
+            cache.get("c", table, lambda: "C")  # evicts "b"
+
+            assert cache.stats()["evictions"] == 1
+            assert cache.get("a", table, lambda: "reloaded") == "A"
+            assert cache.get("b", table, lambda: "reloaded") == "reloaded"
+
+    def test_revalidate_ignores_ttl(self):
+        """Test that revalidate checks the version inside the TTL."""
+        from moto import mock_aws
+
+        with mock_aws():
+            table = self._create_table()
+            cache = CatalogCache(ttl_seconds=60)
+            cache.get("all", table, lambda: "v1")
+
+            assert cache.revalidate(table) is False
+            bump_catalog_version(table)
+            assert cache.revalidate(table) is True
+            assert cache.get("all", table, lambda: "v2") == "v2"
+            assert cache.stats()["version_checks"] == 3
+
+
+class TestProjectionHelpers:
+    """Test cases for build_projection and to_rows functions."""
+
+    def test_build_projection_uses_placeholders(self):
+        """Test that reserved words are projected through placeholders."""
+        result = build_projection(["name", "date"])
+        assert result == {
+            "ProjectionExpression": "#p0, #p1",
+            "ExpressionAttributeNames": {"#p0": "name", "#p1": "date"},
+        }
+
+    def test_to_rows(self):
+        """Test encoding records as rows, with None for missing values."""
+        records = [{"name": "味噌汁", "category": "汁物"}, {"name": "白米"}]
+        assert to_rows(records, ["name", "category"]) == [
+            ["味噌汁", "汁物"],
+            ["白米", None],
+        ]
+
+
+class TestPaginatedResponses:
+    """Test cases for create_agent_response, cursors and paginate_records."""
+
+    def test_create_agent_response(self):
+        """Test the Bedrock Agent response envelope."""
+        event = {
+            "actionGroup": "GetRecipes",
+            "apiPath": "/recipes",
+            "httpMethod": "GET",
+        }
+        response = create_agent_response(event, 200, {"recipes": []})
+        assert response["messageVersion"] == "1.0"
+        assert response["response"]["actionGroup"] == "GetRecipes"
+        assert response["response"]["httpStatusCode"] == 200
+        body_str = response["response"]["responseBody"]["application/json"]["body"]
+        assert body_str == '{"recipes": []}'
+
+    def test_cursor_roundtrip(self):
+        """Test that a cursor carries the offset and the query."""
+        cursor = encode_cursor(42, {"category": "主菜", "days": 30})
+        assert decode_cursor(cursor) == (42, {"category": "主菜", "days": 30})
+
+    @pytest.mark.parametrize("cursor", ["not-a-cursor", "", "e30"])
+    def test_invalid_cursor_raises_error(self, cursor):
+        """Test that malformed cursors raise ValueError."""
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            decode_cursor(cursor)
+
+    @pytest.mark.parametrize("encoder", ["stdlib", "orjson"])
+    def test_small_result_matches_encode_json(self, encoder, monkeypatch):
+        """Test that an unpaginated body is byte-identical to encode_json."""
+        if encoder == "orjson":
+            pytest.importorskip("orjson")
+        monkeypatch.setattr(utils, "JSON_ENCODER", encoder)
+        records = [{"name": "味噌汁", "servings": 2}, {"name": "白米"}]
+        body = paginate_records(
+            "recipes", records, {}, extra={"columns": ["name"]}, max_bytes=10_000
+        )
+        assert body == encode_json({"columns": ["name"], "recipes": records})
+        if encoder == "stdlib":
+            assert body == json.dumps({"columns": ["name"], "recipes": records})
+
+    def test_pages_fit_budget_and_cover_all_records(self):
+        """Test that following cursors returns every record exactly once."""
+        records = [{"name": f"レシピ{i}", "notes": "x" * 50} for i in range(40)]
+        query = {"view": "full"}
+
+        collected = []
+        offset = 0
+        while True:
+            body = paginate_records("recipes", records, query, offset, max_bytes=600)
+            assert len(body.encode()) <= 600
+            page = json.loads(body)
+            collected.extend(page["recipes"])
+            if "next_cursor" not in page:
+                break
+            offset, returned_query = decode_cursor(page["next_cursor"])
+            assert returned_query == query
+
+        assert collected == records
+
+    def test_oversized_record_is_still_returned(self):
+        """Test that pagination makes progress when one record exceeds the budget."""
+        records = [{"notes": "x" * 500}, {"notes": "y"}]
+        page = json.loads(paginate_records("history", records, {}, max_bytes=100))
+        assert page["history"] == records[:1]
+        assert decode_cursor(page["next_cursor"])[0] == 1
+
+
+class TestEncodeJson:
+    """Test cases for encode_json."""
+
+    VALUE = {
+        "name": "味噌汁",
+        "servings": Decimal("2"),
+        "rating": Decimal("4.5"),
+        "dates": {"2025-11-08", "2025-11-01"},
+        "date": date(2025, 11, 8),
+        "created_at": datetime(2025, 11, 8, 10, 0),
+        "meals": {"dinner": ["味噌汁", "白米"]},
+        "notes": None,
+    }
+
+    def test_encodes_dynamodb_types(self):
+        """Test Decimal, set, date and datetime values without pre-conversion."""
+        assert json.loads(encode_json(self.VALUE)) == {
+            "name": "味噌汁",
+            "servings": 2,
+            "rating": 4.5,
+            "dates": ["2025-11-01", "2025-11-08"],
+            "date": "2025-11-08",
+            "created_at": "2025-11-08T10:00:00",
+            "meals": {"dinner": ["味噌汁", "白米"]},
+            "notes": None,
+        }
+
+    def test_default_format_matches_json_dumps(self):
+        """Test that bodies keep json.dumps' default format byte for byte."""
+        value = {"name": "白米", "tags": [1, 2.5], "big": 2**70}
+        assert encode_json(value) == json.dumps(value)
+        assert encode_json(value, ensure_ascii=False) == json.dumps(
+            value, ensure_ascii=False
+        )
+
+    def test_orjson_bodies_decode_the_same(self, monkeypatch):
+        """Test that opting into orjson changes the bytes but not the value."""
+        pytest.importorskip("orjson")
+        default = encode_json(self.VALUE)
+        monkeypatch.setattr(utils, "JSON_ENCODER", "orjson")
+        fast = encode_json(self.VALUE)
+        assert fast != default
+        assert json.loads(fast) == json.loads(default)
+        assert encode_json({"name": "白米"}) == '{"name":"白米"}'
+
+    def test_dump_json_compact(self):
+        """Test the compact encoding of values that never reach a client."""
+        assert dump_json({"name": "白米", "dates": {"2025-11-08"}}) == (
+            '{"name":"白米","dates":["2025-11-08"]}'
+        )
+        # Integers beyond 64 bits, which orjson rejects, use the stdlib
+        assert dump_json({"big": 2**70}) == '{"big":1180591620717411303424}'
+
+    def test_unsupported_type_raises_error(self):
+        """Test that unknown objects raise TypeError."""
+        with pytest.raises(TypeError):
+            encode_json({"value": object()})
+
+
+class TestIngredientIndex:
+    """Test cases for IngredientIndex and normalize_ingredient."""
+
+    RECIPES = [
+        {"name": "カレーライス", "ingredients": ["豚肉", "玉ねぎ", "にんじん"]},
+        {"name": "肉じゃが", "ingredients": ["牛肉", "玉ねぎ", "にんじん"]},
+        {"name": "生姜焼き", "ingredients": ["豚肉", "玉ねぎ", "生姜"]},
+        {"name": "白米", "ingredients": ["米"]},
+        {"name": "トースト"},
+    ]
+
+    def test_normalize_ingredient(self):
+        """Test width folding, case folding and whitespace trimming."""
+        assert normalize_ingredient(" ＢＡＣＯＮ ") == "bacon"
+        assert normalize_ingredient("ｶﾚｰﾙｰ") == "カレールー"
+
+    def test_search_any(self):
+        """Test that any-match returns the union of posting lists."""
+        index = IngredientIndex(self.RECIPES)
+        assert index.search(["豚肉", "米"]) == {"カレーライス", "生姜焼き", "白米"}
+
+    def test_search_all(self):
+        """Test that all-match returns the intersection of posting lists."""
+        index = IngredientIndex(self.RECIPES)
+        assert index.search(["玉ねぎ", "にんじん"], "all") == {
+            "カレーライス",
+            "肉じゃが",
+        }
+        assert index.search(["玉ねぎ", "豚肉", "生姜"], "all") == {"生姜焼き"}
+        assert index.search(["玉ねぎ", "存在しない"], "all") == set()
+
+    def test_search_normalizes_query(self):
+        """Test that queries are normalized like indexed ingredients."""
+        index = IngredientIndex(
+            [{"name": "ベーコンエッグ", "ingredients": ["ベーコン"]}]
+        )
+        assert index.search(["ﾍﾞｰｺﾝ"]) == {"ベーコンエッグ"}
+
+    def test_search_invalid_match(self):
+        """Test that an unknown match mode is rejected."""
+        with pytest.raises(ValueError, match="match must be one of"):
+            IngredientIndex(self.RECIPES).search(["米"], "some")
+
+
+class TestRecipeNameIndex:
+    """Test cases for RecipeNameIndex and normalize_recipe_name."""
+
+    NAMES = ["カレーライス", "鮭の塩焼き", "ほうれん草のおひたし", "ＢＬＴサンド"]
+
+    def test_normalize_recipe_name(self):
+        """Test width folding, case folding and whitespace removal."""
+        assert normalize_recipe_name(" ｶﾚｰ ﾗｲｽ ") == "カレーライス"
+        assert normalize_recipe_name("ＢＬＴサンド") == "bltサンド"
+
+    def test_resolve_exact_and_normalized(self):
+        """Test that variants resolve to the catalog spelling."""
+        index = RecipeNameIndex(self.NAMES)
+        assert len(index) == 4
+        assert index.resolve("カレーライス") == "カレーライス"
+        assert index.resolve("ｶﾚｰﾗｲｽ") == "カレーライス"
+        assert index.resolve("blt サンド") == "ＢＬＴサンド"
+        assert index.resolve("カレー") is None
+
+    def test_suggest_near_matches(self):
+        """Test suggestions for names missing from the catalog."""
+        index = RecipeNameIndex(self.NAMES)
+        assert index.suggest("カレー") == ["カレーライス"]
+        assert index.suggest("おひたし")[0] == "ほうれん草のおひたし"
+        assert index.suggest("ハンバーグ") == []
+
+
+class TestHistoryKey:
+    """Test cases for history_key."""
+
+    def test_legacy_key(self):
+        """Test that no household gives the date-only key."""
+        assert history_key("2025-11-08") == {"date": "2025-11-08"}
+        assert history_key("2025-11-08", "") == {"date": "2025-11-08"}
+
+    def test_range_key(self):
+        """Test that a household gives the household + date key."""
+        assert history_key("2025-11-08", "home") == {
+            "household": "home",
+            "date": "2025-11-08",
+        }
+
+
+class TestSaveHelpers:
+    """Test cases for the helpers shared by save_menu and save_menus."""
+
+    def test_agent_parameters_from_request_body(self):
+        """Test that requestBody properties are used when parameters is empty."""
+        event = {
+            "parameters": [],
+            "requestBody": {
+                "content": {
+                    "application/json": {
+                        "properties": [{"name": "date", "value": "2025-11-08"}]
+                    }
+                }
+            },
+        }
+        assert agent_parameters(event) == {"date": "2025-11-08"}
+        assert agent_parameters({"parameters": [{"name": "a", "value": "1"}]}) == {
+            "a": "1"
+        }
+
+    def test_validate_date_format(self):
+        """Test that only YYYY-MM-DD dates are accepted."""
+        assert validate_date_format("2025-11-08")
+        assert not validate_date_format("2025/11/08")
+        assert not validate_date_format("2025-02-30")
+        assert not validate_date_format(None)
+
+    @pytest.mark.parametrize(
+        "mode, rejected", [("reject", True), ("flag", False), ("off", False)]
+    )
+    def test_screen_recipe_names_modes(self, monkeypatch, mode, rejected):
+        """Test the reject/flag/off outcomes for a menu with an unknown name."""
+        monkeypatch.setattr(
+            utils,
+            "check_recipe_names",
+            lambda meals, table: (meals, {"カレー": ["カレーライス"]}),
+        )
+        meals = {"dinner": ["カレー"]}
+
+        _, unknown, is_rejected = screen_recipe_names(meals, None, mode)
+
+        assert is_rejected is rejected
+        assert bool(unknown) is (mode != "off")
+
+
+class FakeBatchGetClient:
+    """Low-level client stand-in that leaves keys unprocessed on demand."""
+
+    def __init__(self, table_name, unprocessed_rounds):
+        self.table_name = table_name
+        self.unprocessed_rounds = unprocessed_rounds
+        self.calls = []
+
+    def batch_get_item(self, RequestItems):
+        keys = RequestItems[self.table_name]["Keys"]
+        self.calls.append(keys)
+        if self.unprocessed_rounds > 0:
+            # Answer the first key only and hand the rest back
+            self.unprocessed_rounds -= 1
+            answered, pending = keys[:1], keys[1:]
+        else:
+            answered, pending = keys, []
+        response = {"Responses": {self.table_name: [dict(k) for k in answered]}}
+        if pending:
+            response["UnprocessedKeys"] = {self.table_name: {"Keys": pending}}
+        return response
+
+
+class FakeTable:
+    """Table stand-in exposing the attributes batch_get_all uses."""
+
+    def __init__(self, client):
+        self.name = client.table_name
+
+
+class FakeContext:
+    """Lambda context stand-in with a fixed remaining time."""
+
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+class TestBatchGetAll:
+    """Test cases for batch_get_all and emit_metrics."""
+
+    @staticmethod
+    def _metrics(capsys):
+        lines = capsys.readouterr().out.strip().splitlines()
+        return json.loads(lines[-1])
+
+    @pytest.fixture(autouse=True)
+    def no_sleep(self, monkeypatch):
+        """Record backoff delays instead of sleeping."""
+        import utils
+
+        self.delays = []
+        self.monkeypatch = monkeypatch
+        monkeypatch.setattr(utils.time, "sleep", self.delays.append)
+
+    def _table(self, client):
+        """Route batch_get_all's low-level calls to a fake client."""
+        import utils
+
+        self.monkeypatch.setattr(utils, "_dynamodb_client", client)
+        return FakeTable(client)
+
+    def test_chunks_keys_by_100(self, capsys):
+        """Test that keys are requested in BatchGetItem-sized chunks."""
+        from moto import mock_aws
+
+        with mock_aws():
+            table = TestScanAll._create_table(250)
+            keys = [{"name": f"recipe-{i:03d}"} for i in range(0, 260, 2)]
+            items = batch_get_all(table, keys)
+
+        assert len(items) == 125
+        metrics = self._metrics(capsys)
+        assert metrics["BatchGetRequests"] == 2
+        assert metrics["BatchGetRetries"] == 0
+        assert self.delays == []
+
+    def test_redrives_unprocessed_keys(self, capsys):
+        """Test that unprocessed keys are retried until every key is read."""
+        client = FakeBatchGetClient("history", unprocessed_rounds=2)
+        keys = [{"date": f"2025-11-{day:02d}"} for day in range(1, 6)]
+
+        items = batch_get_all(self._table(client), keys)
+
+        assert sorted(item["date"] for item in items) == [k["date"] for k in keys]
+        assert [len(call) for call in client.calls] == [5, 4, 3]
+        assert len(self.delays) == 2
+        metrics = self._metrics(capsys)
+        assert metrics["BatchGetRetries"] == 2
+        assert metrics["BatchGetUnprocessedKeys"] == 7
+        assert metrics["Table"] == "history"
+        assert metrics["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Table"]]
+
+    def test_backoff_is_jittered_and_capped(self, monkeypatch):
+        """Test full-jitter delays grow exponentially up to the cap."""
+        import utils
+
+        monkeypatch.setattr(utils.random, "uniform", lambda low, high: high)
+        monkeypatch.setattr(utils, "BATCH_GET_MAX_DELAY_MS", 300.0)
+        client = FakeBatchGetClient("history", unprocessed_rounds=4)
+        keys = [{"date": f"2025-11-{day:02d}"} for day in range(1, 7)]
+
+        batch_get_all(self._table(client), keys)
+
+        assert self.delays == [0.05, 0.1, 0.2, 0.3]
+
+    def test_raises_after_max_retries(self, monkeypatch):
+        """Test that keys still unprocessed after the budget raise an error."""
+        import utils
+
+        monkeypatch.setattr(utils, "BATCH_GET_MAX_RETRIES", 1)
+        client = FakeBatchGetClient("history", unprocessed_rounds=5)
+        keys = [{"date": f"2025-11-{day:02d}"} for day in range(1, 6)]
+
+        with pytest.raises(UnprocessedKeysError, match="after 1 retries") as exc:
+            batch_get_all(self._table(client), keys)
+        assert len(exc.value.unprocessed_keys) == 3
+
+    def test_stops_at_deadline(self):
+        """Test that no backoff sleep runs past the Lambda deadline."""
+        client = FakeBatchGetClient("history", unprocessed_rounds=1)
+        keys = [{"date": "2025-11-01"}, {"date": "2025-11-02"}]
+
+        with pytest.raises(UnprocessedKeysError, match="deadline"):
+            batch_get_all(self._table(client), keys, FakeContext(remaining_ms=500))
+        assert self.delays == []
+
+    def test_fetches_chunks_concurrently_in_key_order(self):
+        """Test bounded concurrent chunk reads that keep chunk order."""
+        import threading
+
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        class SlowClient(FakeBatchGetClient):
+            def batch_get_item(self, RequestItems):
+                with lock:
+                    state["active"] += 1
+                    state["peak"] = max(state["peak"], state["active"])
+                threading.Event().wait(0.05)
+                with lock:
+                    state["active"] -= 1
+                return super().batch_get_item(RequestItems)
+
+        client = SlowClient("history", unprocessed_rounds=0)
+        keys = [{"n": i} for i in range(450)]
+
+        items = batch_get_all(self._table(client), keys, max_workers=2)
+
+        assert [item["n"] for item in items] == list(range(450))
+        assert len(client.calls) == 5
+        assert state["peak"] == 2
+
+    def test_unprocessed_keys_reported_across_chunks(self, monkeypatch):
+        """Test that every chunk's leftover keys are reported together."""
+        import utils
+
+        monkeypatch.setattr(utils, "BATCH_GET_MAX_RETRIES", 0)
+        client = FakeBatchGetClient("history", unprocessed_rounds=2)
+        keys = [{"n": i} for i in range(150)]
+
+        with pytest.raises(UnprocessedKeysError, match="148 keys") as exc:
+            batch_get_all(self._table(client), keys, max_workers=2)
+        assert len(exc.value.unprocessed_keys) == 148
+
+    def test_emit_metrics_format(self, capsys):
+        """Test the Embedded Metric Format document."""
+        emit_metrics({"Hits": 3}, {"Function": "get_recipes"})
+
+        record = self._metrics(capsys)
+        directive = record["_aws"]["CloudWatchMetrics"][0]
+        assert directive["Namespace"] == "KondatePlanner"
+        assert directive["Metrics"] == [{"Name": "Hits", "Unit": "Count"}]
+        assert directive["Dimensions"] == [["Function"]]
+        assert record["Hits"] == 3
+        assert record["Function"] == "get_recipes"
+
+
+class TestInstrumentDynamodb:
+    """Test cases for instrument_dynamodb."""
+
+    @staticmethod
+    def _records(capsys):
+        lines = capsys.readouterr().out.strip().splitlines()
+        return [json.loads(line) for line in lines if line.startswith('{"_aws"')]
+
+    def test_counts_calls_and_capacity(self, capsys, monkeypatch):
+        """Test one EMF record with per-operation calls, time and capacity."""
+        from moto import mock_aws
+
+        monkeypatch.setattr(utils, "_dynamodb", None)
+
+        @utils.instrument_dynamodb
+        def handler(event, context):
+            table = utils.get_dynamodb().Table("scan-test-table")
+            put = table.put_item(Item={"name": "白米"})
+            get_item(table, {"name": "白米"})
+            scan_all(table, total_segments=2)
+            return {"consumed": "ConsumedCapacity" in put}
+
+        with mock_aws():
+            TestScanAll._create_table(3)
+            unrequested = (
+                utils.get_dynamodb()
+                .Table("scan-test-table")
+                .put_item(Item={"name": "味噌汁"})
+            )
+            result = handler({"actionGroup": "GetRecipes"}, None)
+
+        assert "ConsumedCapacity" not in unrequested
+        assert result == {"consumed": True}
+        (record,) = self._records(capsys)
+        assert record["ActionGroup"] == "GetRecipes"
+        assert record["DynamoDBCalls"] == 4
+        assert record["PutItemCalls"] == 1
+        assert record["GetItemCalls"] == 1
+        assert record["ScanCalls"] == 2
+        assert record["DynamoDBErrors"] == 0
+        assert record["ConsumedReadCapacity"] > 0
+        assert record["ConsumedWriteCapacity"] > 0
+        units = {
+            metric["Name"]: metric["Unit"]
+            for metric in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]
+        }
+        assert units["ScanTime"] == "Milliseconds"
+        assert units["ScanCalls"] == "Count"
+
+    def test_emits_once_when_handler_raises(self, capsys):
+        """Test that failed calls and exceptions are still published once."""
+        from moto import mock_aws
+
+        @utils.instrument_dynamodb
+        def inner(event, context):
+            get_item(SimpleNamespace(name="missing-table"), {"name": "白米"})
+
+        @utils.instrument_dynamodb
+        def outer(event, context):
+            return inner(event, context)
+
+        with mock_aws():
+            with pytest.raises(Exception, match="ResourceNotFound"):
+                outer({"actionGroup": "SaveMenu"}, None)
+
+        (record,) = self._records(capsys)
+        assert record["ActionGroup"] == "SaveMenu"
+        assert record["GetItemCalls"] == 1
+        assert record["DynamoDBErrors"] == 1
+
+    def test_calls_outside_invocations_are_not_counted(self, capsys):
+        """Test that INIT-time calls (e.g. priming) are left alone."""
+        from moto import mock_aws
+
+        with mock_aws():
+            table = TestScanAll._create_table(1)
+            get_item(table, {"name": "recipe-000"})
+
+            @utils.instrument_dynamodb
+            def handler(event, context):
+                return {}
+
+            handler({}, None)
+
+        (record,) = self._records(capsys)
+        assert record["ActionGroup"] == "unknown"
+        assert record["DynamoDBCalls"] == 0
+
+
+class TestDynamoDBBudget:
+    """Test cases for the dynamodb_calls recorder behind dynamodb_budget."""
+
+    @staticmethod
+    def _invoke(monkeypatch):
+        from moto import mock_aws
+
+        monkeypatch.setattr(utils, "_dynamodb", None)
+
+        @utils.instrument_dynamodb
+        def handler(event, context):
+            table = utils.get_dynamodb().Table("scan-test-table")
+            table.put_item(Item={"name": "白米"})
+            get_item(table, {"name": "白米"})
+            get_item(table, {"name": "味噌汁"})
+            return {}
+
+        with mock_aws():
+            TestScanAll._create_table(1)
+            handler({}, None)
+
+    def test_records_operations_per_invocation(self, dynamodb_calls, monkeypatch):
+        """Test that each invocation's operations are counted by name and group."""
+        self._invoke(monkeypatch)
+        self._invoke(monkeypatch)
+
+        assert dynamodb_calls.invocations == [["PutItem", "GetItem", "GetItem"]] * 2
+        assert dynamodb_calls.count("GetItem") == 2
+        assert dynamodb_calls.count("reads") == 2
+        assert dynamodb_calls.count("writes") == 1
+        dynamodb_calls.check(GetItem=2, writes=1, calls=3, exact=("writes",))
+
+    def test_over_budget_fails(self, dynamodb_calls, monkeypatch):
+        """Test that a budget overrun or a missed exact count is reported."""
+        self._invoke(monkeypatch)
+
+        with pytest.raises(AssertionError, match="made 2 GetItem \\(budget 1\\)"):
+            dynamodb_calls.check(GetItem=1)
+        with pytest.raises(AssertionError, match="made 1 writes \\(expected 2\\)"):
+            dynamodb_calls.check(writes=2, exact=("writes",))
+
+    def test_invalid_budget(self, dynamodb_calls):
+        """Test that a misspelled operation is rejected instead of always passing."""
+        with pytest.raises(ValueError, match="Invalid DynamoDB budget"):
+            dynamodb_calls.check(BatchGetItems=4)
+
+
+class TestProfileInvocation:
+    """Test cases for profile_invocation."""
+
+    @staticmethod
+    def handler(event, context):
+        return {"names": sorted(str(i) for i in range(1000))[:2]}
+
+    @pytest.fixture(autouse=True)
+    def profile_dir(self, monkeypatch, tmp_path):
+        """Write profiles to a temporary directory."""
+        monkeypatch.setattr(utils, "PROFILE_DIR", str(tmp_path))
+        self.monkeypatch = monkeypatch
+        return tmp_path
+
+    def test_disabled_leaves_handler_unchanged(self):
+        """Test that the disabled profiler adds no wrapper at all."""
+        self.monkeypatch.setattr(utils, "PROFILE_HANDLER", False)
+        self.monkeypatch.setattr(utils, "PROFILE_SAMPLE_RATE", 0.0)
+        assert utils.profile_invocation(self.handler) is self.handler
+
+    def test_profiles_and_dumps_pstats(self, profile_dir, caplog):
+        """Test the logged top-N summary and the .pstats dump."""
+        import logging
+        import pstats
+
+        self.monkeypatch.setattr(utils, "PROFILE_HANDLER", True)
+        self.monkeypatch.setattr(utils, "PROFILE_TOP_N", 3)
+        context = SimpleNamespace(aws_request_id="req-1")
+
+        with caplog.at_level(logging.INFO, logger="utils"):
+            result = utils.profile_invocation(self.handler)({}, context)
+
+        assert result == {"names": ["0", "1"]}
+        dump = profile_dir / "handler-req-1.pstats"
+        assert pstats.Stats(str(dump)).total_calls > 0
+        (summary,) = [r.message for r in caplog.records if "Profile of" in r.message]
+        assert str(dump) in summary
+        assert len(summary.splitlines()) == 1 + 1 + 3  # path, header, top 3
+        assert "handler (test_utils.py:" in summary
+
+    def test_memory_tracing(self, profile_dir, caplog):
+        """Test that PROFILE_MEMORY adds the tracemalloc summary."""
+        import logging
+        import tracemalloc
+
+        self.monkeypatch.setattr(utils, "PROFILE_HANDLER", True)
+        self.monkeypatch.setattr(utils, "PROFILE_MEMORY", True)
+
+        with caplog.at_level(logging.INFO, logger="utils"):
+            utils.profile_invocation(self.handler)({}, None)
+
+        assert "tracemalloc peak" in caplog.text
+        assert not tracemalloc.is_tracing()
+        assert len(list(profile_dir.glob("handler-*.pstats"))) == 1
+
+    def test_sampling(self, profile_dir):
+        """Test that PROFILE_SAMPLE_RATE profiles only sampled invocations."""
+        self.monkeypatch.setattr(utils, "PROFILE_HANDLER", False)
+        self.monkeypatch.setattr(utils, "PROFILE_SAMPLE_RATE", 0.5)
+        draws = iter([0.9, 0.1, 0.7])
+        self.monkeypatch.setattr(utils.random, "random", lambda: next(draws))
+
+        handler = utils.profile_invocation(self.handler)
+        for _ in range(3):
+            handler({}, None)
+
+        assert len(list(profile_dir.glob("*.pstats"))) == 1
+
+    def test_exception_is_profiled_and_reraised(self, profile_dir):
+        """Test that a failing invocation still leaves its profile."""
+        self.monkeypatch.setattr(utils, "PROFILE_HANDLER", True)
+
+        @utils.profile_invocation
+        def failing(event, context):
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError, match="boom"):
+            failing({}, None)
+        assert len(list(profile_dir.glob("failing-*.pstats"))) == 1
+
+
+class TestRecipeUsage:
+    """Test cases for record_recipe_usage and summarize_usage."""
+
+    def test_record_is_idempotent_and_reversible(self):
+        """Test adding and removing a date from usage sets."""
+        import boto3
+        from moto import mock_aws
+
+        with mock_aws():
+            dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+            table = dynamodb.create_table(
+                TableName="usage-test-table",
+                KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+
+            record_recipe_usage(table, *usage_changes([("2025-11-01", [], ["a", "b"])]))
+            record_recipe_usage(table, *usage_changes([("2025-11-01", [], ["a", "b"])]))
+            record_recipe_usage(table, *usage_changes([("2025-11-02", [], ["a"])]))
+            record_recipe_usage(
+                table, *usage_changes([("2025-11-01", ["a", "b"], ["a"])])
+            )
+
+            assert table.get_item(Key={"name": "a"})["Item"]["dates"] == {
+                "2025-11-01",
+                "2025-11-02",
+            }
+            assert "dates" not in table.get_item(Key={"name": "b"})["Item"]
+
+    def test_changes_aggregated_per_recipe(self):
+        """Test that several days update each recipe once, in one transaction."""
+        import boto3
+        from moto import mock_aws
+
+        added, removed, kept = usage_changes(
+            [
+                ("2025-11-01", ["a", "b"], ["a"]),
+                ("2025-11-02", [], ["a", "b"]),
+                ("2025-11-03", [], ["b"]),
+            ]
+        )
+        assert added == {"a": {"2025-11-02"}, "b": {"2025-11-02", "2025-11-03"}}
+        assert removed == {"b": {"2025-11-01"}}
+        assert kept == {"a": {"2025-11-01"}}
+
+        with mock_aws():
+            dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+            table = dynamodb.create_table(
+                TableName="usage-test-table",
+                KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+            table.put_item(Item={"name": "b", "dates": {"2025-11-01"}})
+            operations = []
+            table.meta.client.meta.events.register(
+                "before-call.dynamodb",
+                lambda model, **kwargs: operations.append(model.name),
+            )
+
+            record_recipe_usage(table, added, removed, kept)
+
+            # b is both added and removed: its removal needs a second transaction
+            assert operations == ["TransactWriteItems", "TransactWriteItems"]
+            assert table.get_item(Key={"name": "b"})["Item"]["dates"] == {
+                "2025-11-02",
+                "2025-11-03",
+            }
+
+    def test_old_dates_archived_on_write(self):
+        """Test that dates past the horizon are folded into the scalars."""
+        import boto3
+        from moto import mock_aws
+
+        with mock_aws():
+            dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+            table = dynamodb.create_table(
+                TableName="usage-test-table",
+                KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+            table.put_item(
+                Item={
+                    "name": "a",
+                    "dates": {"2025-06-01", "2025-08-12", "2025-08-13"},
+                    "archived_before": "2025-02-01",
+                    "archived_use_count": 2,
+                    "archived_last_used": "2025-01-01",
+                }
+            )
+
+            record_recipe_usage(
+                table,
+                *usage_changes([("2025-11-10", [], ["a"])]),
+                today="2025-11-10",
+            )
+
+            item = table.get_item(Key={"name": "a"})["Item"]
+            # 2025-08-13 is the first day of the 90-day window ending 11-10
+            assert item["dates"] == {"2025-08-13", "2025-11-10"}
+            assert item["archived_use_count"] == 4
+            assert item["archived_last_used"] == "2025-08-12"
+            assert item["archived_before"] == "2025-08-13"
+
+            summary = summarize_usage(item["dates"], "2025-11-10", 4, "2025-08-12")
+            assert summary["use_count"] == 6
+            assert summary["last_used"] == "2025-11-10"
+            assert summary["uses_90d"] == 2
+
+    def test_overwrite_before_horizon(self):
+        """Test re-saving and overwriting a day that was already archived."""
+        import boto3
+        from moto import mock_aws
+
+        with mock_aws():
+            dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+            table = dynamodb.create_table(
+                TableName="usage-test-table",
+                KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+
+            def save(day, previous, current):
+                record_recipe_usage(
+                    table,
+                    *usage_changes([(day, previous, current)]),
+                    today="2026-10-17",
+                )
+                return table.get_item(Key={"name": "a"})["Item"]
+
+            save("2026-06-01", [], ["a"])
+            item = save("2026-10-10", [], ["a"])
+            assert item["dates"] == {"2026-10-10"}
+            assert item["archived_use_count"] == 1
+
+            # Already counted: re-saving the day unchanged leaves the count
+            item = save("2026-06-01", ["a"], ["a"])
+            assert item["dates"] == {"2026-10-10"}
+            assert item["archived_use_count"] == 1
+
+            save("2026-10-11", [], ["a"])
+            item = save("2026-06-01", ["a"], [])
+            assert item["archived_use_count"] == 0
+            summary = summarize_usage(
+                item["dates"],
+                "2026-10-17",
+                int(item["archived_use_count"]),
+                item["archived_last_used"],
+            )
+            assert summary["use_count"] == 2
+            assert summary["last_used"] == "2026-10-11"
+
+            # A day newly served before the horizon goes straight to the count
+            item = save("2026-05-01", [], ["a"])
+            assert item["dates"] == {"2026-10-10", "2026-10-11"}
+            assert item["archived_use_count"] == 1
+            assert item["archived_last_used"] == "2026-06-01"
+
+    def test_archive_retried_when_raced(self, monkeypatch):
+        """Test that an archive losing its condition is read and applied again."""
+        import boto3
+        from moto import mock_aws
+
+        with mock_aws():
+            dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+            table = dynamodb.create_table(
+                TableName="usage-test-table",
+                KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+            table.put_item(
+                Item={
+                    "name": "a",
+                    "archived_before": "2025-07-01",
+                    "archived_use_count": 1,
+                    "archived_last_used": "2025-06-01",
+                }
+            )
+            # The first read saw the item before another save archived a date
+            reads = []
+            batch_get_all = utils.batch_get_all
+
+            def stale_first_read(*args, **kwargs):
+                reads.append(args)
+                if len(reads) == 1:
+                    return [{"name": "a", "dates": {"2025-06-01"}}]
+                return batch_get_all(*args, **kwargs)
+
+            monkeypatch.setattr(utils, "batch_get_all", stale_first_read)
+
+            record_recipe_usage(
+                table,
+                *usage_changes([("2025-11-10", [], ["a"])]),
+                today="2025-11-10",
+            )
+
+            assert len(reads) == 2
+            item = table.get_item(Key={"name": "a"})["Item"]
+            assert item["dates"] == {"2025-11-10"}
+            assert item["archived_use_count"] == 1
+
+    def test_summarize_archived_only(self):
+        """Test a recipe whose every use has been archived."""
+        summary = summarize_usage(set(), "2025-11-10", 3, "2025-07-01")
+        assert summary["last_used"] == "2025-07-01"
+        assert summary["days_since_last_used"] == 132
+        assert summary["use_count"] == 3
+        assert summary["uses_90d"] == 0
+
+    def test_summarize_windows(self):
+        """Test rolling window counts, inclusive of the as-of date."""
+        dates = {"2025-11-10", "2025-11-04", "2025-10-12", "2025-08-13", "2025-01-01"}
+
+        summary = summarize_usage(dates, "2025-11-10")
+
+        assert summary == {
+            "last_used": "2025-11-10",
+            "days_since_last_used": 0,
+            "use_count": 5,
+            "uses_7d": 2,
+            "uses_30d": 3,
+            "uses_90d": 4,
+            "next_planned": None,
+        }
+
+    def test_summarize_never_used(self):
+        """Test the summary of a recipe that was never served."""
+        summary = summarize_usage(set(), "2025-11-10")
+        assert summary["last_used"] is None
+        assert summary["days_since_last_used"] is None
+        assert summary["use_count"] == 0
+
+
+class TestDeserializeItem:
+    """Test cases for deserialize_item."""
+
+    def test_wire_format_to_python(self):
+        """Test converting a low-level item to Python values."""
+        item = {
+            "date": {"S": "2025-11-08"},
+            "version": {"N": "3"},
+            "recipes": {"L": [{"S": "白米"}]},
+            "meals": {"M": {"dinner": {"L": [{"S": "白米"}]}}},
+        }
+
+        assert deserialize_item(item) == {
+            "date": "2025-11-08",
+            "version": 3,
+            "recipes": ["白米"],
+            "meals": {"dinner": ["白米"]},
+        }
+        assert type(deserialize_item(item)["version"]) is int
+
+    def test_numbers_match_decimal_to_float(self):
+        """Test that numbers come out as decimal_to_float would return them."""
+        from boto3.dynamodb.types import TypeDeserializer
+
+        numbers = ["0", "-7", "2.5", "3.0", "1e3", "1.5E-2", "12345678901234567890"]
+        item = {
+            "n": {"L": [{"N": n} for n in numbers]},
+            "ns": {"NS": ["1", "2.5"]},
+            "nested": {"M": {"calories": {"N": "512.75"}}},
+            "flags": {"M": {"done": {"BOOL": True}, "none": {"NULL": True}}},
+            "ss": {"SS": ["a", "b"]},
+        }
+        legacy = TypeDeserializer()
+        expected = decimal_to_float(
+            {key: legacy.deserialize(value) for key, value in item.items()}
+        )
+
+        result = deserialize_item(item)
+
+        assert json.dumps(result["n"]) == json.dumps(expected["n"])
+        assert result == expected
+        assert [type(n) for n in result["n"]] == [int, int, float, int, int, float, int]
+        assert result["ns"] == {1, 2.5}
+
+    def test_binary_values(self):
+        """Test that binary values are decoded as boto3 Binary."""
+        from boto3.dynamodb.types import Binary
+
+        result = deserialize_item({"b": {"B": b"\x00\x01"}, "bs": {"BS": [b"a"]}})
+
+        assert result == {"b": Binary(b"\x00\x01"), "bs": {Binary(b"a")}}
+
+
+class TestGetItem:
+    """Test cases for get_item and serialize_item."""
+
+    def test_round_trip_native_types(self):
+        """Test that an item written via the resource reads back natively."""
+        import boto3
+        from moto import mock_aws
+
+        with mock_aws():
+            dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+            table = dynamodb.create_table(
+                TableName="get-item-test-table",
+                KeySchema=[{"AttributeName": "name", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "name", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+            table.put_item(
+                Item={"name": "白米", "servings": Decimal("2"), "kcal": Decimal("1.5")}
+            )
+
+            assert get_item(table, {"name": "白米"}) == {
+                "name": "白米",
+                "servings": 2,
+                "kcal": 1.5,
+            }
+            assert get_item(table, {"name": "なし"}) is None
+
+    def test_serialize_item(self):
+        """Test converting a key to the wire format."""
+        assert serialize_item({"household": "home", "version": 2}) == {
+            "household": {"S": "home"},
+            "version": {"N": "2"},
+        }
+
+
+class TestClientConfig:
+    """Test cases for client_config and the client getters."""
+
+    def test_dynamodb_defaults(self):
+        """Test the timeouts, retries and pool of DynamoDB clients."""
+        config = client_config("dynamodb")
+        assert config.connect_timeout == 1
+        assert config.read_timeout == 2
+        assert config.retries == {"mode": "adaptive", "max_attempts": 3}
+        assert config.max_pool_connections == 16
+        assert config.tcp_keepalive is True
+
+    def test_bedrock_gets_longer_read_timeout(self):
+        """Test that model invocations are not cut off by the DynamoDB timeout."""
+        assert client_config("bedrock-runtime").read_timeout == 60
+
+    def test_clients_use_config(self, monkeypatch):
+        """Test that the read client and Bedrock client are built with it."""
+        monkeypatch.setattr(utils, "_bedrock", None)
+        monkeypatch.setattr(utils, "BEDROCK_REGION", "us-west-2")
+        monkeypatch.setattr(utils, "CLIENT_RETRY_MODE", "standard")
+
+        client = utils.get_dynamodb_client()
+        assert client.meta.config.read_timeout == 2
+        assert client.meta.config.retries["mode"] == "standard"
+
+        bedrock = utils.get_bedrock()
+        assert bedrock.meta.region_name == "us-west-2"
+        assert bedrock.meta.config.read_timeout == 60
+
+    def test_thread_pools_capped_at_pool_size(self, monkeypatch):
+        """Test that scan and batch get fan-out never exceeds the pool."""
+        from moto import mock_aws
+
+        pool_sizes = []
+        executor = utils.ThreadPoolExecutor
+
+        def recording_executor(max_workers):
+            pool_sizes.append(max_workers)
+            return executor(max_workers=max_workers)
+
+        monkeypatch.setattr(utils, "ThreadPoolExecutor", recording_executor)
+        monkeypatch.setattr(utils, "CLIENT_MAX_POOL_CONNECTIONS", 2)
+
+        with mock_aws():
+            table = TestScanAll._create_table(300)
+            items, _ = scan_all(table, total_segments=4)
+            keys = [{"name": f"recipe-{i:03d}"} for i in range(300)]
+            assert len(batch_get_all(table, keys, max_workers=3)) == 300
+
+        assert len(items) == 300
+        assert pool_sizes == [2, 2]
+
+
+class TestPrimeOnInit:
+    """Test cases for prime_on_init."""
+
+    @pytest.fixture(autouse=True)
+    def cold_clients(self, monkeypatch):
+        """Start without clients so priming has something to create."""
+        monkeypatch.setattr(utils, "_dynamodb", None)
+        monkeypatch.setattr(utils, "_bedrock", None)
+        self.monkeypatch = monkeypatch
+
+    def _loader(self, table):
+        self.loads += 1
+        return ["カレーライス"]
+
+    def test_off_by_default(self):
+        """Test that nothing is created or read unless PRIME_ON_INIT is set."""
+        self.monkeypatch.setattr(utils, "PRIME_ON_INIT", "")
+        assert utils.prime_on_init("missing", {("k",): self._loader}) == {}
+        assert utils._dynamodb_client is None
+
+    def test_unknown_level_is_ignored(self, caplog):
+        """Test that a misspelled level skips priming with a warning."""
+        self.monkeypatch.setattr(utils, "PRIME_ON_INIT", "catalogue")
+        assert utils.prime_on_init("missing") == {}
+        assert "PRIME_ON_INIT" in caplog.text
+
+    def test_connection_level_skips_catalog(self):
+        """Test that "connection" creates both clients but loads nothing."""
+        from moto import mock_aws
+
+        self.monkeypatch.setattr(utils, "PRIME_ON_INIT", "connection")
+        self.loads = 0
+        with mock_aws():
+            TestScanAll._create_table(1)
+            timings = utils.prime_on_init("scan-test-table", {("k",): self._loader})
+
+        assert set(timings) == {"connection_ms"}
+        assert utils._dynamodb_client is not None
+        assert utils._dynamodb is not None
+        assert self.loads == 0
+
+    def test_catalog_level_fills_recipe_cache(self):
+        """Test that "catalog" makes the first lookup a cache hit."""
+        from moto import mock_aws
+
+        self.monkeypatch.setattr(utils, "PRIME_ON_INIT", "catalog")
+        self.loads = 0
+        with mock_aws():
+            table = TestScanAll._create_table(1)
+            timings = utils.prime_on_init("scan-test-table", {("k",): self._loader})
+            cached = utils.recipe_cache.get(("k",), table, lambda: [])
+
+        assert set(timings) == {"connection_ms", "catalog_ms"}
+        assert cached == ["カレーライス"]
+        assert self.loads == 1
+
+    def test_failure_falls_back_to_unprimed(self, caplog):
+        """Test that a priming error is logged instead of failing INIT."""
+        from moto import mock_aws
+
+        self.monkeypatch.setattr(utils, "PRIME_ON_INIT", "catalog")
+        self.loads = 0
+        with mock_aws():
+            assert utils.prime_on_init("missing", {("k",): self._loader}) == {}
+
+        assert self.loads == 0
+        assert "continuing unprimed" in caplog.text
+
+    def test_after_restore_reconnects_and_keeps_catalog(self):
+        """Test the SnapStart hook rebuilds clients and revalidates the cache."""
+        from moto import mock_aws
+
+        self.monkeypatch.setattr(utils, "PRIME_ON_INIT", "catalog")
+        self.loads = 0
+        with mock_aws():
+            table = TestScanAll._create_table(1)
+            utils.prime_on_init("scan-test-table", {("k",): self._loader})
+            snapshotted = utils.get_dynamodb_client()
+
+            utils._prime_after_restore("scan-test-table", revalidate_catalog=True)
+
+            assert utils.get_dynamodb_client() is not snapshotted
+            assert utils.recipe_cache.get(("k",), table, lambda: []) == ["カレーライス"]
+        assert self.loads == 1
+
+
+class TestIdempotent:
+    """Test cases for the idempotent handler decorator."""
+
+    EVENT = {
+        "sessionId": "session-1",
+        "actionGroup": "SaveMenu",
+        "apiPath": "/menu",
+        "parameters": [{"name": "date", "type": "string", "value": "2025-11-10"}],
+    }
+
+    @staticmethod
+    def _create_table():
+        import boto3
+
+        dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+        return dynamodb.create_table(
+            TableName="idempotency-test-table",
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+    @staticmethod
+    def _counting_handler(status_code=200):
+        calls = []
+
+        def handler(event, context):
+            calls.append(event)
+            return create_agent_response(event, status_code, {"call": len(calls)})
+
+        return handler, calls
+
+    def test_key_depends_on_session_and_payload(self):
+        """Test that only an identical request maps to the same key."""
+        key = idempotency_key(self.EVENT)
+        assert key == idempotency_key(dict(self.EVENT))
+        assert key.startswith("session-1#")
+        assert key != idempotency_key({**self.EVENT, "sessionId": "session-2"})
+        assert key != idempotency_key({**self.EVENT, "parameters": []})
+
+    def test_disabled_without_table(self):
+        """Test that an empty table name leaves the handler unchanged."""
+        handler, _ = self._counting_handler()
+        assert idempotent("")(handler) is handler
+
+    def test_retry_replays_stored_response(self):
+        """Test that the handler runs once per request."""
+        from moto import mock_aws
+
+        with mock_aws():
+            self._create_table()
+            handler, calls = self._counting_handler()
+            wrapped = idempotent("idempotency-test-table")(handler)
+
+            first = wrapped(self.EVENT, None)
+            assert wrapped(self.EVENT, None) == first
+            assert len(calls) == 1
+
+    def test_server_error_releases_claim(self):
+        """Test that 5xx responses are not stored, so a retry runs again."""
+        from moto import mock_aws
+
+        with mock_aws():
+            self._create_table()
+            handler, calls = self._counting_handler(status_code=500)
+            wrapped = idempotent("idempotency-test-table")(handler)
+
+            wrapped(self.EVENT, None)
+            wrapped(self.EVENT, None)
+            assert len(calls) == 2
+
+    def test_exception_releases_claim(self):
+        """Test that a crashed invocation does not block the retry."""
+        from moto import mock_aws
+
+        with mock_aws():
+            self._create_table()
+            outcomes = iter([RuntimeError("boom"), None])
+
+            def handler(event, context):
+                error = next(outcomes)
+                if error:
+                    raise error
+                return create_agent_response(event, 200, {"ok": True})
+
+            wrapped = idempotent("idempotency-test-table")(handler)
+            with pytest.raises(RuntimeError):
+                wrapped(self.EVENT, None)
+            assert wrapped(self.EVENT, None)["response"]["httpStatusCode"] == 200
+
+    def test_in_progress_request_reports_conflict(self, monkeypatch):
+        """Test a retry arriving while the first invocation is still running."""
+        import time
+
+        from moto import mock_aws
+
+        import utils
+
+        monkeypatch.setattr(utils, "IDEMPOTENCY_WAIT_SECONDS", 0)
+        with mock_aws():
+            table = self._create_table()
+            table.put_item(
+                Item={
+                    "id": idempotency_key(self.EVENT),
+                    "status": "INPROGRESS",
+                    "expires_at": int(time.time()) + 3600,
+                    "in_progress_until": int(time.time()) + 30,
+                }
+            )
+            handler, calls = self._counting_handler()
+            response = idempotent("idempotency-test-table")(handler)(self.EVENT, None)
+
+            assert response["response"]["httpStatusCode"] == 409
+            body = json.loads(
+                response["response"]["responseBody"]["application/json"]["body"]
+            )
+            assert body["error"] == "request_in_progress"
+            assert calls == []
+
+    def test_stale_in_progress_claim_is_taken_over(self):
+        """Test that a claim left by a timed-out invocation is reclaimed."""
+        import time
+
+        from moto import mock_aws
+
+        with mock_aws():
+            table = self._create_table()
+            table.put_item(
+                Item={
+                    "id": idempotency_key(self.EVENT),
+                    "status": "INPROGRESS",
+                    "expires_at": int(time.time()) + 3600,
+                    "in_progress_until": int(time.time()) - 1,
+                }
+            )
+            handler, calls = self._counting_handler()
+            response = idempotent("idempotency-test-table")(handler)(self.EVENT, None)
+
+            assert response["response"]["httpStatusCode"] == 200
+            assert len(calls) == 1
+
+    def test_retry_runs_request_when_first_invocation_releases_claim(self, monkeypatch):
+        """Test that a waiting retry runs the request once the claim is released."""
+        import time
+
+        from moto import mock_aws
+
+        with mock_aws():
+            table = self._create_table()
+            key = idempotency_key(self.EVENT)
+            table.put_item(
+                Item={
+                    "id": key,
+                    "status": "INPROGRESS",
+                    "expires_at": int(time.time()) + 3600,
+                    "in_progress_until": int(time.time()) + 30,
+                }
+            )
+
+            def first_invocation_fails(seconds):
+                # The first invocation raised and _finish_request released it
+                table.delete_item(Key={"id": key})
+
+            monkeypatch.setattr(time, "sleep", first_invocation_fails)
+            handler, calls = self._counting_handler()
+            response = idempotent("idempotency-test-table")(handler)(self.EVENT, None)
+
+            assert response["response"]["httpStatusCode"] == 200
+            assert len(calls) == 1
+            stored = table.get_item(Key={"id": key})["Item"]
+            assert stored["status"] == "COMPLETED"
+
+    @pytest.mark.parametrize("status_code, runs", [(400, 2), (409, 1), (201, 1)])
+    def test_only_final_responses_are_stored(self, status_code, runs):
+        """Test that 4xx rejections other than 409 conflicts are not replayed."""
+        from moto import mock_aws
+
+        with mock_aws():
+            self._create_table()
+            handler, calls = self._counting_handler(status_code=status_code)
+            wrapped = idempotent("idempotency-test-table")(handler)
+
+            wrapped(self.EVENT, None)
+            wrapped(self.EVENT, None)
+            assert len(calls) == runs